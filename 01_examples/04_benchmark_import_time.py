@@ -0,0 +1,50 @@
+import os
+import sys
+import statistics
+import subprocess
+
+# Root of the repository (added to the Python path of the subprocesses)
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules of which the import time is measured
+modules = [
+    'hamlet',
+    'hamlet.executor.setup',
+    'hamlet.executor.utilities.parallel.process_pool',
+    'hamlet.executor.utilities.forecasts.models',
+    'hamlet.creator.setup',
+    'hamlet.analyzer.setup',
+]
+
+# Heavy dependencies that should only be imported if a scenario needs them
+heavy = ['keras', 'tensorflow', 'sktime', 'sklearn', 'pvlib', 'windpowerlib', 'pandapower', 'hplib', 'matplotlib']
+
+# Number of repetitions per module (each in a fresh interpreter)
+repetitions = 5
+
+# Code that is executed in each subprocess: imports the module and reports the time and the loaded heavy dependencies
+code = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - start
+loaded = [name for name in {heavy} if name in sys.modules]
+print(duration, ','.join(loaded))
+'''
+
+env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.environ.get('PYTHONPATH', '')]))
+
+print(f'{"module":<55} {"median [s]":>10} {"min [s]":>8}   heavy dependencies loaded')
+for module in modules:
+    durations = []
+    loaded = ''
+    for _ in range(repetitions):
+        result = subprocess.run([sys.executable, '-c', code.format(module=module, heavy=heavy)],
+                                capture_output=True, text=True, env=env, cwd=root)
+        if result.returncode != 0:
+            print(f'{module:<55} failed: {result.stderr.strip().splitlines()[-1]}')
+            break
+        duration, loaded = result.stdout.split()[0], ' '.join(result.stdout.split()[1:])
+        durations.append(float(duration))
+    else:
+        print(f'{module:<55} {statistics.median(durations):>10.3f} {min(durations):>8.3f}   {loaded or "-"}')
@@ -0,0 +1,18 @@
+import sys
+sys.path.append("..")  # Add the parent directory to the Python path for execution outside an IDE
+sys.path.append("./")  # Add the current directory to the Python path for execution in VSCode
+from hamlet import Executor
+
+# Path to the scenario folder (relative or absolute)
+path = "../04_scenarios/example_single_market"
+
+# Create the executor object that coordinates the worker nodes
+# Note: With 'spawn': True the workers are started as local processes that connect through the socket. To distribute
+#   the scenario over several machines, set 'spawn' to False, use an address that is reachable from the other machines
+#   (e.g. '0.0.0.0:6000') and start one worker node per worker on the other machines with:
+#   HAMLET_AUTHKEY=<authkey> python -m hamlet.executor.utilities.parallel.process_pool <coordinator host>:6000
+sim = Executor(path, num_workers=4, backend='socket',
+               socket_config={'address': 'localhost:6000', 'authkey': 'hamlet', 'spawn': True, 'shard_by': 'agents'})
+
+# Run the simulation
+sim.run()
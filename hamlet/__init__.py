@@ -1,3 +1,19 @@
-from hamlet.creator.setup import Creator
-from hamlet.executor.setup import Executor
-from hamlet.analyzer.setup import Analyzer
\ No newline at end of file
+# The main classes are imported lazily so that importing a submodule (e.g. in the worker processes of the executor)
+# does not import the creator and analyzer together with their heavy dependencies
+__all__ = ['Creator', 'Executor', 'Sweep', 'Ensemble', 'TimeParallel', 'Analyzer']
+
+_MODULES = {
+    'Creator': 'hamlet.creator.setup',
+    'Executor': 'hamlet.executor.setup',
+    'Sweep': 'hamlet.executor.sweep',
+    'Ensemble': 'hamlet.executor.ensemble',
+    'TimeParallel': 'hamlet.executor.time_parallel',
+    'Analyzer': 'hamlet.analyzer.setup',
+}
+
+
+def __getattr__(name):
+    if name in _MODULES:
+        import importlib
+        return getattr(importlib.import_module(_MODULES[name]), name)
+    raise AttributeError(f"module 'hamlet' has no attribute '{name}'")
@@ -153,6 +153,7 @@ TC_ID_AGENT = 'id_agent'
 TC_ID_AGENT_IN = 'id_agent_in'
 TC_ID_AGENT_OUT = 'id_agent_out'
 TC_ID_METER = 'id_meter'
+TC_ID_PLANT = 'id_plant'
 TC_ENERGY = 'energy'
 TC_ENERGY_IN = 'energy_in'
 TC_ENERGY_OUT = 'energy_out'
@@ -286,6 +287,7 @@ P_HEAT_STORAGE = 'heat-storage'
 # CONTROLLERS
 C_RTC = 'rtc'
 C_MPC = 'mpc'
+C_SURROGATE = 'surrogate'
 
 # COMPONENT MAPPING
 # Note: Key states which type of plant is addressed and the value states which type of operation it has for the given
@@ -33,14 +33,26 @@ class Agent:
         The timetable information for the agent.
     database : Database
         The database object for the agent.
+    passive : bool
+        If True, agents without flexibility use the passive controller instead of solving optimization problems.
 
     Methods
     -------
     execute() -> AgentDB
         Executes the given `Agent` and returns the resulting `AgentDB`.
+    step(timetable) -> AgentDB
+        Executes the given `Agent` for the given timetable and returns the resulting `AgentDB`.
+    prefetch_forecasts(timestamp) -> None
+        Makes the forecasts that only depend on exogenous data for the given timestamp ahead of time.
+
+    Note
+    ----
+    Agents are meant to be created once at the beginning of the simulation and then stepped through the timestamps
+    using `step()`. The timetable can therefore be omitted at creation.
 
     """
-    def __init__(self, agent_type: str, data: dict, timetable: pl.DataFrame, database: Database):
+    def __init__(self, agent_type: str, data: dict, timetable: pl.DataFrame = None, database: Database = None,
+                 passive: bool = False):
         """
         Parameters
         ----------
@@ -50,16 +62,23 @@ class Agent:
         data : dict
             The data needed for creating the agent.
 
-        timetable : pl.LazyFrame
+        timetable : pl.LazyFrame, optional
             The timetable information for the agent.
 
         database : Database
             The database object for the agent.
 
+        passive : bool, optional
+            If True, agents without flexibility use the passive controller instead of solving optimization problems.
+
         """
         # Instance of the agent class
         self.agent = AgentFactory.create_agent(agent_type, data, timetable, database)
 
+        # Use the cheap controller for agents that have nothing to optimize
+        if passive:
+            self.agent.use_passive_controller()
+
     def execute(self) -> AgentDB:
         """
         Executes the given `Agent` and returns the resulting `AgentDB`.
@@ -74,6 +93,34 @@ class Agent:
 
         return self.agent.execute()
 
+    def step(self, timetable: pl.DataFrame) -> AgentDB:
+        """
+        Executes the given `Agent` for the given timetable and returns the resulting `AgentDB`.
+
+        Parameters:
+            timetable (pl.DataFrame): The part of the timetable for the current timestamp and region.
+
+        Returns:
+            AgentDB: The resulting `AgentDB` after executing the `Agent`.
+
+        """
+
+        return self.agent.step(timetable)
+
+    def prefetch_forecasts(self, timestamp) -> None:
+        """
+        Makes the forecasts that only depend on exogenous data for the given timestamp ahead of time.
+
+        Parameters:
+            timestamp (datetime): The timestamp the agent is executed at next.
+
+        Returns:
+            None
+
+        """
+
+        self.agent.prefetch_forecasts(timestamp)
+
 
 class AgentFactory:
     """
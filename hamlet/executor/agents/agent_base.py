@@ -9,6 +9,7 @@ __email__ = "markus.doepfert@tum.de"
 # Imports
 import polars as pl
 from hamlet.executor.utilities.controller.controller import Controller
+from hamlet.executor.utilities.controller.passive.passive import Passive
 from hamlet.executor.utilities.database.database import Database
 from hamlet.executor.utilities.database.agent_db import AgentDB
 from hamlet.executor.utilities.trading.trading import Trading
@@ -16,9 +17,14 @@ from hamlet import constants as c
 
 
 class AgentBase:
-    """Base class for all agents. It provides a default implementation of the run method."""
+    """Base class for all agents. It provides a default implementation of the run method.
 
-    def __init__(self, agent_type: str, agent: AgentDB, timetable: pl.DataFrame, database: Database):
+    Agents are persistent, i.e. they are created once at the beginning of the simulation and then stepped through the
+    timestamps with step(). Everything that does not change during the simulation (resolved configuration, controller
+    instances) is therefore only created once in the constructor.
+    """
+
+    def __init__(self, agent_type: str, agent: AgentDB, timetable: pl.DataFrame = None, database: Database = None):
 
         # Type of agent
         self.agent_type = agent_type
@@ -35,6 +41,51 @@ class AgentBase:
         # Market data
         self.market = None
 
+        # Resolved configuration of the energy management system
+        self.ems = self.agent.account[c.K_EMS]
+        self.market_info = self.ems[c.K_MARKET]
+
+        # Controller instances (reused at every timestamp)
+        self.controllers = self.create_controllers()
+
+        # Agents without flexibility (see Passive.is_passive()) can use the cheap passive controller
+        self.passive = Passive.is_passive(plants=self.agent.plants, ems=self.ems)
+
+        # Trading strategy (the instance is created for each market at every timestamp as it depends on the timetable)
+        self.trading = Trading(strategy=self.market_info['strategy'])
+
+    def step(self, timetable: pl.DataFrame):
+        """Executes the agent for the given part of the timetable"""
+
+        # Update the timetable
+        self.timetable = timetable
+
+        return self.execute()
+
+    def create_controllers(self) -> list:
+        """Creates the controller instances as defined in the ems"""
+
+        controllers = []
+
+        # Loop through the ems controllers
+        for controller, params in self.ems['controller'].items():
+            # Skip if method is None
+            # TODO: Check if this needs to be changed since it might be that the method is None but still something
+            #  needs to be done for the tables.
+            if params['method'] is None:
+                continue
+
+            # Create the controller
+            controllers.append(Controller(controller_type=controller, **params).create_instance())
+
+        return controllers
+
+    def use_passive_controller(self):
+        """Replaces the controllers with the passive controller if the agent has no flexibility"""
+
+        if self.passive:
+            self.controllers = [Passive(controllers=self.controllers, ems=self.ems)]
+
     def execute(self):
         """Executes the agent"""
 
@@ -65,6 +116,10 @@ class AgentBase:
         """Gets the grid data from the database"""
         ...
 
+    def prefetch_forecasts(self, timestamp):
+        """Makes the forecasts that only depend on exogenous data for the next timestamp ahead of time"""
+        self.agent.forecaster.prefetch_forecasts(timestamp)
+
     def get_forecasts(self):
         """Gets the predictions for the agent"""
         # Get the forecasts
@@ -75,21 +130,8 @@ class AgentBase:
     def set_controllers(self):
         """Sets the controller for the agent"""
 
-        # Get the required data
-        ems = self.agent.account[c.K_EMS]
-
-        # Loop through the ems controllers
-        for controller, params in ems['controller'].items():
-            # Skip if method is None
-            # TODO: Check if this needs to be changed since it might be that the method is None but still something
-            #  needs to be done for the tables.
-            if params['method'] is None:
-                continue
-
-            # Get the controller
-            controller = Controller(controller_type=controller, **params).create_instance()
-
-            # Run the controller
+        # Loop through the controllers and run them
+        for controller in self.controllers:
             self.agent = controller.run(agent=self.agent, timetable=self.timetable, market=self.market)
 
         return self.agent
@@ -97,9 +139,6 @@ class AgentBase:
     def create_bids_offers(self):
         """Create the bids and offers to the market based on the trading strategy"""
 
-        # Get the required data
-        market_info = self.agent.account[c.K_EMS][c.K_MARKET]
-
         # Get the markets of the region from the timetable by selecting the unique market types and names
         unique_types_names = self.timetable.unique(subset=[c.TC_MARKET, c.TC_NAME])
         market_types = unique_types_names.select(c.TC_MARKET).to_series().to_list()
@@ -108,8 +147,8 @@ class AgentBase:
         # Loop through the markets
         for m_type, m_name in zip(market_types, market_names):
             # Get the strategy
-            strategy = Trading(strategy=market_info['strategy'], timetable=self.timetable,
-                               market=m_name, market_data=self.market[m_type][m_name], agent=self.agent).create_instance()
+            strategy = self.trading.create_instance(timetable=self.timetable, market=m_name,
+                                                    market_data=self.market[m_type][m_name], agent=self.agent)
 
             # Create bids and offers
             self.agent = strategy.create_bids_offers()
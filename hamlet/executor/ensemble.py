@@ -0,0 +1,68 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+# This file is in charge of running seeded replications of a scenario (Monte Carlo)
+
+# Imports
+import os
+from hamlet.executor.sweep import Sweep
+
+
+class Ensemble(Sweep):
+    """
+    Runs seeded replications of one scenario in parallel processes that share the preloaded scenario data.
+
+    Stochastic parts of the simulation (e.g. the zero intelligence strategy or the shuffling of the bids and offers in
+    the market clearing) make the results of a single run random. The ensemble executes the same scenario several times
+    with different seeds. As for the Sweep, the scenario data is loaded once and inherited copy-on-write by the
+    processes of the replications and the results folder of each replication only references the scenario folder.
+
+    The results of all replications are written to one dataset that is partitioned by replication:
+    '<results>/<name>/replication=<i>/<scenario>/...'. collect() returns a result table of all replications with the
+    column 'replication'. The seeds are documented in '<results>/<name>/ensemble.json'.
+
+    Attributes:
+        replications: number of replications.
+        seed: seed of the first replication (replication i uses seed + i).
+        overrides: overrides that are applied to all replications (see Sweep).
+
+    Example:
+        ```
+        ensemble = Ensemble(path, replications=20, seed=42)
+        ensemble.run()
+        transactions = ensemble.collect('region/markets/lem/market/market_transactions.csv')
+        ```
+
+    """
+
+    PARTITION = 'replication'
+    MANIFEST = 'ensemble.json'
+
+    def __init__(self, path_scenario: str, replications: int, seed: int = 0, overrides: dict = None,
+                 name: str = None, num_processes: int = None, **executor_kwargs):
+        """
+        Args:
+            path_scenario: path to the scenario folder.
+            replications: number of replications.
+            seed: seed of the first replication (replication i uses seed + i).
+            overrides: overrides that are applied to all replications (see Sweep). Defaults to the scenario as it is.
+            name: name of the ensemble. Defaults to the name of the scenario with the suffix '_ensemble'.
+            num_processes: number of replications that are executed at the same time. Defaults to the number of
+                logical processors - 1.
+            **executor_kwargs: keyword arguments for the Executor of each replication (see Sweep).
+
+        """
+        if replications < 1:
+            raise ValueError(f'The number of replications ({replications}) needs to be at least 1.')
+
+        self.replications = replications
+        self.seed = seed
+        self.overrides = overrides if overrides else {}
+
+        variants = {str(idx): {**self.overrides, 'seed': seed + idx} for idx in range(replications)}
+        name = name if name else f'{os.path.basename(os.path.abspath(path_scenario))}_ensemble'
+
+        super().__init__(path_scenario, variants=variants, name=name, num_processes=num_processes, **executor_kwargs)
@@ -15,15 +15,19 @@ import time
 import logging
 import traceback
 from datetime import datetime
-import pandapower as pp
+from typing import TYPE_CHECKING
 from hamlet.executor.grids.grid_base import GridBase
 
+# pandapower is only imported when the power flow is calculated as it is slow to import
+if TYPE_CHECKING:
+    import pandapower as pp
+
 # TODO: This does not work yet but merely the code structure is shown
 
 
 class Electricity(GridBase):
 
-    def __init__(self, grid: pp.pandapowerNet, trades: pl.DataFrame = None, method: str = 'dc'):
+    def __init__(self, grid: 'pp.pandapowerNet', trades: pl.DataFrame = None, method: str = 'dc'):
 
         # Call the super class
         super().__init__()
@@ -15,7 +15,6 @@ import time
 import logging
 import traceback
 from datetime import datetime
-import pandapower as pp
 import hamlet.constants as c
 
 # Types of grids (add your own if others are created here)
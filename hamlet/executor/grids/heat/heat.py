@@ -15,7 +15,6 @@ import time
 import logging
 import traceback
 from datetime import datetime
-import pandapower as pp
 from hamlet.executor.grids.grid_base import GridBase
 
 # Not implemented yet
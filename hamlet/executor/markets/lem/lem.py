@@ -14,6 +14,7 @@ import logging
 import traceback
 from datetime import datetime
 import hamlet.constants as c
+from hamlet import functions as f
 from hamlet.executor.utilities.database.market_db import MarketDB
 from hamlet.executor.utilities.database.region_db import RegionDB
 from hamlet.executor.utilities.database.database import Database
@@ -42,22 +43,23 @@ class Lem(MarketBase):
         self.database = database
 
         # Get bids and offers
+        # Note: The partition of the market and timestep is taken from the order book of the region
         self.bids_offers = self.database.get_bids_offers(region=self.tasks[c.TC_REGION],
                                                          market_type=self.tasks[c.TC_MARKET],
                                                          market_name=self.tasks[c.TC_NAME],
                                                          timestep=self.tasks[c.TC_TIMESTEP])
 
         # Get the tables from the market database and clear them
-        self.bids_cleared = self.market.bids_cleared.clear()
-        self.offers_cleared = self.market.offers_cleared.clear()
+        # Note: The tables that grow with every timestep only provide their schema (combining them would copy them)
+        self.bids_cleared = self.market.history[c.TN_BIDS_CLEARED].empty()
+        self.offers_cleared = self.market.history[c.TN_OFFERS_CLEARED].empty()
         self.bids_uncleared = self.market.bids_uncleared.clear()
         self.offers_uncleared = self.market.offers_uncleared.clear()
-        self.transactions = self.market.market_transactions.clear()
+        self.transactions = self.market.history[c.TN_MARKET_TRANSACTIONS].empty()
 
         # Get the previous transactions for the given timestep when the action is 'settle'
         if c.MA_SETTLE in self.tasks[c.TC_ACTIONS]:
-            self.transactions_prev = (self.market.market_transactions
-                                      .filter(pl.col(c.TC_TIMESTEP) == self.tasks[c.TC_TIMESTEP]))
+            self.transactions_prev = self.market.get_history(c.TN_MARKET_TRANSACTIONS, start=self.tasks[c.TC_TIMESTEP])
         else:
             self.transactions_prev = None
 
@@ -236,8 +238,10 @@ class Lem(MarketBase):
         offers = offers.rename({c.TC_ID_AGENT: c.TC_ID_AGENT_OUT})
 
         # Shuffle the data to avoid bias
-        bids = bids.sample(fraction=1, shuffle=True)
-        offers = offers.sample(fraction=1, shuffle=True)
+        # Note: The markets are cleared concurrently, so each clearing derives its own seed if the simulation is seeded
+        keys = tuple(self.tasks[key] for key in [c.TC_TIMESTAMP, c.TC_REGION, c.TC_MARKET, c.TC_NAME, c.TC_TIMESTEP])
+        bids = bids.sample(fraction=1, shuffle=True, seed=f.get_task_seed('bids', *keys))
+        offers = offers.sample(fraction=1, shuffle=True, seed=f.get_task_seed('offers', *keys))
 
         # Sort the bids and offers by price
         bids = bids.sort(c.TC_PRICE_PU_IN, descending=True)
@@ -22,7 +22,7 @@ from hamlet.executor.markets.market_base import MarketBase
 
 class Lfm(MarketBase):
 
-    def __init__(self, market: MarketDB, tasks: dict, database: Database):
+    def __init__(self, market: MarketDB, tasks: dict, database: Database, **kwargs):
 
         # Call the super class
         super().__init__()
@@ -6,6 +6,7 @@ __email__ = "markus.doepfert@tum.de"
 
 import os
 import sys
+import bisect
 from tqdm import tqdm
 import shutil
 import time
@@ -19,7 +20,6 @@ import polars as pl
 pl.enable_string_cache(True)
 from hamlet import functions as f
 # from numba import njit, jit
-import pandapower as pp
 import concurrent.futures
 from typing import Callable
 from datetime import datetime
@@ -27,6 +27,13 @@ from hamlet.executor.agents.agent import Agent
 from hamlet.executor.markets.market import Market
 from hamlet.executor.grids.grid import Grid
 from hamlet.executor.utilities.database.database import Database
+from hamlet.executor.utilities.database.checkpoint import Checkpoint
+from hamlet.executor.utilities.database.result_writer import ResultWriter
+from hamlet.executor.utilities.parallel.process_pool import ProcessPool
+from hamlet.executor.utilities.parallel.autotune import AutoTuner, SEQUENTIAL
+from hamlet.executor.utilities.realtime.scheduler import RealTimeScheduler, Phase
+from hamlet.executor.utilities.timetable.timetable_index import TimetableIndex
+from hamlet.executor.utilities.fast_forward.fast_forward import FastForward
 import hamlet.constants as c
 # pl.enable_string_cache(True)
 from copy import copy
@@ -41,8 +48,47 @@ from copy import copy
 
 
 class Executor:
-
-    def __init__(self, path_scenario, name: str = None, num_workers: int = None, overwrite_sim: bool = True):
+    """
+    Executes a scenario.
+
+    The options are described where they are set in __init__(). They are grouped as follows:
+        - execution: sim_type, rts_config, fast_forward, seed.
+        - parallelization: num_workers, autotune_config, backend, socket_config, parallel_regions, pipeline_forecasts.
+        - data: database, passive_agents, aggregate_agents, columnar_store, memory_map.
+        - results: name, overwrite_sim, results_init, stream_results, checkpoint_interval, path_checkpoint.
+
+    Combinations of options that are not compatible raise a ValueError (see __validate_options()):
+        - aggregate_agents with stream_results: the results of the represented agents are only created when the
+          database is saved.
+        - database with aggregate_agents, columnar_store or memory_map: a database that was already set up is used as
+          it is.
+        - socket_config without the socket backend.
+        - autotune_config without num_workers 'auto'.
+        - rts_config without sim_type 'rts' and fast_forward with sim_type 'rts' (the real-time execution is bound to
+          the wall clock).
+
+    Example:
+        ```
+        sim = Executor(path, num_workers=4, backend='process')
+        sim.run()
+        ```
+
+    """
+
+    def __init__(self, path_scenario, name: str = None, num_workers: int | str = None, overwrite_sim: bool = True,
+                 backend: str = 'thread', parallel_regions: bool = False, checkpoint_interval: int = None,
+                 path_checkpoint: str = None, stream_results: bool = False, results_init: str = 'copy',
+                 passive_agents: bool = False, sim_type: str = 'sim', rts_config: dict = None,
+                 socket_config: dict = None, database: Database = None, autotune_config: dict = None,
+                 pipeline_forecasts: bool = False, seed: int = None, aggregate_agents: bool = False,
+                 fast_forward: bool | list = False, columnar_store: bool = False, memory_map: bool = False):
+
+        # Check the options before anything is created
+        self.__validate_options(sim_type=sim_type, rts_config=rts_config, fast_forward=fast_forward,
+                                num_workers=num_workers, autotune_config=autotune_config, backend=backend,
+                                socket_config=socket_config, database=database, aggregate_agents=aggregate_agents,
+                                columnar_store=columnar_store, memory_map=memory_map, results_init=results_init,
+                                stream_results=stream_results)
 
         # Progress bar
         self.pbar = tqdm()
@@ -59,25 +105,159 @@ class Executor:
 
         # Scenario timetable
         self.timetable = None
+        self.timetable_index = None  # index of the timetable to obtain the tasklists (set in self.__prepare_scenario())
+
+        # Scenario type
+        # Options:
+        #   - sim: the timestamps are executed as fast as possible
+        #   - rts: the timestamps are executed in real time (see RealTimeScheduler)
+        self.type = sim_type
 
-        # Scenario type (sim or in the future also rts)
-        self.type = None  # set in self.__prepare_scenario()
+        # Configuration of the real-time scheduler (keyword arguments of RealTimeScheduler, e.g. lead and budgets)
+        self.rts_config = rts_config if rts_config else {}
+        self.rts_metrics = None  # timings of the phases of each timestamp (set in self.execute() for rts)
 
         # Database containing all information
-        self.database = Database(self.path_scenario)
+        # Note: A database that was already set up (e.g. shared by the variants of a Sweep) is used as it is
+        self.database = database if database else Database(self.path_scenario)
+        self.preloaded = database is not None
+
+        # Agents of each region (created once in self.setup() and kept for the entire simulation)
+        self.agents = {}
+
+        # Agents without flexibility (only inflexible loads and non-controllable generators) use a cheap controller
+        # that derives their setpoints and meters directly from the timeseries instead of solving the rtc and mpc
+        # Note: Opt-in as the existing scenarios are executed with the controllers of their ems by default
+        self.passive_agents = passive_agents
+
+        # Agents with identical data (plants, input profiles, ems) are simulated by one representative whose bids and
+        #   offers are scaled by the number of agents it represents (see RegionDB.aggregate_agents())
+        # Note: The results of the represented agents are only created when the database is saved
+        self.aggregate_agents = aggregate_agents
+
+        # The meters, socs and timeseries of all agents of a region are kept in one columnar store instead of
+        #   one table per agent (see RegionStore). The tables of the agents are written to it after each timestamp.
+        self.columnar_store = columnar_store
+
+        # The timeseries of the agents are memory-mapped instead of read into memory, so that only the rows of the
+        #   current window are resident (see AgentDB.register_agent())
+        self.memory_map = memory_map
 
         # Scenario structure
         self.structure = {}  # TODO: this will need to contain more information than just the path. Also: above and below markets to know where to look for the data
 
         # Number of workers for parallelization
+        # Note: 'auto' tries several numbers of workers and backends on the first timestamps (see AutoTuner)
         self.num_workers = num_workers
 
-        # Thread pool for parallelization
+        # Configuration of the auto-tuning (keyword arguments of AutoTuner: candidates, steps, warmup)
+        self.autotune_config = autotune_config if autotune_config else {}
+        self.autotuner = None  # AutoTuner object (created in self.execute() if num_workers is 'auto')
+
+        # Backend for the parallel execution of the agents
+        # Options:
+        #   - thread: agents are executed in a thread pool of the main process
+        #   - process: agents are sharded across worker processes that keep their own agent data
+        #   - socket: as process but the workers connect through a socket and can run on other machines
+        self.backend = backend
+
+        # Configuration of the socket backend (keyword arguments of ProcessPool: address, authkey, spawn, shard_by)
+        # Note: By default, local worker processes are connected through a Unix socket
+        self.socket_config = {'address': 'unix', **socket_config} if socket_config else {'address': 'unix'}
+
+        # Thread or process pool for parallelization
         self.pool = None
 
+        # Thread pool for the concurrent execution of the markets of a region
+        self.market_pool = None
+
+        # Execute the regions of a timestamp concurrently (they only interact through the grid)
+        # Note: The regions get their own thread pool as submitting the agents to self.pool from within a task of the
+        #   same pool could exhaust its workers and deadlock
+        self.parallel_regions = parallel_regions
+        self.region_pool = None
+
+        # Make the forecasts of the next timestamp that only depend on exogenous data while the markets of the current
+        #   timestamp are cleared (see Forecaster.prefetch_forecasts())
+        # Note: The forecasts of the local markets depend on the market results and are still made in the agent step
+        self.pipeline_forecasts = pipeline_forecasts
+        self.prefetch_pool = None  # thread pool for the prefetches (not needed with the process backend)
+        self.prefetches = {}  # futures of the running prefetches of each region
+
+        # Fast-forward through stretches of timestamps without market clearing (see FastForward)
+        # Options:
+        #   - False: all timestamps are executed in detail
+        #   - True: the timestamps whose tasks do not clear any market are fast-forwarded (the markets are settled)
+        #   - list of (start, end) tuples: additionally, the timestamps within these periods are fast-forwarded
+        # Note: Not available for rts as the real-time execution is bound to the wall clock
+        self.fast_forward = FastForward(periods=fast_forward if isinstance(fast_forward, list) else None) \
+            if fast_forward else None
+
+        # Seed of the random number generators (e.g. zero intelligence strategy, shuffling of the bids and offers)
+        # Note: The market clearings derive their own seeds as they are executed concurrently (see f.get_task_seed()).
+        #   The agents draw from the global generators, so the results are only reproducible if the agents are executed
+        #   in a fixed order, i.e. sequentially or with the process backend and the same number of workers
+        self.seed = seed
+
         # Overwrites the results folder if it already exists
         self.overwrite = overwrite_sim
 
+        # Initialization of the results folder
+        # Options:
+        #   - copy: the scenario folder is copied to the results folder
+        #   - link: the files of the scenario folder are hard-linked to the results folder (copied if not possible)
+        #   - reference: the results folder only contains a reference to the scenario folder and the outputs
+        self.results_init = results_init
+
+        # Stream the results to disk during the simulation instead of keeping them in memory until the end
+        # Note: Only the rows that are still needed by the agents and markets are kept in memory (see
+        #   Database.prune_region())
+        self.stream_results = stream_results
+        self.writer = None  # ResultWriter object (created in self.execute())
+
+        # Checkpoints of the simulation state
+        self.checkpoint_interval = checkpoint_interval  # number of timestamps between checkpoints (None: no checkpoints)
+        self.path_checkpoint = path_checkpoint  # defaults to the folder 'checkpoint' in the results folder
+        self.checkpoint = None  # Checkpoint object (created in self.execute() or self.resume())
+        self.resume_from = None  # timestamp of the checkpoint the simulation was resumed from
+
+    @staticmethod
+    def __validate_options(sim_type: str, rts_config: dict, fast_forward: bool | list, num_workers: int | str,
+                           autotune_config: dict, backend: str, socket_config: dict, database: Database,
+                           aggregate_agents: bool, columnar_store: bool, memory_map: bool, results_init: str,
+                           stream_results: bool):
+        """Raises a ValueError if an option is not available or if options are not compatible (see Executor)"""
+
+        # Available values
+        if sim_type not in ['sim', 'rts']:
+            raise ValueError(f'Simulation type "{sim_type}" not available. Available types are: sim, rts.')
+        if isinstance(num_workers, str) and num_workers != 'auto':
+            raise ValueError(f'Number of workers "{num_workers}" not available. Use an integer or "auto".')
+        if backend not in ['thread', 'process', 'socket']:
+            raise ValueError(f'Backend "{backend}" not available. Available backends are: thread, process, socket.')
+        if results_init not in ['copy', 'link', 'reference']:
+            raise ValueError(f'Results initialization "{results_init}" not available. '
+                             f'Available options are: copy, link, reference.')
+
+        # Incompatible combinations
+        if aggregate_agents and stream_results:
+            raise ValueError('The aggregation of agents cannot be combined with streamed results.')
+        if database is not None:
+            options = [name for name, value in [('aggregate_agents', aggregate_agents),
+                                                ('columnar_store', columnar_store),
+                                                ('memory_map', memory_map)] if value]
+            if options:
+                raise ValueError(f'A database that was already set up cannot be combined with {", ".join(options)} '
+                                 f'(the options are applied when the database is set up).')
+        if socket_config and backend != 'socket':
+            raise ValueError(f'The socket configuration is only used by the socket backend (backend: {backend}).')
+        if autotune_config and num_workers != 'auto':
+            raise ValueError('The auto-tuning configuration is only used if the number of workers is "auto".')
+        if rts_config and sim_type != 'rts':
+            raise ValueError('The configuration of the real-time scheduler is only used with the simulation type rts.')
+        if fast_forward and sim_type == 'rts':
+            raise ValueError('Fast-forwarding cannot be combined with the real-time execution (simulation type rts).')
+
     def run(self):
         """Runs the simulation"""
 
@@ -92,107 +272,442 @@ class Executor:
 
         self.__prepare_scenario()
 
-        self.__setup_database()
+        if not self.preloaded:
+            self.__setup_database()
+
+        # The worker processes create their own agents with the process backend (see self.__create_pools())
+        if self.backend not in ['process', 'socket']:
+            self.__setup_agents()
+
+    def set_timetable(self, timetable: pl.DataFrame):
+        """Replaces the timetable of the scenario (e.g. with changed market configurations) before the execution"""
+
+        self.timetable = timetable
+        self.timetable_index = TimetableIndex(self.timetable)
 
     def execute(self):
         """Executes the scenario
 
         """
 
+        # Seed the random number generators (the workers of the process backend are seeded in the ProcessPool)
+        if self.seed is not None:
+            f.set_seed(self.seed)
+
+        # Try different parallelization settings on the first timestamps (not in real time as it needs to keep pace)
+        if self.num_workers == 'auto':
+            self.num_workers = None
+            if self.type == 'sim':
+                candidates = self.autotune_config.get('candidates', AutoTuner.default_candidates())
+                self.autotuner = AutoTuner(**{**self.autotune_config, 'candidates': candidates})
+                backend, self.num_workers = self.autotuner.setting()
+                self.backend = self.backend if backend == SEQUENTIAL else backend
+
         # Get number of logical processors (for parallelization)
-        # TODO: Benchmark with different numbers of workers
         if not self.num_workers:
             self.num_workers = os.cpu_count() - 1  # logical processors (threads) - 1
             # self.num_workers = mp.cpu_count() - 1  # physical processors - 1
             # self.num_workers = len(os.sched_getaffinity(0))  # number of usable CPUs
 
-        # Setup up the thread pool for parallelization
-        if self.num_workers > 1:
-            # TODO: Benchmark with ProcessPoolExecutor
-            self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers)
+        # Setup up the thread or process pool for parallelization
+        self.__create_pools()
+        if self.parallel_regions and len(self.structure) > 1:
+            self.region_pool = concurrent.futures.ThreadPoolExecutor(max_workers=len(self.structure))
+        if self.pipeline_forecasts:
+            self.prefetch_pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, self.num_workers))
 
         # Loop through the timetable and execute the tasks for each market for each timestamp
         # Note: The design assumes that there is nothing to be gained for the simulation to run in between market
         #   timestamps. Therefore, the simulation is only executed for the market timestamps
         # Iterate over timetable by timestamp
         # Set the progress bar
-        self.pbar.reset(total=len(self.timetable.partition_by('timestamp')))
+        timestamps = self.timetable_index.timestamps
+        # Skip the timestamps that were already executed when resuming from a checkpoint
+        if self.resume_from is not None:
+            timestamps = timestamps[bisect.bisect_right(timestamps, self.resume_from):]
+
+        # Create the writer for the streamed results (written to the same folder as the results of the database)
+        if self.stream_results:
+            self.writer = ResultWriter(os.path.dirname(self.path_results))
+            # Continue the streams of the checkpoint (the rows streamed after it are simulated again)
+            if self.resume_from is not None:
+                self.writer.restore(rows=self.checkpoint.info.get('streamed', {}), folders=list(self.structure.keys()))
+
+        # Create the checkpoint object if checkpoints are to be written
+        if self.checkpoint_interval and self.checkpoint is None:
+            self.checkpoint = Checkpoint(self.path_checkpoint)
+
+        self.pbar.reset(total=len(timestamps))
         self.pbar.set_description(desc='Start execution')
 
-        for timestamp in self.timetable.partition_by('timestamp'):
-            # Wait for the timestamp to be reached if the simulation is to be carried out in real-time
-            if self.type == 'rts':
-                self.__wait_for_ts(timestamp.iloc[0, 0])
+        if self.type == 'rts':
+            # Execute the timestamps in real time: the agents prepare their bids ahead of the market timestamp, the
+            #   markets and grids are executed when the timestamp is reached
+            counter = iter(range(1, len(timestamps) + 1))
+            scheduler = RealTimeScheduler(**self.rts_config)
+            scheduler.run(timestamps,
+                          phases=[Phase('agents', lambda ts: self.__execute_regions(ts, self.__execute_region_agents)),
+                                  Phase('markets', lambda ts: self.__execute_regions(ts, self.__execute_region_markets),
+                                        at_deadline=True),
+                                  Phase('grids', lambda ts: self.__execute_grids(), at_deadline=True)],
+                          callback=lambda ts: self.__complete_timestamp(ts, next(counter)))
+            self.rts_metrics = scheduler.get_metrics()
+        else:
+            # Get the stretches without market clearing that are fast-forwarded
+            stretches = self.fast_forward.get_stretches(self.timetable, timestamps) if self.fast_forward else {}
+            skipped = {timestamp for stretch, _ in stretches.values() for timestamp in stretch}
+
+            for counter, timestamp in enumerate(timestamps, start=1):
+                # Advance all agents through the stretch at its first timestamp and only settle the markets at all
+                #   timestamps of the stretch
+                if timestamp in skipped:
+                    if timestamp in stretches:
+                        self.__fast_forward(start=timestamp, end=stretches[timestamp][1])
+                    self.__execute_regions(timestamp, self.__settle_region)
+                    self.__complete_timestamp(timestamp, counter)
+                    continue
+
+                # Switch to the next setting that is to be tried (or the fastest one after all were tried)
+                if self.autotuner:
+                    self.__autotune()
+                start = time.perf_counter()
+
+                # Execute the agents and markets of all regions
+                self.__execute_regions(timestamp, self.__execute_region)
+
+                # Calculate the grids for the current timestamp (calculated together as they are connected)
+                self.pbar.set_description('Executing timestamp ' + str(timestamp) + ' for grid: ')
+
+                self.__execute_grids()
+
+                if self.autotuner:
+                    self.autotuner.record(time.perf_counter() - start)
+
+                self.__complete_timestamp(timestamp, counter)
+
+        # Cleanup the thread pools
+        self.__wait_for_prefetches()
+        self.__shutdown_pools()
+        if self.region_pool:
+            self.region_pool.shutdown()
+        if self.prefetch_pool:
+            self.prefetch_pool.shutdown()
+            self.prefetch_pool = None
 
-            # get current timestamp as string item for progress bar
-            timestamp_str = str(timestamp.select(c.TC_TIMESTAMP).sample(n=1).item())
+    def cleanup(self):
+        """Cleans up the scenario after execution"""
 
-            # Iterate over timestamp by region
-            for region in timestamp.partition_by(c.TC_REGION):
-                # get current region as string item for progress bar
-                region_str = str(region.select(c.TC_REGION).sample(n=1).item())
+        # Save the wall times of the parallelization settings that were tried
+        if self.autotuner:
+            f.save_file(os.path.join(self.path_results, 'scaling_report.csv'), data=self.autotuner.report(),
+                        df='polars')
+            shutil.rmtree(os.path.join(self.path_checkpoint, 'autotune'), ignore_errors=True)
+
+        # Save the timings of the real-time execution
+        if self.rts_metrics is not None:
+            f.save_file(os.path.join(self.path_results, 'realtime_metrics.csv'), data=self.rts_metrics, df='polars')
+
+        # Stream the remaining rows and close the stream files
+        if self.writer:
+            for region in self.structure.keys():
+                self.database.prune_region(region=region, writer=self.writer)
+            self.writer.close()
+            self.writer = None
+
+            # The streamed tables are not saved again
+            self.database.save_database(os.path.dirname(self.path_results),
+                                        exclude=self.database.STREAMED_AGENT_TABLES
+                                        + self.database.STREAMED_MARKET_TABLES)
+        else:
+            self.database.save_database(os.path.dirname(self.path_results))
 
-                # update progress bar description
-                self.pbar.set_description('Executing timestamp ' + timestamp_str + ' for region ' + region_str + ': ')
+    def pause(self):
+        """Pauses the simulation"""
+        raise NotImplementedError("Pause functionality not implemented yet")
+
+    def resume(self, path: str = None):
+        """Resumes the simulation from a checkpoint
+
+        The scenario and the database are set up again and the state of the checkpoint is loaded. The simulation then
+        continues at the next timestamp of the timetable and is cleaned up as in self.run().
+
+        Args:
+            path: path to the checkpoint folder. Defaults to the checkpoint folder of the results folder.
+
+        """
+
+        # Prepare the scenario without copying the scenario folder to the results folder again
+        self.__prepare_scenario(copy=False)
+
+        # Load the checkpoint
+        self.path_checkpoint = os.path.abspath(path) if path else self.path_checkpoint
+        self.checkpoint = Checkpoint(self.path_checkpoint)
+        if not self.checkpoint.exists():
+            raise FileNotFoundError(f'No checkpoint found in {self.path_checkpoint}.')
+        self.resume_from = datetime.fromisoformat(self.checkpoint.info[c.TC_TIMESTAMP])
+
+        # Set up the database and load the state of the checkpoint before the agents are created
+        self.__setup_database()
+        self.database.load_checkpoint(self.checkpoint)
+        if self.backend not in ['process', 'socket']:
+            self.__setup_agents()
+
+        self.execute()
+
+        self.cleanup()
+
+    def __save_checkpoint(self, timestamp: datetime):
+        """Writes the changed state of the database to the checkpoint"""
+
+        # Complete the checkpoint with the timestamp that was executed last
+        info = {c.TC_TIMESTAMP: timestamp.isoformat()}
 
-                # Execute the agents and market in parallel or sequentially
-                if self.pool:
-                    # Execute the agents for this market
-                    self.__execute_agents_parallel(tasklist=region)
+        # Record the number of rows that were streamed so far (the streams are cut back to them when resuming)
+        if self.writer:
+            info['streamed'] = self.writer.flush()
 
-                    # Execute the market
-                    # TODO: Replace this with a parallel execution once it works
-                    self.__execute_markets(tasklist=region)
-                else:
-                    # Execute the agents for this market
-                    self.__execute_agents(tasklist=region)
+        self.__write_checkpoint(self.checkpoint, info=info)
 
-                    # Execute the market
-                    self.__execute_markets(tasklist=region)
+    def __write_checkpoint(self, checkpoint: Checkpoint, info: dict = None):
+        """Writes the changed state of the database (and the forecasters of the worker processes) to the checkpoint"""
 
-            # Calculate the grids for the current timestamp (calculated together as they are connected)
-            self.pbar.set_description('Executing timestamp ' + timestamp_str + ' for grid: ')
+        # The forecasters must not change while they are written
+        self.__wait_for_prefetches()
 
-            self.__execute_grids()
+        checkpoint.begin()
+
+        # The forecasters only exist in the worker processes when the process backend is used
+        if isinstance(self.pool, ProcessPool):
+            self.database.save_checkpoint(checkpoint, forecasters=False)
+            checkpoint.files.update(self.pool.checkpoint(path=checkpoint.path, version=checkpoint.version))
+        else:
+            self.database.save_checkpoint(checkpoint)
+
+        checkpoint.commit(info=info)
+
+    def __create_pools(self, path_checkpoint: str = None):
+        """Creates the agent and market pools for the current backend and number of workers"""
+
+        if self.num_workers > 1:
+            if self.backend in ['process', 'socket']:
+                self.pool = self.__create_process_pool(path_checkpoint=path_checkpoint)
+            else:
+                self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers)
+            self.market_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers)
 
-            self.pbar.update(1)
+        # The agents are only created in the main process if they are executed there (e.g. with one worker or after
+        #   the auto-tuner switched from the process to the thread backend)
+        if not isinstance(self.pool, ProcessPool) and not self.agents:
+            self.__setup_agents()
+
+    def __shutdown_pools(self):
+        """Shuts down the agent and market pools"""
 
-        # Cleanup the thread pool
         if self.pool:
             self.pool.shutdown()
+        if self.market_pool:
+            self.market_pool.shutdown()
+        self.pool, self.market_pool = None, None
 
-    def cleanup(self):
-        """Cleans up the scenario after execution"""
-        self.database.save_database(os.path.dirname(self.path_results))
+    def __autotune(self):
+        """Switches the pools to the setting of the auto-tuner if it differs from the current one"""
 
-    def pause(self):
-        """Pauses the simulation"""
-        raise NotImplementedError("Pause functionality not implemented yet")
+        backend, num_workers = self.autotuner.setting()
+        backend = self.backend if backend == SEQUENTIAL else backend
+        if (backend, num_workers) == (self.backend, self.num_workers):
+            return
+
+        # The state of the agents is handed over through a checkpoint if worker processes are involved as they keep
+        #   their own agent data (and the forecasters)
+        state = None
+        uses_processes = isinstance(self.pool, ProcessPool)
+        if uses_processes or (backend in ['process', 'socket'] and num_workers > 1):
+            state = Checkpoint(os.path.join(self.path_checkpoint, 'autotune'))
+            self.__write_checkpoint(state)
+
+        self.__shutdown_pools()
+
+        # Load the forecasters of the worker processes into the main process
+        if uses_processes:
+            self.database.load_checkpoint(state, markets=False)
+
+        self.backend, self.num_workers = backend, num_workers
+        self.__create_pools(path_checkpoint=state.path if state else None)
+
+    def __fast_forward(self, start: datetime, end: datetime):
+        """Advances the agents of all regions through a stretch without market clearing (see FastForward)"""
+
+        self.pbar.set_description('Fast-forwarding from ' + str(start) + ' to ' + str(end) + ': ')
+
+        # The prefetched forecasts are not used and must not change the agents while they are advanced
+        self.__wait_for_prefetches()
+
+        for region in self.structure.keys():
+            # The worker processes keep their own agent tables and send the advanced tables back
+            if isinstance(self.pool, ProcessPool):
+                self.database.post_agent_tables(region=region, tables=self.pool.fast_forward(region, start, end))
+                continue
+
+            for agents in self.database.get_agent_data(region=region).values():
+                for agent in agents.values():
+                    FastForward.advance(agent, start=start, end=end)
+
+    def __settle_region(self, tasklist: pl.DataFrame):
+        """Settles the markets of one region at a timestamp of a fast-forwarded stretch
+
+        The agents are not executed. Their bids and offers are derived from their advanced meters (see
+        FastForward.create_bids_offers()) and only the settlements of the markets are executed.
+        """
+
+        tasklist = FastForward.get_settlement_tasks(tasklist)
+        if tasklist.is_empty():
+            return
+
+        region = tasklist.select(pl.first(c.TC_REGION)).item()
+        markets = self.database.get_market_data(region=region)
+        for agents in self.database.get_agent_data(region=region).values():
+            for agent in agents.values():
+                agent.bids_offers = FastForward.create_bids_offers(agent, tasklist=tasklist, markets=markets)
+
+        self.__execute_region_markets(tasklist=tasklist)
+
+    def __complete_timestamp(self, timestamp: datetime, counter: int):
+        """Completes the execution of a timestamp (checkpoint and progress bar)"""
+
+        # Write a checkpoint of the current state
+        if self.checkpoint_interval and counter % self.checkpoint_interval == 0:
+            self.pbar.set_description('Writing checkpoint for timestamp ' + str(timestamp) + ': ')
+            self.__save_checkpoint(timestamp)
+
+        self.pbar.update(1)
+
+    def __execute_regions(self, timestamp: datetime, func: Callable):
+        """Executes the function for the tasklist of each region of the timestamp (concurrently if enabled)"""
+
+        # get current timestamp as string item for progress bar
+        timestamp_str = str(timestamp)
 
-    def resume(self):
-        """Resumes the simulation"""
-        raise NotImplementedError("Resume functionality not implemented yet")
+        # Iterate over timestamp by region
+        regions = self.timetable_index.keys(timestamp)
+        if self.region_pool:
+            # update progress bar description
+            self.pbar.set_description('Executing timestamp ' + timestamp_str + ' for all regions: ')
+
+            # Execute all regions concurrently and wait for all of them before the grids are calculated
+            futures = [self.region_pool.submit(func, self.timetable_index.get(timestamp, region)) for region in regions]
+            concurrent.futures.wait(futures)
+
+            # Raise the first exception that occurred in any of the regions
+            for future in futures:
+                future.result()
+        else:
+            for region in regions:
+                # update progress bar description
+                self.pbar.set_description('Executing timestamp ' + timestamp_str + ' for region ' + str(region) + ': ')
+
+                func(self.timetable_index.get(timestamp, region))
+
+    def __execute_region(self, tasklist: pl.DataFrame):
+        """Executes the agents and markets of one region for the current timestamp"""
+
+        self.__execute_region_agents(tasklist=tasklist)
+
+        self.__execute_region_markets(tasklist=tasklist)
+
+    def __execute_region_agents(self, tasklist: pl.DataFrame):
+        """Executes the agents of one region for the current timestamp"""
+
+        region, timestamp = tasklist.select(pl.first(c.TC_REGION), pl.first(c.TC_TIMESTAMP)).row(0)
+
+        # Wait for the forecasts that were made for this timestamp while the markets of the last one were cleared
+        self.__wait_for_prefetches(region=region)
+
+        # Stream the rows of the agents that are not needed anymore to disk
+        if self.writer:
+            self.database.prune_region(region=region, before=timestamp, writer=self.writer, markets=False)
+
+        # Execute the agents in parallel or sequentially
+        if self.pool:
+            self.__execute_agents_parallel(tasklist=tasklist)
+        else:
+            self.__execute_agents(tasklist=tasklist)
+
+        # Write the changed agent tables to the columnar store at once
+        if self.columnar_store:
+            self.database.flush_agent_store(region=region)
+
+        # Start the forecasts of the next timestamp (they run while the markets are cleared)
+        if self.pipeline_forecasts:
+            self.__prefetch_forecasts(region=region, timestamp=timestamp)
+
+    def __prefetch_forecasts(self, region: str, timestamp: datetime):
+        """Starts the exogenous forecasts of the agents of the region for the timestamp that follows the given one"""
+
+        # Get the next timestamp of the simulation (nothing to prefetch after the last one)
+        timestamps = self.timetable_index.timestamps
+        idx = bisect.bisect_right(timestamps, timestamp)
+        if idx >= len(timestamps):
+            return
+        next_timestamp = timestamps[idx]
+
+        # The worker processes keep the forecasters of their agents and make the forecasts themselves
+        if isinstance(self.pool, ProcessPool):
+            self.pool.prefetch(region=region, timestamp=next_timestamp)
+            return
+
+        self.prefetches[region] = [self.prefetch_pool.submit(agent.prefetch_forecasts, next_timestamp)
+                                   for agent in self.agents[region].values()]
+
+    def __wait_for_prefetches(self, region: str = None):
+        """Waits for the running prefetches of the region (all regions if None) and raises their exceptions"""
+
+        regions = [region] if region else list(self.prefetches.keys())
+        for key in regions:
+            for future in self.prefetches.pop(key, []):
+                future.result()
+
+    def __execute_region_markets(self, tasklist: pl.DataFrame):
+        """Executes the markets of one region for the current timestamp"""
+
+        region, timestamp = tasklist.select(pl.first(c.TC_REGION), pl.first(c.TC_TIMESTAMP)).row(0)
+
+        # Stream the rows of the markets that are not needed anymore to disk
+        self.__prune_markets(region=region, timestamp=timestamp)
+
+        # Execute the markets in parallel or sequentially
+        if self.pool:
+            self.__execute_markets_parallel(tasklist=tasklist)
+        else:
+            self.__execute_markets(tasklist=tasklist)
+
+    def __prune_markets(self, region: str, timestamp: datetime):
+        """Streams the rows of the market tables before the timestamp to disk and removes them from memory"""
+
+        if not self.writer:
+            return
+
+        self.database.prune_region(region=region, before=timestamp, writer=self.writer, agents=False)
+
+        # The workers pruned their market tables themselves, which invalidates the synchronized number of rows
+        if isinstance(self.pool, ProcessPool):
+            self.pool.mark_synced(region=region, markets=self.database.get_market_data(region=region))
 
     def __execute_agents_parallel(self, tasklist: pl.DataFrame):
         """Executes all agent tasks for all agents in parallel"""
 
+        # Execute the agents in the worker processes if the process backend is used
+        if isinstance(self.pool, ProcessPool):
+            self.__execute_agents_process(tasklist=tasklist)
+            return
+
         # Define the function to be executed in parallel
         def tasks(agent):
             # Execute the agent
-            return agent.execute()
+            return agent.step(tasklist)
 
-        # Get the data of the agents that are part of the tasklist
+        # Get the agents that are part of the tasklist
         region = tasklist.select(pl.first(c.TC_REGION)).item()
-        agents = self.database.get_agent_data(region=region)
-
-        # Create a list to store the agents
-        agents_list = []
-
-        # Iterate over the tasklist and populate the agents_list
-        for agent_type, agent in agents.items():
-            for agent_id, data in agent.items():
-                agents_list.append(Agent(agent_type=agent_type, data=agent[agent_id], timetable=tasklist,
-                                         database=self.database))
+        agents_list = list(self.agents[region].values())
 
         # Submit the agents for parallel execution
         futures = [self.pool.submit(tasks, agent) for agent in agents_list]
@@ -210,75 +725,101 @@ class Executor:
                 # e.g., logging or additional computations
             except Exception as e:
                 # Handle exceptions (e.g., log them)
-                raise f"An error occurred when retrieving agent results: {e}"
+                raise RuntimeError(f"An error occurred when retrieving agent results: {e}") from e
 
         # Post the agent data back to the database
         self.database.post_agents_to_region(region=region, agents=results)
 
-    def __execute_market_parallel(self, tasklist: pl.DataFrame):
-        """Executes the market tasks in parallel"""
+    def __execute_agents_process(self, tasklist: pl.DataFrame):
+        """Executes all agent tasks in the worker processes and posts the changed tables back to the database"""
 
-        # Define the function to be executed in parallel
-        def tasks(market):
-            # Execute the market
-            return market.execute()
+        # Get the region of the tasklist and its markets (needed to send the new transactions to the workers)
+        region, timestamp = tasklist.select(pl.first(c.TC_REGION), pl.first(c.TC_TIMESTAMP)).row(0)
+        markets = self.database.get_market_data(region=region)
 
-        # Create a list to store the markets
-        markets_list = []
+        # Execute the agents in the workers (they remove the same rows as the main process when streaming results)
+        results = self.pool.execute(tasklist=tasklist, markets=markets,
+                                    prune_before=timestamp if self.writer else None)
+
+        # Post the changed agent tables back to the database
+        self.database.post_agent_tables(region=region, tables=results)
+
+    def __create_process_pool(self, path_checkpoint: str = None) -> ProcessPool:
+        """Creates the process pool and distributes the agents of all regions across its workers
 
-        # Iterate over the tasklist and populate the markets_list
-        for task in tasklist.iter_rows(named=True):
+        Args:
+            path_checkpoint: path to a checkpoint the workers load the agent data from. Defaults to the checkpoint the
+                simulation was resumed from (if any).
+
+        """
+
+        # Get the agent ids of each region sorted by agent type
+        agents = {}
+        for region in self.structure.keys():
+            agents[region] = {agent_type: list(agent_ids.keys())
+                              for agent_type, agent_ids in self.database.get_agent_data(region=region).items()}
+
+        # The workers load the agent data from the checkpoint when the simulation is resumed
+        if path_checkpoint is None and self.resume_from is not None:
+            path_checkpoint = self.checkpoint.path
+
+        # The workers connect through a socket with the socket backend
+        socket_config = self.socket_config if self.backend == 'socket' else {}
+
+        return ProcessPool(num_workers=self.num_workers, path_scenario=self.path_scenario, structure=self.structure,
+                           agents=agents, path_checkpoint=path_checkpoint, passive=self.passive_agents,
+                           seed=self.seed, memory_map=self.memory_map, **socket_config)
+
+    def __execute_markets_parallel(self, tasklist: pl.DataFrame):
+        """Executes the market tasks in parallel
+
+        All markets of the region (different types, names and timesteps) are cleared concurrently. Each market takes
+        its partition from the order book of the region and works on a shallow copy of the market data: the tables it
+        changes are replaced on the copy (see HistoryTable), while the tables it only reads are shared. The results are
+        written back to the database in one merge after all markets completed.
+        """
+
+        # Get the region of the tasklist
+        region = tasklist.select(pl.first(c.TC_REGION)).item()
+
+        # Create the markets
+        # Note: The markets are created in the calling thread so that the tasks only read from their own data
+        markets_list = []
+        for tasks in tasklist.iter_rows(named=True):
             # Get the market data for the current market
-            market = self.database.get_market_data(region=task[c.TC_REGION],
-                                                   market_type=task[c.TC_MARKET],
-                                                   market_name=task[c.TC_NAME])
-            market = copy(market)
+            market = self.database.get_market_data(region=tasks[c.TC_REGION],
+                                                   market_type=tasks[c.TC_MARKET],
+                                                   market_name=tasks[c.TC_NAME])
             # Create an instance of the Market class and append it to the markets_list
-            markets_list.append(Market(data=market, tasks=task, database=self.database))
-
+            markets_list.append(Market(data=market, tasks=tasks, database=self.database))
 
         # Submit the markets for parallel execution
-        futures = [self.pool.submit(tasks, market) for market in markets_list]
+        # Note: The markets have their own thread pool as they can be submitted from within the region pool while the
+        #   agent pool might be used by other regions
+        futures = [self.market_pool.submit(market.execute) for market in markets_list]
 
         # Wait for all markets to complete
-        # TODO: For some reason it gets stuck here. Investigate why.
         concurrent.futures.wait(futures)
 
-        # Retrieve and process results from the futures
-        results = []
-        for future in futures:
-            try:
-                result = future.result(timeout=60)
-                results.append(result)
-                # Optionally process each result as needed
-                # e.g., logging or additional computations
-            except Exception as e:
-                # Handle exceptions (e.g., log them)
-                raise f"An error occurred when retrieving market results: {e}"
-
-        print(results)
-        exit()
+        # Retrieve the results from the futures (raises the exception if one occurred in a market)
+        results = [future.result() for future in futures]
 
-        # Post the agent data back to the database
-        self.database.post_markets_to_region(region=task[c.TC_REGION], markets=results)
+        # Post the market data back to the database
+        self.database.post_markets_to_region(region=region, markets=results)
 
     def __execute_agents(self, tasklist: pl.DataFrame):
         """Executes all agent tasks for all agents sequentially
         """
 
-        # Get the data of the agents that are part of the tasklist
+        # Get the region of the tasklist
         region = tasklist.select(pl.first(c.TC_REGION)).item()
-        agents = self.database.get_agent_data(region=region)
 
         # Create a list to store the results
         results = []
 
         # Iterate over the agents and execute them sequentially
-        for agent_type, agent in agents.items():
-            for agent_id, data in agent.items():
-                # Create an instance of the Agents class and execute its tasks
-                results.append(Agent(agent_type=agent_type, data=agent[agent_id], timetable=tasklist,
-                                     database=self.database).execute())
+        for agent in self.agents[region].values():
+            results.append(agent.step(tasklist))
 
         # Post the agent data back to the database
         self.database.post_agents_to_region(region=region, agents=results)
@@ -314,8 +855,13 @@ class Executor:
         # Pass info to grids class and execute its tasks
         Grid().execute()
 
-    def __prepare_scenario(self):
-        """Prepares the scenario"""
+    def __prepare_scenario(self, copy: bool = True):
+        """Prepares the scenario
+
+        Args:
+            copy: if True, the scenario folder is copied to the results folder (False when resuming a simulation).
+
+        """
 
         # Load general information and configuration
         self.general = f.load_file(os.path.join(self.path_scenario, 'general', 'general.json'))
@@ -324,39 +870,47 @@ class Executor:
         # Load timetable
         self.timetable = f.load_file(os.path.join(self.path_scenario, 'general', 'timetable.ft'),
                                      df='polars', method='eager')
+        self.timetable_index = TimetableIndex(self.timetable)
 
         # Load scenario structure
         self.structure = self.general['structure']
 
         # Set the results path
         self.path_results = os.path.join(self.config['paths']['results'], self.name)
+        # Set the checkpoint path
+        self.path_checkpoint = self.path_checkpoint if self.path_checkpoint else os.path.join(self.path_results,
+                                                                                              'checkpoint')
+        # The results folder already contains the results of the simulation that is resumed
+        if not copy:
+            return
         # Check if the results folder exists and stop simulation if overwrite is set to False
         if os.path.exists(self.path_results) and self.overwrite is False:
             raise FileExistsError(f"Results folder already exists. "
                                   f"Set overwrite to True to overwrite the results folder.")
-        # Copy the scenario folder to the results folder
-        # Note: For the execution the files in the results folder are used and not the ones in the scenario folder
-        f.copy_folder(self.path_scenario, self.path_results)
+        # Initialize the results folder with the scenario
+        # Note: The data is loaded from the scenario folder. The results folder only needs to contain the inputs to be
+        #   self-contained for the analysis.
+        if self.results_init == 'link':
+            f.link_folder(self.path_scenario, self.path_results)
+        elif self.results_init == 'reference':
+            f.create_folder(self.path_results)
+            f.save_file(os.path.join(self.path_results, 'scenario.json'),
+                        data={'path_scenario': self.path_scenario, 'name': self.name})
+        else:
+            f.copy_folder(self.path_scenario, self.path_results)
 
     def __setup_database(self):
         """Creates a database connector object"""
 
-        self.database.setup_database(self.structure)
+        self.database.setup_database(self.structure, aggregate=self.aggregate_agents, columnar=self.columnar_store,
+                                     memory_map=self.memory_map)
 
-    @staticmethod
-    def __wait_for_ts(timestamp):
-        """Waits until the target timestamp is reached"""
+    def __setup_agents(self):
+        """Creates the agent instances of all regions that are kept for the entire simulation"""
 
-        # Get current datetime
-        current_datetime = datetime.now()
-
-        # Calculate time difference
-        time_difference = (timestamp - current_datetime).total_seconds()
-
-        # Wait until the target time is reached
-        if time_difference > 0:
-            time.sleep(time_difference)
-        elif time_difference < 0:
-            warnings.warn(f"Target time is in the past: {timestamp} vs. {current_datetime}")
-
-        return
+        for region in self.structure.keys():
+            self.agents[region] = {}
+            for agent_type, agents in self.database.get_agent_data(region=region).items():
+                for agent_id, data in agents.items():
+                    self.agents[region][agent_id] = Agent(agent_type=agent_type, data=data, database=self.database,
+                                                          passive=self.passive_agents)
@@ -0,0 +1,280 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+# This file is in charge of running several variants of a scenario that share the preloaded scenario data
+
+# Imports
+import os
+import queue
+import traceback
+import multiprocessing as mp
+import polars as pl
+from hamlet import functions as f
+from hamlet.executor.setup import Executor
+from hamlet.executor.utilities.database.database import Database
+
+# Base data of the sweep that is inherited by the forked variant processes (set in Sweep.run())
+_base = None
+
+
+class Sweep:
+    """
+    Runs variants of one scenario in parallel processes that share the preloaded scenario data.
+
+    The base scenario (weather, retailer, timetable and all agent tables) is loaded once. Each variant is then executed
+    in a forked process that inherits the loaded data copy-on-write, i.e. the Arrow buffers of the tables are shared
+    until a variant changes them. The overrides of a variant are applied in its process before the simulation starts.
+
+    The results of all variants are written to one dataset that is partitioned by variant:
+    '<results>/<name>/variant=<variant>/<scenario>/...'. The overrides are documented in '<results>/<name>/sweep.json'.
+
+    Overrides of a variant (all keys are optional):
+        - agents: list of dictionaries that each select agents and change their data:
+            - types: agent types the override applies to (all types if missing).
+            - ids: agent ids the override applies to (all agents if missing).
+            - account: {key path: value}, e.g. {'ems/market/strategy': 'zi'}. Key paths are separated by '/'.
+            - plants: {plant type: {key path: value}}, e.g. {'battery': {'sizing/capacity': 10000}}.
+        - timetable: {column: value} to change the market configuration, e.g. {'pricing': 'uniform'}.
+        - retailer: {column: value} to change the retailer tables of all markets, e.g. {'energy_price_sell': 0.1}.
+        - seed: seed of the random number generators of the variant (see Executor).
+        - modify: function that is called with the Database and the Executor for all other changes.
+
+    Attributes:
+        path_scenario: path to the scenario folder.
+        variants: dictionary with the variant names as keys and their overrides as values.
+        name: name of the sweep (folder in the results folder).
+        num_processes: number of variants that are executed at the same time.
+        executor_kwargs: keyword arguments for the Executor of each variant.
+
+    Example:
+        ```
+        sweep = Sweep(path, variants={'linear': {}, 'zi': {'agents': [{'account': {'ems/market/strategy': 'zi'}}]}})
+        sweep.run()
+        ```
+
+    """
+
+    # Name of the partition column of the results and of the file that documents the overrides
+    PARTITION = 'variant'
+    MANIFEST = 'sweep.json'
+
+    def __init__(self, path_scenario: str, variants: dict, name: str = None, num_processes: int = None,
+                 **executor_kwargs):
+        """
+        Args:
+            path_scenario: path to the scenario folder.
+            variants: dictionary with the variant names as keys and their overrides as values (see class docstring).
+            name: name of the sweep. Defaults to the name of the scenario with the suffix '_sweep'.
+            num_processes: number of variants that are executed at the same time. Defaults to the number of logical
+                processors - 1.
+            **executor_kwargs: keyword arguments for the Executor of each variant (by default, each variant uses one
+                worker and references the scenario folder instead of copying it).
+
+        """
+        self.path_scenario = os.path.abspath(path_scenario)
+        self.variants = variants
+        self.name = name if name else f'{os.path.basename(self.path_scenario)}_sweep'
+        self.num_processes = num_processes if num_processes else max(1, os.cpu_count() - 1)
+        self.executor_kwargs = {'num_workers': 1, 'results_init': 'reference', **executor_kwargs}
+
+    def run(self):
+        """Loads the base scenario once and executes all variants"""
+
+        global _base
+
+        # Load the base scenario
+        general = f.load_file(os.path.join(self.path_scenario, 'general', 'general.json'))
+        database = Database(self.path_scenario)
+        database.setup_database(general['structure'])
+        _base = database
+
+        # Document the overrides of the variants (functions are stored by their name)
+        path_results = self.get_path_results()
+        f.save_file(os.path.join(path_results, self.MANIFEST),
+                    data={'path_scenario': self.path_scenario,
+                          'variants': {variant: self.__describe(overrides)
+                                       for variant, overrides in self.variants.items()}})
+
+        # Execute the variants in forked processes (they inherit the loaded data copy-on-write)
+        # Note: The processes are forked while the main process is idle. Forking while polars is executing a query in
+        #   its thread pool can lead to deadlocks (the reason why the process backend of the Executor uses 'spawn').
+        context = mp.get_context('fork')
+        errors = context.Queue()
+        pending = list(self.variants.items())
+        running = {}  # process: variant
+        exitcodes = {}  # variant: exit code of its process
+        while pending or running:
+            # Start new variants as long as processes are available
+            while pending and len(running) < self.num_processes:
+                variant, overrides = pending.pop(0)
+                process = context.Process(target=self._run_variant, args=(variant, overrides, errors))
+                process.start()
+                running[process] = variant
+
+            # Wait for the running variants
+            for process in list(running.keys()):
+                process.join(timeout=0.1)
+                if not process.is_alive():
+                    exitcodes[running.pop(process)] = process.exitcode
+
+        _base = None
+
+        # Raise the errors of the failed variants
+        # Note: The exit codes are decisive as a process can fail before it sends its error (e.g. if it is killed)
+        failed = {}
+        while True:
+            # Wait shortly for the errors of the failed processes that were not received yet
+            missing = any(exitcode != 0 and variant not in failed for variant, exitcode in exitcodes.items())
+            try:
+                variant, error = errors.get(timeout=1) if missing else errors.get_nowait()
+            except queue.Empty:
+                break
+            failed[variant] = error
+        for variant, exitcode in exitcodes.items():
+            if exitcode != 0 and variant not in failed:
+                failed[variant] = f'The process exited with code {exitcode}.'
+        if failed:
+            raise RuntimeError('The following variants failed:\n' + '\n'.join(f'{variant}:\n{error}'
+                                                                              for variant, error in failed.items()))
+
+        return path_results
+
+    def get_path_results(self) -> str:
+        """Returns the path to the results folder of the sweep"""
+
+        config = f.load_file(os.path.join(self.path_scenario, 'config', 'config_setup.yaml'))
+
+        return os.path.join(config['paths']['results'], self.name)
+
+    def collect(self, path_table: str) -> pl.DataFrame:
+        """
+        Collects one result table of all variants in one dataframe with the partition column (e.g. variant).
+
+        Args:
+            path_table: path of the table relative to the results folder of the scenario, e.g.
+                'region/markets/lem/market/market_transactions.csv'.
+
+        Returns:
+            pl.DataFrame: tables of all variants that were executed (missing columns are filled with null).
+
+        """
+        tables = []
+        for variant in self.variants.keys():
+            path = os.path.join(self.get_path_results(), f'{self.PARTITION}={variant}',
+                                os.path.basename(self.path_scenario), path_table)
+            if not os.path.exists(path):
+                continue
+            table = f.load_file(path, df='polars', method='eager')
+            tables.append(table.with_columns(pl.lit(str(variant)).alias(self.PARTITION)))
+
+        if not tables:
+            return pl.DataFrame()
+
+        return pl.concat(tables, how='diagonal')
+
+    def _run_variant(self, variant: str, overrides: dict, errors):
+        """Applies the overrides of the variant to the inherited data and executes it (runs in the forked process)"""
+
+        try:
+            database = _base
+
+            # Change the agent and market data before the agents are created
+            for override in overrides.get('agents', []):
+                self.apply_agent_overrides(database, override)
+            if overrides.get('retailer'):
+                self.apply_retailer_overrides(database, overrides['retailer'])
+
+            # Create the executor of the variant (its results are a partition of the dataset of the sweep)
+            name = os.path.join(self.name, f'{self.PARTITION}={variant}', os.path.basename(self.path_scenario))
+            executor = Executor(self.path_scenario, name=name, database=database, seed=overrides.get('seed'),
+                                **self.executor_kwargs)
+
+            if overrides.get('modify'):
+                overrides['modify'](database, executor)
+
+            executor.setup()
+
+            # Change the market configuration in the timetable
+            if overrides.get('timetable'):
+                executor.set_timetable(executor.timetable.with_columns(
+                    [pl.lit(value).cast(executor.timetable.schema[column]).alias(column)
+                     for column, value in overrides['timetable'].items()]))
+
+            executor.execute()
+            executor.cleanup()
+        except Exception:
+            errors.put((variant, traceback.format_exc()))
+            # Wait until the error was sent before the process exits
+            errors.close()
+            errors.join_thread()
+            raise
+
+    @staticmethod
+    def apply_agent_overrides(database: Database, override: dict):
+        """
+        Changes the account and plants of the selected agents of all regions.
+
+        Args:
+            database: database of the scenario.
+            override: dictionary with the keys types, ids, account and plants (see class docstring).
+
+        """
+        for region in database.get_regions():
+            for agent_type, agents in database.get_agent_data(region=region).items():
+                if override.get('types') is not None and agent_type not in override['types']:
+                    continue
+                for agent_id, agent in agents.items():
+                    if override.get('ids') is not None and agent_id not in override['ids']:
+                        continue
+
+                    for key_path, value in override.get('account', {}).items():
+                        set_by_path(agent.account, key_path, value)
+
+                    for plant_type, values in override.get('plants', {}).items():
+                        for plant in agent.plants.values():
+                            if plant['type'] != plant_type:
+                                continue
+                            for key_path, value in values.items():
+                                set_by_path(plant, key_path, value)
+
+    @staticmethod
+    def apply_retailer_overrides(database: Database, values: dict):
+        """
+        Changes columns of the retailer tables of all markets.
+
+        Args:
+            database: database of the scenario.
+            values: dictionary with the column names as keys and the new values.
+
+        """
+        for region in database.get_regions():
+            for market_type, markets in database.get_market_data(region=region).items():
+                for market_name, market in markets.items():
+                    market.retailer = market.retailer.with_columns(
+                        [pl.lit(value).cast(market.retailer.schema[column]).alias(column)
+                         for column, value in values.items()])
+
+    @staticmethod
+    def __describe(overrides: dict) -> dict:
+        """Returns the overrides in a json serializable form"""
+
+        return {key: value.__name__ if callable(value) else value for key, value in overrides.items()}
+
+
+def set_by_path(data: dict, key_path: str, value):
+    """
+    Sets a value in a nested dictionary.
+
+    Args:
+        data: nested dictionary.
+        key_path: keys of the levels separated by '/', e.g. 'ems/market/strategy'.
+        value: new value.
+
+    """
+    *keys, last = key_path.split('/')
+    for key in keys:
+        data = data.setdefault(key, {})
+    data[last] = value
@@ -0,0 +1,250 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+# This file is in charge of executing the time horizon of a scenario in parallel chunks (experimental)
+
+# Imports
+import os
+import shutil
+import warnings
+import multiprocessing as mp
+import polars as pl
+from hamlet import functions as f
+from hamlet import constants as c
+from hamlet.executor.setup import Executor
+from hamlet.executor.utilities.database.database import Database
+
+# Tables of the agents that carry the state from one chunk to the next
+STATE_TABLES = ['meters', 'socs']
+
+# Market tables that are collected from the chunks (appended) and the ones that only the last chunk provides
+MARKET_TABLES = ['market_transactions', 'bids_cleared', 'offers_cleared']
+MARKET_TABLES_LAST = ['bids_uncleared', 'offers_uncleared']
+
+
+class TimeParallel:
+    """
+    Executes the time horizon of a scenario in chunks that run in parallel (experimental).
+
+    If the timestamps are not coupled through the markets (e.g. all markets have no clearing, i.e. pure retailer
+    markets, and the agents do not react to local prices), consecutive days only depend on each other through the
+    states of the storages (socs) and the meter readings. The horizon is therefore split into chunks that are executed
+    in parallel processes. All chunks but the first start from an estimated state:
+        - first sweep: the initial state of the scenario.
+        - correction sweeps: the state at the end of the previous chunk in the last sweep.
+    Chunks whose initial socs did not change are not executed again. Each sweep makes at least one more chunk exact, so
+    after the maximum number of correction sweeps the first chunks are exact and the remaining ones approximate (their
+    socs may jump at the start of the chunk). The meters are made continuous by shifting each chunk by the
+    difference between the meters at the end of the previous chunk and the meters it started from.
+
+    The results are merged into the database of the main process and saved as the results of a normal simulation. The
+    chunk processes are spawned and load the scenario themselves, so the calling script needs an
+    `if __name__ == '__main__':` guard.
+
+    Attributes:
+        path_scenario: path to the scenario folder.
+        num_chunks: number of chunks the timestamps are split into.
+        corrections: maximum number of correction sweeps.
+        name: name of the results folder.
+        num_processes: number of chunks that are executed at the same time.
+        executor_kwargs: keyword arguments for the Executor of each chunk.
+
+    Example:
+        ```
+        sim = TimeParallel(path, num_chunks=12, corrections=2)
+        sim.run()
+        ```
+
+    """
+
+    def __init__(self, path_scenario: str, num_chunks: int = None, corrections: int = 2, name: str = None,
+                 num_processes: int = None, **executor_kwargs):
+        """
+        Args:
+            path_scenario: path to the scenario folder.
+            num_chunks: number of chunks. Defaults to the number of processes.
+            corrections: maximum number of correction sweeps (0 only executes the first sweep).
+            name: name of the results folder. Defaults to the name of the scenario.
+            num_processes: number of chunks that are executed at the same time. Defaults to the number of logical
+                processors - 1.
+            **executor_kwargs: keyword arguments for the Executor of each chunk (by default, each chunk uses one
+                worker and references the scenario folder instead of copying it).
+
+        """
+        self.path_scenario = os.path.abspath(path_scenario)
+        self.num_processes = num_processes if num_processes else max(1, os.cpu_count() - 1)
+        self.num_chunks = num_chunks if num_chunks else self.num_processes
+        self.corrections = corrections
+        self.name = name if name else os.path.basename(self.path_scenario)
+        self.executor_kwargs = {'num_workers': 1, 'results_init': 'reference', **executor_kwargs}
+
+        if self.num_chunks < 1:
+            raise ValueError(f'The number of chunks ({self.num_chunks}) needs to be at least 1.')
+
+    def run(self):
+        """Executes the chunks in parallel sweeps and saves the merged results"""
+
+        # Load the base scenario
+        general = f.load_file(os.path.join(self.path_scenario, 'general', 'general.json'))
+        database = Database(self.path_scenario)
+        database.setup_database(general['structure'])
+
+        # Create the executor of the merged results (it also provides the timetable)
+        executor = Executor(self.path_scenario, name=self.name, database=database, **self.executor_kwargs)
+        executor.setup()
+        self.__check_coupling(executor.timetable)
+
+        # Split the timestamps into chunks of consecutive timestamps
+        timestamps = executor.timetable_index.timestamps
+        size = -(-len(timestamps) // self.num_chunks)
+        chunks = [timestamps[idx:idx + size] for idx in range(0, len(timestamps), size)]
+        starts = [chunk[0] for chunk in chunks]
+
+        # Execute the sweeps
+        # Note: 'spawn' is used as forking a process that already runs polars' thread pool can lead to deadlocks (and
+        #   is not available on Windows). Each process loads the base scenario itself (see ProcessPool).
+        context = mp.get_context('spawn')
+        results = [None] * len(chunks)
+        initial = [None] * len(chunks)  # estimated states at the start of each chunk (None: state of the scenario)
+        pending = list(range(len(chunks)))
+        for _ in range(self.corrections + 1):
+            args = [(idx, general['structure'], chunks[idx], starts[idx + 1] if idx + 1 < len(chunks) else None,
+                     initial[idx]) for idx in pending]
+            with context.Pool(min(self.num_processes, len(pending))) as pool:
+                for idx, result in zip(pending, pool.starmap(self._run_chunk, args)):
+                    results[idx] = result
+
+            # Estimate the initial states of the next sweep and execute the chunks whose socs changed again
+            pending = []
+            for idx in range(1, len(chunks)):
+                state = results[idx - 1]['end']
+                if self.__socs_changed(database, initial[idx], state):
+                    pending.append(idx)
+                initial[idx] = state
+            if not pending:
+                break
+
+        # Merge the chunks into the database of the main process and save it
+        self.__merge(database, results)
+        shutil.rmtree(os.path.join(os.path.dirname(executor.path_results), f'{self.name}_chunks'), ignore_errors=True)
+        executor.cleanup()
+
+        return executor.path_results
+
+    def _run_chunk(self, idx: int, structure: dict, timestamps: list, end, initial: dict) -> dict:
+        """Executes one chunk from the given initial state (runs in the spawned process)
+
+        Returns:
+            dict: serialized tables of the chunk: 'agents' (meters and socs of the timestamps after the start of the
+                chunk), 'markets' (market tables), 'start' (meters the chunk started from) and 'end' (state at the end
+                of the chunk).
+
+        """
+        # Load the base scenario
+        database = Database(self.path_scenario)
+        database.setup_database(structure)
+
+        # Set the initial state of the agents at the start of the chunk
+        start = timestamps[0]
+        if initial:
+            for (region, agent_type, agent_id), tables in initial.items():
+                agent = database.get_agent_data(region=region, agent_type=agent_type, agent_id=agent_id)
+                for name, table in tables.items():
+                    setattr(agent, name, getattr(agent, name).update(f.ipc_to_df(table), on=c.TC_TIMESTAMP))
+
+        # Execute the timestamps of the chunk
+        name = os.path.join(f'{self.name}_chunks', f'chunk={idx}', os.path.basename(self.path_scenario))
+        executor = Executor(self.path_scenario, name=name, database=database, **self.executor_kwargs)
+        executor.setup()
+        executor.set_timetable(executor.timetable.filter(pl.col(c.TC_TIMESTAMP).is_in(timestamps)))
+        executor.execute()
+
+        # Collect the changed rows of the agents and the state at the end of the chunk
+        after_start = pl.col(c.TC_TIMESTAMP) > start
+        if end is not None:
+            after_start = after_start & (pl.col(c.TC_TIMESTAMP) <= end)
+        result = {'agents': {}, 'markets': {}, 'start': {}, 'end': {}}
+        for region in database.get_regions():
+            for agent_type, agents in database.get_agent_data(region=region).items():
+                for agent_id, agent in agents.items():
+                    key = (region, agent_type, agent_id)
+                    tables = {name: getattr(agent, name) for name in STATE_TABLES}
+                    result['agents'][key] = {name: f.df_to_ipc(table.filter(after_start))
+                                             for name, table in tables.items()}
+                    result['start'][key] = f.df_to_ipc(agent.meters.filter(pl.col(c.TC_TIMESTAMP) == start))
+                    if end is not None:
+                        result['end'][key] = {name: f.df_to_ipc(table.filter(pl.col(c.TC_TIMESTAMP) == end))
+                                              for name, table in tables.items()}
+
+            for market_type, markets in database.get_market_data(region=region).items():
+                for market_name, market in markets.items():
+                    result['markets'][(region, market_type, market_name)] = {
+                        name: f.df_to_ipc(getattr(market, name)) for name in MARKET_TABLES + MARKET_TABLES_LAST}
+
+        return result
+
+    @staticmethod
+    def __merge(database: Database, results: list):
+        """Writes the results of all chunks into the database with continuous meters"""
+
+        # Agents: replace the rows of each chunk (the meters are shifted to continue the previous chunk)
+        for result in results:
+            for (region, agent_type, agent_id), tables in result['agents'].items():
+                agent = database.get_agent_data(region=region, agent_type=agent_type, agent_id=agent_id)
+
+                # Difference between the merged meters at the start of the chunk and the meters it started from
+                start = f.ipc_to_df(result['start'][(region, agent_type, agent_id)])
+                offset = {}
+                if not start.is_empty():
+                    merged = agent.meters.filter(pl.col(c.TC_TIMESTAMP) == start[0, c.TC_TIMESTAMP])
+                    offset = {col: merged[0, col] - start[0, col] for col in start.columns if col != c.TC_TIMESTAMP}
+
+                for name, table in tables.items():
+                    table = f.ipc_to_df(table)
+                    if name == 'meters' and any(offset.values()):
+                        table = table.with_columns([(pl.col(col) + offset[col]).cast(table.schema[col]).alias(col)
+                                                    for col in table.columns if col in offset])
+                    setattr(agent, name, getattr(agent, name).update(table, on=c.TC_TIMESTAMP))
+
+        # Markets: append the results of all chunks (the uncleared tables are taken from the last chunk)
+        for key in results[0]['markets'].keys():
+            region, market_type, market_name = key
+            market = database.get_market_data(region=region)[market_type][market_name]
+            for name in MARKET_TABLES:
+                setattr(market, name, pl.concat([f.ipc_to_df(result['markets'][key][name]) for result in results],
+                                                how='diagonal'))
+            for name in MARKET_TABLES_LAST:
+                setattr(market, name, f.ipc_to_df(results[-1]['markets'][key][name]))
+
+    @staticmethod
+    def __socs_changed(database: Database, previous: dict | None, state: dict) -> bool:
+        """Checks if the socs of the new initial state differ from the ones the chunk was executed with"""
+
+        for (region, agent_type, agent_id), tables in state.items():
+            socs = f.ipc_to_df(tables['socs'])
+            if socs.is_empty():
+                continue
+
+            # The first sweep started from the socs of the scenario
+            if previous is None:
+                agent = database.get_agent_data(region=region, agent_type=agent_type, agent_id=agent_id)
+                used = agent.socs.filter(pl.col(c.TC_TIMESTAMP) == socs[0, c.TC_TIMESTAMP])
+            else:
+                used = f.ipc_to_df(previous[(region, agent_type, agent_id)]['socs'])
+
+            if not socs.frame_equal(used):
+                return True
+
+        return False
+
+    @staticmethod
+    def __check_coupling(timetable: pl.DataFrame):
+        """Warns if the markets clear, i.e. if the chunks are coupled through the market results"""
+
+        clearing = timetable.get_column(c.TC_CLEARING_TYPE).cast(pl.Utf8).unique().drop_nulls().to_list()
+        if any(value not in ['None', ''] for value in clearing):
+            warnings.warn(f'The markets of the scenario are cleared ({", ".join(clearing)}). The chunks are only '
+                          f'coupled through the socs and meters, so the results are approximate.')
@@ -6,6 +6,7 @@ __email__ = "markus.doepfert@tum.de"
 
 from hamlet.executor.utilities.controller.rtc.rtc import Rtc
 from hamlet.executor.utilities.controller.mpc.mpc import Mpc
+from hamlet.executor.utilities.controller.surrogate.surrogate import Surrogate
 import hamlet.constants as c
 
 # Instructions: For a new controller type import the class here and add it to the mapping in the Controller class
@@ -21,6 +22,7 @@ class Controller:
         controllers = {
             c.C_RTC: Rtc,
             c.C_MPC: Mpc,
+            c.C_SURROGATE: Surrogate,
         }
 
         # Lookup the class based on the controller_type
@@ -0,0 +1,204 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+# This file contains the controller of passive agents, i.e. agents without any flexibility
+
+# Imports
+from datetime import timedelta
+import polars as pl
+from hamlet import constants as c
+from hamlet.executor.utilities.controller.controller_base import ControllerBase
+
+# Plant types whose operation is fully determined by their timeseries (generators only if they are not controllable)
+PASSIVE_LOADS = [c.P_INFLEXIBLE_LOAD]
+PASSIVE_GENERATORS = [c.P_PV, c.P_WIND, c.P_FIXED_GEN]
+
+
+class Passive(ControllerBase):
+    """
+    Controller of agents that have nothing to optimize.
+
+    If an agent only owns inflexible loads and generators that cannot be curtailed, the optimization problems of the
+    rtc and the mpc have exactly one feasible solution: all plants follow their timeseries (rtc) or forecasts (mpc) and
+    the market balances them. This controller computes this solution directly with a few vectorized operations and
+    writes the setpoints and meters in the same way as the linopy controllers instead of building and solving a model
+    for each timestamp.
+
+    If the market split is ambiguous (several markets trade the same energy type), the original controllers are run.
+
+    Attributes:
+        controllers: controller instances that are replaced by this controller (used as fallback).
+        ems: configuration of the energy management system of the agent.
+
+    """
+
+    def __init__(self, controllers: list, ems: dict):
+        """
+        Args:
+            controllers: controller instances that are replaced by this controller (in the order of the ems).
+            ems: configuration of the energy management system of the agent.
+
+        """
+        super().__init__()
+
+        self.controllers = controllers
+        self.ems = ems
+
+        # Controllers that are emulated (in the order of the ems)
+        self.emulated = [controller for controller, params in self.ems['controller'].items()
+                         if params['method'] is not None]
+
+        # Energy types of all plants (used to identify the meter values in the same way as the rtc)
+        self.energy_types = set()
+        for mapping in c.COMP_MAP.values():
+            self.energy_types.update(mapping.keys())
+
+    @staticmethod
+    def is_passive(plants: dict, ems: dict) -> bool:
+        """
+        Checks if an agent has no flexibility and can therefore be controlled by the passive controller.
+
+        Args:
+            plants: plants of the agent.
+            ems: configuration of the energy management system of the agent.
+
+        Returns:
+            bool: True if the agent only owns inflexible loads and non-controllable generators and only uses the rtc
+                and mpc controllers.
+
+        """
+        # Only the rtc and mpc can be emulated
+        if any(controller not in [c.C_RTC, c.C_MPC] for controller, params in ems['controller'].items()
+               if params['method'] is not None):
+            return False
+
+        for plant in plants.values():
+            if plant['type'] in PASSIVE_LOADS:
+                continue
+            if plant['type'] in PASSIVE_GENERATORS and not plant.get('sizing', {}).get('controllable', False):
+                continue
+            return False
+
+        return True
+
+    def run(self, agent, timetable: pl.DataFrame, market: dict, **kwargs):
+        """
+        Computes the setpoints and meters of the agent for the current timestamp.
+
+        Args:
+            agent: AgentDB of the agent.
+            timetable: part of the timetable for the current timestamp and region.
+            market: market data of the region.
+
+        Returns:
+            AgentDB: the updated agent.
+
+        """
+        # Get the current markets and their energy types
+        tasks = timetable.filter(pl.col(c.TC_TIMESTAMP) == pl.col(c.TC_TIMESTEP))
+        markets = {name: c.TRADED_ENERGY[mtype]
+                   for name, mtype in tasks.select([c.TC_NAME, c.TC_MARKET]).unique().rows()}
+
+        # Run the original controllers if the split between the markets needs to be optimized
+        if len(set(markets.values())) < len(markets):
+            for controller in self.controllers:
+                agent = controller.run(agent=agent, timetable=timetable, market=market)
+            return agent
+
+        # Get the current timestamp and the delta between timestamps
+        timestamp = timetable[0, c.TC_TIMESTAMP]
+        dt = self.__get_delta(agent, timetable)
+
+        for controller in self.emulated:
+            if controller == c.C_RTC:
+                agent = self.__rtc(agent, markets, timestamp, dt)
+            elif controller == c.C_MPC:
+                agent = self.__mpc(agent, markets, timestamp, dt)
+
+        return agent
+
+    @staticmethod
+    def __get_delta(agent, timetable: pl.DataFrame) -> timedelta:
+        """Returns the delta between the timesteps of the timetable (or of the meters if it contains only one)"""
+
+        timesteps = timetable.get_column(c.TC_TIMESTEP).unique().sort()
+        if len(timesteps) < 2:
+            timesteps = agent.meters.get_column(c.TC_TIMESTAMP).head(2)
+
+        return timesteps[1] - timesteps[0]
+
+    def __plant_columns(self, agent, markets: dict) -> list:
+        """Returns the expressions for the setpoint columns of the plants and markets from the '<plant>_power' columns"""
+
+        plants = []
+        for plant_id, plant in agent.plants.items():
+            # Loads are modelled negatively as they take energy from the main meter
+            sign = -1 if plant['type'] in PASSIVE_LOADS else 1
+            plants.append((sign * pl.col(f'{plant_id}_power')).cast(pl.Float64).round(0).cast(pl.Int64)
+                          .alias(f'{plant_id}_{plant["type"]}_{c.ET_ELECTRICITY}'))
+
+        # The market balances the plants of its energy type (only electricity as all passive plants are electric)
+        # Note: The plants are summed with fold as the horizontal sum functions differ between the polars versions
+        markets = [(-pl.fold(acc=pl.lit(0, dtype=pl.Int64), function=lambda acc, x: acc + x, exprs=plants)
+                    if plants and energy_type == c.ET_ELECTRICITY
+                    else pl.lit(0, dtype=pl.Int64)).alias(f'{name}_{energy_type}')
+                   for name, energy_type in markets.items()]
+
+        return plants + markets
+
+    def __rtc(self, agent, markets: dict, timestamp, dt: timedelta):
+        """Sets the setpoints of the current timestamp and updates the meters (equivalent to Rtc.Linopy)"""
+
+        # Get the timeseries row of the current timestamp
+        timeseries = agent.get_window('timeseries', timestamp)
+        if len(timeseries) != 1:
+            raise ValueError(f"Timeseries has {len(timeseries)} rows. It should only have 1 row for the rtc.")
+
+        # Compute the solution, i.e. the plant and market powers of the current timestamp
+        solution = timeseries.select(self.__plant_columns(agent, markets)).row(0, named=True)
+
+        # Update the setpoints in the same way as Rtc.Linopy: all values are set to 0, the timestamps are shifted to
+        #   the current one and the first row contains the solution
+        columns = ([col for col in agent.setpoints.columns[1:] if col in solution]
+                   + [col for col in solution if col not in agent.setpoints.columns])
+        timesteps = [timestamp + dt * t for t in range(len(agent.setpoints))]
+        setpoints = (agent.setpoints.select([pl.col(agent.setpoints.columns[0])]
+                                            + [pl.lit(0).alias(col) for col in columns])
+                     .with_columns(pl.Series(timesteps).cast(pl.Datetime(time_unit='ns', time_zone='UTC'))
+                                   .alias(c.TC_TIMESTAMP)))
+        for col in columns:
+            setpoints[0, col] = solution[col]
+        agent.setpoints = setpoints
+
+        # Update the meters of the next timestamp based on the meters of the current timestamp
+        row_now = agent.get_row('meters', timestamp)
+        energy_endings = tuple(f'_{et}' for et in self.energy_types)
+        updates = {}
+        for col in agent.meters.columns[1:]:
+            key = next((key for key in solution if key.startswith(col) and key.endswith(energy_endings)), None)
+            if key and not row_now.is_empty():
+                delta_energy = round(solution[key] * dt.total_seconds() * c.SECONDS_TO_HOURS)
+                updates[col] = row_now[0, col] + delta_energy
+        if updates:
+            agent.set_row('meters', timestamp + dt, updates)
+
+        return agent
+
+    def __mpc(self, agent, markets: dict, timestamp, dt: timedelta):
+        """Sets the setpoints of the following timestamps from the forecasts (equivalent to Mpc.Linopy)"""
+
+        # Reduce the forecasts to the horizon
+        horizon = timedelta(seconds=self.ems['controller'][c.C_MPC]['horizon'])
+        forecasts = agent.forecasts.filter((pl.col(c.TC_TIMESTEP) > timestamp)
+                                           & (pl.col(c.TC_TIMESTEP) < timestamp + horizon))
+
+        # Compute the solution and assign it to the timestamps that follow the current one
+        solution = forecasts.select(self.__plant_columns(agent, markets))
+        solution = solution.hstack(agent.setpoints.select(c.TC_TIMESTAMP).slice(1, len(solution)))
+
+        agent.setpoints = agent.setpoints.update(solution, on=c.TC_TIMESTAMP)
+
+        return agent
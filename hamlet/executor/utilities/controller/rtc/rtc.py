@@ -86,13 +86,12 @@ class Rtc(ControllerBase):
             self.account = self.agent.account
             self.plants = self.agent.plants  # Formerly known as components
             self.setpoints = self.agent.setpoints
-            self.timeseries = self.agent.timeseries
             self.socs = self.agent.socs
             self.meters = self.agent.meters
-            # Filter the timeseries to only include the rows with the current timestamp
-            self.timeseries = self.timeseries.join(self.timetable, on=c.TC_TIMESTAMP, how='semi')
+            # Get the row of the timeseries with the current timestamp (without scanning the timeseries)
+            self.timeseries = self.agent.get_window('timeseries', self.timestamp)
             # Get the targets by filtering the setpoints to only include the rows with the current timestamp
-            self.targets = self.setpoints.join(self.timetable, on=c.TC_TIMESTAMP, how='semi')
+            self.targets = self.agent.get_row('setpoints', self.timestamp)
 
             # Raise warning if timeseries exceeds one row
             if len(self.timeseries) != 1:
@@ -110,12 +109,9 @@ class Rtc(ControllerBase):
             self.market_results = {}
             for market_type, market in self.market.items():
                 for market_name, data in market.items():
-                    # Get transactions table
-                    transactions = data.market_transactions
-                    # Filter for agent ID
-                    transactions = transactions.filter(pl.col(c.TC_ID_AGENT) == self.agent.agent_id)
-                    # Filter for current timestamp
-                    transactions = transactions.filter(pl.col(c.TC_TIMESTEP) == self.timestamp)
+                    # Get the transactions of the agent for the current timestamp (from the index of the timesteps)
+                    transactions = data.get_history(c.TN_MARKET_TRANSACTIONS, start=self.timestamp,
+                                                    column=c.TC_ID_AGENT, value=self.agent.agent_id)
                     # Fill NaN values with 0
                     transactions = transactions.fill_null(0)
                     # Get net energy amount for market
@@ -421,8 +417,9 @@ class Rtc(ControllerBase):
 
         def update_socs(self, solution: dict) -> pl.DataFrame:
 
-            # Find row that is to be updated (i.e. the row with the next timestamp)
-            row_soc = self.socs.filter(self.socs[c.TC_TIMESTAMP] == self.timestamp + self.dt)
+            # Get the index of the socs to find the row that is to be updated (i.e. the row with the next timestamp)
+            index = self.agent.get_time_index('socs', self.socs)
+            updates = {}
 
             # Update socs
             for col in self.socs.columns[1:]:
@@ -437,9 +434,6 @@ class Rtc(ControllerBase):
                     #  we need to multiply the power by -1. Thus the signs are also reversed subsequently.
                     power = solution[key] * -1
 
-                    # Get the column dtype
-                    dtype = self.socs[col].dtype
-
                     # Get soc from plant object
                     soc = self.plant_objects[col].soc
 
@@ -458,23 +452,24 @@ class Rtc(ControllerBase):
                     # Round soc to integer
                     soc = round(soc)
 
-                    # Update the soc value in the DataFrame for the corresponding column
-                    row_soc = row_soc.with_columns(pl.lit(soc).cast(dtype).alias(col))
+                    # Update the soc value for the corresponding column
+                    updates[col] = soc
 
                 # Ensure that soc is within bounds (not implemented as of now to ensure that the model is working)
                 # soc = max(0, min(self.plant_objects[col].capacity, soc))
 
-            # Update socs dataframe
-            self.socs = self.socs.filter(self.socs[c.TC_TIMESTAMP] != self.timestamp + self.dt)
-            self.socs = self.socs.merge_sorted(row_soc, key=c.TC_TIMESTAMP)
+            # Update the row of the next timestamp (only the updated columns are copied)
+            self.socs = index.write_row(self.socs, self.timestamp + self.dt, updates)
 
             return self.socs
 
         def update_meters(self, solution: dict) -> pl.DataFrame:
 
-            # Find row that is to be updated as well as the previous row (i.e. current and next timestamp)
-            row_now = self.meters.filter(self.meters[c.TC_TIMESTAMP] == self.timestamp)
-            row_new = self.meters.filter(self.meters[c.TC_TIMESTAMP] == self.timestamp + self.dt)
+            # Get the index of the meters to find the row of the current timestamp and the row that is to be updated
+            #   (i.e. the row with the next timestamp)
+            index = self.agent.get_time_index('meters', self.meters)
+            row_now = index.row(self.meters, self.timestamp)
+            updates = {}
 
             # Create strings for energy types
             energy_endings = tuple(f'_{et}' for et in self.energy_types)
@@ -484,22 +479,18 @@ class Rtc(ControllerBase):
                 # Extract power from variable values
                 key = next((key for key in solution if key.startswith(col) and key.endswith(energy_endings)), None)
 
-                if key:  # Check for matching key
+                if key and not row_now.is_empty():  # Check for matching key
                     # Calculate energy from power
                     delta_energy = solution[key] * self.dt.total_seconds() * c.SECONDS_TO_HOURS
 
-                    # Get the column dtype
-                    dtype = self.meters[col].dtype
-
                     # Get old meter value from row now
-                    meter_now = row_now[col]
+                    meter_now = row_now[0, col]
 
-                    # Update meter value in row new
-                    row_new = row_new.with_columns(pl.lit(meter_now + round(delta_energy)).cast(dtype).alias(col))
+                    # Update meter value of the next timestamp
+                    updates[col] = meter_now + round(delta_energy)
 
-            # Update meters dataframe
-            self.meters = self.meters.filter(self.meters[c.TC_TIMESTAMP] != self.timestamp + self.dt)
-            self.meters = self.meters.merge_sorted(row_new, key=c.TC_TIMESTAMP)
+            # Update the row of the next timestamp (only the updated columns are copied)
+            self.meters = index.write_row(self.meters, self.timestamp + self.dt, updates)
 
             return self.meters
 
@@ -0,0 +1,286 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+# This file contains the surrogate controller that replaces the optimization of the mpc by a learned model
+
+# Imports
+import os
+from datetime import timedelta
+import numpy as np
+import polars as pl
+from hamlet import constants as c
+from hamlet.executor.utilities.controller.controller_base import ControllerBase
+from hamlet.executor.utilities.controller.mpc.mpc import Mpc
+
+# Note: sklearn and joblib are imported by the methods that use them as they are only needed for the surrogate
+
+# Plant types whose setpoints are fixed by their forecasts, can be curtailed or are storages (used for the repair)
+FIXED_PLANTS = [c.P_INFLEXIBLE_LOAD, c.P_HEAT, c.P_DHW]
+CURTAILABLE_PLANTS = [c.P_PV, c.P_WIND, c.P_FIXED_GEN]
+STORAGE_PLANTS = [c.P_BATTERY, c.P_PSH, c.P_HYDROGEN, c.P_HEAT_STORAGE]
+
+# Prefixes of the feature and target columns of the records and separator of the column name and row
+FEATURE = 'x'
+TARGET = 'y'
+SEPARATOR = '|'
+
+
+class Surrogate(ControllerBase):
+    """
+    Controller that predicts the setpoints of the mpc with a model that was trained on recorded mpc runs.
+
+    The surrogate replaces the mpc in the ems of an agent (set the method of the mpc to None and add the surrogate in
+    its place). The horizon of the mpc configuration is used for the features and the fallback. Methods:
+        - record: runs the mpc (see fallback) and appends its inputs (forecasts within the horizon and socs) and
+            outputs (setpoints) to '<path>/<agent id>.csv'.
+        - sklearn: predicts the setpoints with the model '<path>/<agent id>.joblib' (see train()). The prediction is
+            repaired to be feasible (fixed plants follow their forecasts, generators stay within their forecasts,
+            storages within their power and capacity and the markets balance the plants). If the model is missing,
+            does not match the inputs or its uncertainty is too high, the mpc is run instead.
+
+    Configuration in the ems (e.g. 'controller': {'mpc': {'method': None, 'horizon': 86400},
+    'surrogate': {'method': 'sklearn', 'path': './surrogates', 'max_uncertainty': 0.1}}):
+        - path: folder of the records (record) or models (sklearn).
+        - max_uncertainty: maximum relative spread of the predictions of the trees before the mpc is used.
+        - fallback: method of the mpc that is used for the recording and the fallback.
+
+    Attributes:
+        method: method of the surrogate (record or sklearn).
+        path: folder of the records or models.
+        max_uncertainty: maximum relative spread of the predictions before the mpc is used.
+        mpc: mpc controller that is used for the recording and the fallback.
+        calls: number of runs.
+        fallbacks: number of runs in which the mpc was used instead of the model.
+
+    """
+
+    def __init__(self, method: str = 'sklearn', path: str = './surrogates', max_uncertainty: float = 0.1,
+                 fallback: str = 'linopy', **kwargs):
+
+        # Call the super class
+        super().__init__()
+
+        if method not in ['record', 'sklearn']:
+            raise ValueError(f'Unsupported method: {method}.\nThe available methods are: record, sklearn')
+
+        self.method = method
+        self.path = path
+        self.max_uncertainty = max_uncertainty
+        self.kwargs = kwargs
+
+        # Mpc that is used for the recording and the fallback
+        self.mpc = Mpc(method=fallback)
+
+        # Statistics
+        self.calls = 0
+        self.fallbacks = 0
+
+        # Model of the agent and columns of the records (loaded at the first run as the agent is not known before)
+        self.__model = None
+        self.__columns = None
+
+    def run(self, agent, timetable: pl.DataFrame, market: dict, **kwargs):
+        """
+        Computes the setpoints of the agent for the timesteps of the horizon.
+
+        Args:
+            agent: AgentDB of the agent.
+            timetable: part of the timetable for the current timestamp and region.
+            market: market data of the region.
+
+        Returns:
+            AgentDB: the updated agent.
+
+        """
+        self.calls += 1
+
+        # Get the current timestamp, the delta between timestamps and the inputs of the mpc
+        timestamp = timetable[0, c.TC_TIMESTAMP]
+        dt = timetable[1, c.TC_TIMESTEP] - timetable[0, c.TC_TIMESTEP]
+        forecasts, socs = self.__get_inputs(agent, timestamp)
+        features = self.__flatten(forecasts.drop(c.TC_TIMESTEP), FEATURE) | self.__flatten(socs, FEATURE)
+
+        if self.method == 'record':
+            agent = self.mpc.run(agent=agent, timetable=timetable, market=market)
+            targets = self.__flatten(agent.setpoints.drop(c.TC_TIMESTAMP).slice(1, len(forecasts)), TARGET)
+            self.__record(agent.agent_id, features | targets)
+            return agent
+
+        # Predict the setpoints and use the mpc if the prediction is not reliable
+        solution = self.__predict(agent.agent_id, features)
+        if solution is None:
+            self.fallbacks += 1
+            return self.mpc.run(agent=agent, timetable=timetable, market=market)
+
+        # Repair the prediction and update the setpoints of the timesteps that follow the current one
+        solution = self.__repair(agent, solution, forecasts, socs, dt)
+        solution = solution.hstack(agent.setpoints.select(c.TC_TIMESTAMP).slice(1, len(solution)))
+        agent.setpoints = agent.setpoints.update(solution, on=c.TC_TIMESTAMP)
+
+        return agent
+
+    @staticmethod
+    def train(path_records: str, path_models: str = None, min_samples: int = 50, **params) -> list:
+        """
+        Trains one model per agent on the recorded mpc runs.
+
+        Args:
+            path_records: folder with the records ('<agent id>.csv').
+            path_models: folder the models are saved to ('<agent id>.joblib'). Defaults to the records folder.
+            min_samples: minimum number of records of an agent to train its model.
+            **params: parameters of the random forest regressor (e.g. n_estimators).
+
+        Returns:
+            list: ids of the agents a model was trained for.
+
+        """
+        import joblib
+        from sklearn.ensemble import RandomForestRegressor
+
+        path_models = path_models if path_models else path_records
+        os.makedirs(path_models, exist_ok=True)
+
+        trained = []
+        for file in sorted(os.listdir(path_records)):
+            if not file.endswith('.csv'):
+                continue
+            records = pl.read_csv(os.path.join(path_records, file))
+            if len(records) < min_samples:
+                continue
+
+            features = [col for col in records.columns if col.startswith(FEATURE + SEPARATOR)]
+            targets = [col for col in records.columns if col.startswith(TARGET + SEPARATOR)]
+            model = RandomForestRegressor(**{'n_estimators': 50, 'min_samples_leaf': 2, **params})
+            model.fit(records.select(features).to_numpy(), records.select(targets).to_numpy())
+
+            agent_id = file.rsplit('.', 1)[0]
+            joblib.dump({'model': model, 'features': features, 'targets': targets},
+                        os.path.join(path_models, f'{agent_id}.joblib'))
+            trained.append(agent_id)
+
+        return trained
+
+    def __get_inputs(self, agent, timestamp) -> tuple:
+        """Returns the forecasts within the horizon and the socs at the current timestamp"""
+
+        horizon = timedelta(seconds=self.kwargs.get('horizon', agent.account[c.K_EMS]['controller'][c.C_MPC]['horizon']))
+        forecasts = agent.forecasts.filter((pl.col(c.TC_TIMESTEP) > timestamp)
+                                           & (pl.col(c.TC_TIMESTEP) < timestamp + horizon))
+        forecasts = forecasts.select([c.TC_TIMESTEP] + [col for col, dtype in forecasts.schema.items()
+                                                         if dtype in pl.NUMERIC_DTYPES and col != c.TC_TIMESTEP])
+        socs = agent.get_row('socs', timestamp).drop(c.TC_TIMESTAMP)
+
+        return forecasts, socs
+
+    @staticmethod
+    def __flatten(table: pl.DataFrame, prefix: str) -> dict:
+        """Returns the values of the table row by row as dictionary '<prefix>|<column>|<row>': value"""
+
+        values = table.select(pl.all().cast(pl.Float64).fill_null(0)).to_numpy()
+        return {SEPARATOR.join([prefix, col, str(row)]): values[row, idx]
+                for row in range(len(table)) for idx, col in enumerate(table.columns)}
+
+    def __record(self, agent_id: str, sample: dict):
+        """Appends the sample to the records of the agent (samples with other columns than the first are skipped)"""
+
+        path = os.path.join(self.path, f'{agent_id}.csv')
+        if self.__columns is None:
+            if os.path.exists(path):
+                with open(path) as file:
+                    self.__columns = file.readline().strip().split(',')
+            else:
+                self.__columns = list(sample.keys())
+                os.makedirs(self.path, exist_ok=True)
+                pl.DataFrame(schema={col: pl.Float64 for col in self.__columns}).write_csv(path)
+
+        # The number of timesteps in the horizon is shorter at the end of the simulation
+        if list(sample.keys()) != self.__columns:
+            return
+
+        with open(path, 'a') as file:
+            pl.DataFrame({col: [value] for col, value in sample.items()}).write_csv(file, has_header=False)
+
+    def __predict(self, agent_id: str, features: dict) -> pl.DataFrame | None:
+        """Returns the predicted setpoints or None if the prediction is not reliable"""
+
+        # Load the model of the agent
+        if self.__model is None:
+            import joblib
+            path = os.path.join(self.path, f'{agent_id}.joblib')
+            self.__model = joblib.load(path) if os.path.exists(path) else False
+        if not self.__model or list(features.keys()) != self.__model['features']:
+            return None
+
+        # Predict with each tree to obtain the spread of the predictions
+        inputs = np.array([list(features.values())])
+        predictions = np.stack([tree.predict(inputs)[0] for tree in self.__model['model'].estimators_])
+        mean = predictions.mean(axis=0)
+        uncertainty = predictions.std(axis=0).mean() / (np.abs(mean).mean() + 1)
+        if uncertainty > self.max_uncertainty:
+            return None
+
+        # Reshape the flat prediction to the setpoint columns
+        columns = {}
+        for name, value in zip(self.__model['targets'], mean):
+            _, col, _ = name.split(SEPARATOR)
+            columns.setdefault(col, []).append(value)
+
+        return pl.DataFrame(columns)
+
+    @staticmethod
+    def __repair(agent, solution: pl.DataFrame, forecasts: pl.DataFrame, socs: pl.DataFrame,
+                 dt: timedelta) -> pl.DataFrame:
+        """Makes the predicted setpoints feasible and balances them with the markets"""
+
+        dt_hours = dt.total_seconds() * c.SECONDS_TO_HOURS
+        columns = {col: solution.get_column(col).to_numpy() for col in solution.columns}
+        balances = {}
+
+        for plant_id, plant in agent.plants.items():
+            for energy_type in c.COMP_MAP.get(plant['type'], {}).keys():
+                col = f'{plant_id}_{plant["type"]}_{energy_type}'
+                if col not in columns:
+                    continue
+                values = columns[col]
+                forecast = f'{plant_id}_{energy_type}'
+                forecast = forecasts.get_column(forecast).fill_null(0).to_numpy()[:len(values)] \
+                    if forecast in forecasts.columns else None
+
+                if plant['type'] in FIXED_PLANTS and forecast is not None:
+                    # Loads are modelled negatively as they take energy from the main meter
+                    values = -forecast
+                elif plant['type'] in CURTAILABLE_PLANTS and forecast is not None:
+                    lower = 0 if plant.get('sizing', {}).get('controllable', False) else forecast
+                    values = np.clip(values, lower, forecast)
+                elif plant['type'] in STORAGE_PLANTS and plant_id in socs.columns and not socs.is_empty():
+                    values = Surrogate.__repair_storage(values, plant['sizing'], socs[0, plant_id], dt_hours)
+
+                columns[col] = np.round(values)
+                balances[energy_type] = balances.get(energy_type, 0) + columns[col]
+
+        # The (first) market of each energy type balances the plants
+        for energy_type, balance in balances.items():
+            markets = [col for col in columns if col.endswith(f'_{energy_type}')
+                       and not col.startswith(tuple(agent.plants.keys()))]
+            if markets:
+                columns[markets[0]] = -balance - sum(columns[col] for col in markets[1:])
+
+        return pl.DataFrame({col: np.round(values).astype(np.int64) for col, values in columns.items()})
+
+    @staticmethod
+    def __repair_storage(values: np.ndarray, sizing: dict, soc: float, dt_hours: float) -> np.ndarray:
+        """Limits the power of a storage to its rating and the energy to its capacity (losses are neglected)"""
+
+        power, capacity = sizing.get('power', np.inf), sizing.get('capacity', np.inf)
+        repaired = np.zeros(len(values))
+        for idx, value in enumerate(values):
+            # Positive values discharge the storage into the main meter
+            value = min(max(value, -power), power)
+            value = min(max(value, -(capacity - soc) / dt_hours), soc / dt_hours)
+            soc -= value * dt_hours
+            repaired[idx] = value
+
+        return repaired
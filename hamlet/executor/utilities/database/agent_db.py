@@ -6,7 +6,12 @@ __email__ = "jiahe.chu@tum.de"
 
 import os.path
 import polars as pl
+from datetime import datetime
 from hamlet import functions as f
+from hamlet import constants as c
+from hamlet.executor.utilities.database.region_store import StoredTable
+from hamlet.executor.utilities.database.order_book import PostedTable
+from hamlet.executor.utilities.database.time_index import TimeIndex
 
 
 class AgentDB:
@@ -30,7 +35,25 @@ class AgentDB:
         timeseries (pl.LazyFrame): Timeseries data.
         setpoints (pl.LazyFrame): Setpoints data.
         forecasts (pl.LazyFrame): Forecast data.
+        store (RegionStore): Columnar store of the region that holds the meters, socs and timeseries of the
+            agent (None if the agent holds them itself).
+        order_book (OrderBook): Order book of the region the bids and offers are posted to whenever they are set.
     """
+
+    # Tables that change during the simulation and are therefore part of the checkpoints
+    CHECKPOINT_TABLES = ['meters', 'socs', 'setpoints', 'forecasts', 'bids_offers']
+
+    # Tables that are kept in the store of the region if the agent is connected to one (see RegionStore)
+    meters = StoredTable()
+    socs = StoredTable()
+    timeseries = StoredTable()
+
+    # Table that is posted to the order book of the region if the agent is connected to one (see OrderBook)
+    bids_offers = PostedTable()
+
+    # Tables that do not change during the simulation and are memory-mapped in the lazy mode (see register_agent())
+    MAPPED_TABLES = ['timeseries']
+
     def __init__(self, path: str, agent_type: str, agent_id: str) -> None:
         """
         Initializes the AgentDB with the given path and agent type.
@@ -42,6 +65,9 @@ class AgentDB:
         """
 
         self.forecaster = None
+        self.store = None
+        self.order_book = None
+        self.time_indices = {}  # time indices of the tables (see get_time_index())
         self.agent_path = path
         self.agent_save = None  # path to save the agent
         self.agent_type = agent_type
@@ -57,7 +83,7 @@ class AgentDB:
         self.forecasts = pl.DataFrame()
         self.bids_offers = pl.DataFrame()
 
-    def register_agent(self) -> None:
+    def register_agent(self, memory_map: bool = False) -> None:
         """
         Reads and assigns class attributes from the data files located in the agent's folder.
 
@@ -65,22 +91,28 @@ class AgentDB:
         timeseries, State of Charge (SOC), and specifications. The data is stored
         as attributes of the AgentDB instance.
 
+        Args:
+            memory_map (bool): If True, the tables that do not change (see MAPPED_TABLES) are memory-mapped instead of
+                read into memory. Only the rows that are used (see get_window()) are then read from disk.
+
         Note:
             The loading process relies on the 'hamlet' library's load_file function.
         """
+        mapped = 'mmap' if memory_map else 'eager'
+
         # load existing data
         self.account = f.load_file(path=os.path.join(self.agent_path, 'account.json'))
         self.plants = f.load_file(path=os.path.join(self.agent_path, 'plants.json'))
         self.specs = f.load_file(path=os.path.join(self.agent_path, 'specs.json'))
         self.meters = f.load_file(path=os.path.join(self.agent_path, 'meters.ft'), df='polars', method='eager')
-        self.timeseries = f.load_file(path=os.path.join(self.agent_path, 'timeseries.ft'), df='polars', method='eager')
+        self.timeseries = f.load_file(path=os.path.join(self.agent_path, 'timeseries.ft'), df='polars', method=mapped)
         self.socs = f.load_file(path=os.path.join(self.agent_path, 'socs.ft'), df='polars', method='eager')
         self.setpoints = f.load_file(path=os.path.join(self.agent_path, 'setpoints.ft'), df='polars', method='eager')
         self.forecasts = f.load_file(path=os.path.join(self.agent_path, 'forecasts.ft'), df='polars', method='eager')
 
         # initialize setpoints and forecast
 
-    def register_sub_agent(self, id: str, path: str) -> None:
+    def register_sub_agent(self, id: str, path: str, memory_map: bool = False) -> None:
         """
         Registers a sub-agent with a given ID and path.
 
@@ -90,30 +122,142 @@ class AgentDB:
         Args:
             id (str): The identifier for the sub-agent.
             path (str): The file path where the sub-agent's information is stored.
+            memory_map (bool): If True, the tables that do not change are memory-mapped (see register_agent()).
         """
         self.sub_agents[id] = AgentDB(path, self.agent_type, id)
-        self.sub_agents[id].register_agent()
+        self.sub_agents[id].register_agent(memory_map=memory_map)
+
+    def get_time_index(self, table: str, data: pl.DataFrame = None) -> TimeIndex:
+        """
+        Returns the time index of a table (see TimeIndex).
+
+        The index is kept until the length or the first timestamp of the table change. As the tables lie on the time
+        grid of the simulation, the rows of a timestamp are computed from its distance to the first timestamp.
+
+        Args:
+            table (str): The name of the table (e.g. 'meters').
+            data (pl.DataFrame): The table if it is not the attribute (e.g. a copy with the same timestamps).
+
+        Returns:
+            TimeIndex: The index of the table.
+        """
+        data = getattr(self, table) if data is None else data
+        index = self.time_indices.get(table)
+        if index is None or not index.matches(data):
+            index = TimeIndex(data.get_column(c.TC_TIMESTAMP))
+            self.time_indices[table] = index
+
+        return index
+
+    def get_row(self, table: str, timestamp: datetime) -> pl.DataFrame:
+        """
+        Returns the row of a timestamp as slice of the table (empty if the table does not contain it).
+
+        Args:
+            table (str): The name of the table (e.g. 'socs').
+            timestamp (datetime): The timestamp of the row.
+
+        Returns:
+            pl.DataFrame: The row of the timestamp.
+        """
+        data = getattr(self, table)
+
+        return self.get_time_index(table, data).row(data, timestamp)
+
+    def get_window(self, table: str, start: datetime, end: datetime = None) -> pl.DataFrame:
+        """
+        Returns the rows of a table between two timestamps without scanning the table.
+
+        The rows are found by the time index of the table (see get_time_index()). The returned rows are a slice of the
+        table, so for memory-mapped tables only the rows of the window are read from disk.
 
-    def save_agent(self, path: str, save_all: bool = False) -> None:
+        Args:
+            table (str): The name of the table (e.g. 'timeseries').
+            start (datetime): The first timestamp of the window.
+            end (datetime): The last timestamp of the window (included). If None, only the row of start is returned.
+
+        Returns:
+            pl.DataFrame: The rows of the window.
+        """
+        data = getattr(self, table)
+
+        return self.get_time_index(table, data).slice(data, start, end)
+
+    def set_row(self, table: str, timestamp: datetime, values: dict) -> None:
+        """
+        Writes values to the row of a timestamp (nothing is written if the table does not contain it).
+
+        The table is replaced by a copy in which only the written columns are copied (see TimeIndex.write_row()).
+
+        Args:
+            table (str): The name of the table (e.g. 'meters').
+            timestamp (datetime): The timestamp of the row.
+            values (dict): The column names as keys and the new values.
+        """
+        data = getattr(self, table)
+
+        # The table is set again as it might be a view (see RegionStore)
+        setattr(self, table, self.get_time_index(table, data).write_row(data, timestamp, values))
+
+    def save_agent(self, path: str, save_all: bool = False, exclude: list = None) -> None:
         """
         Saves the agent's data to the agent's folder.
 
         The method saves the agent's data to the agent's folder as files.
         The data is stored as files with the same name as the class attributes.
+
+        Args:
+            path (str): The folder to save the agent to.
+            save_all (bool): If True, the data that does not change during the simulation is saved as well.
+            exclude (list): Names of the tables that are not saved (e.g. because they were streamed to disk).
         """
 
         # Update agent path
         self.agent_save = os.path.abspath(path)
 
         # Save data
-        f.save_file(path=os.path.join(self.agent_save, 'meters.ft'), data=self.meters, df='polars')
-        f.save_file(path=os.path.join(self.agent_save, 'timeseries.ft'), data=self.timeseries, df='polars')
-        f.save_file(path=os.path.join(self.agent_save, 'socs.ft'), data=self.socs, df='polars')
-        f.save_file(path=os.path.join(self.agent_save, 'setpoints.ft'), data=self.setpoints, df='polars')
-        f.save_file(path=os.path.join(self.agent_save, 'forecasts.ft'), data=self.forecasts, df='polars')
+        for table in ['meters', 'timeseries', 'socs', 'setpoints', 'forecasts']:
+            if exclude and table in exclude:
+                continue
+            f.save_file(path=os.path.join(self.agent_save, f'{table}.ft'), data=getattr(self, table), df='polars')
 
         # Data optional to save as there aren't any changes to them (as of now)
         if save_all:
             f.save_file(path=os.path.join(self.agent_save, 'account.json'), data=self.account)
             f.save_file(path=os.path.join(self.agent_save, 'plants.json'), data=self.plants)
             f.save_file(path=os.path.join(self.agent_save, 'specs.json'), data=self.specs)
+
+    def save_checkpoint(self, checkpoint, key: str, forecaster: bool = True, exclude: list = None) -> None:
+        """
+        Writes the tables of the agent that change during the simulation to the checkpoint.
+
+        Args:
+            checkpoint (Checkpoint): The checkpoint to write to.
+            key (str): The key of the agent in the checkpoint.
+            forecaster (bool): If True, the state of the forecaster is written as well.
+            exclude (list): Names of the tables that are not written (e.g. because the store of the region writes them).
+        """
+        for table in self.CHECKPOINT_TABLES:
+            if exclude and table in exclude:
+                continue
+            checkpoint.write_table(key=f'{key}/{table}', data=getattr(self, table))
+
+        if forecaster and self.forecaster is not None:
+            self.forecaster.save_checkpoint(checkpoint=checkpoint, key=f'{key}/forecaster')
+
+    def load_checkpoint(self, checkpoint, key: str, forecaster: bool = True) -> None:
+        """
+        Replaces the tables of the agent with the ones stored in the checkpoint.
+
+        Args:
+            checkpoint (Checkpoint): The checkpoint to read from.
+            key (str): The key of the agent in the checkpoint.
+            forecaster (bool): If True, the state of the forecaster is loaded as well.
+        """
+        for table in self.CHECKPOINT_TABLES:
+            data = checkpoint.read_table(key=f'{key}/{table}')
+            if data is not None:
+                setattr(self, table, data)
+
+        if forecaster and self.forecaster is not None:
+            self.forecaster.load_checkpoint(checkpoint=checkpoint, key=f'{key}/forecaster')
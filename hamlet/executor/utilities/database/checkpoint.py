@@ -0,0 +1,168 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+# This file is in charge of writing and reading the checkpoints of the simulation
+
+# Imports
+import os
+import json
+import pickle
+import hashlib
+import polars as pl
+from hamlet import functions as f
+
+# Name of the manifest file of the checkpoint
+MANIFEST = 'manifest.json'
+
+
+class Checkpoint:
+    """
+    Checkpoint of the database state that is written incrementally.
+
+    Each table is stored as Arrow IPC file (.ft) and each other object as pickle file under a key (e.g.
+    'region/agents/sfh/agent_id/meters'). The files are versioned, i.e. a new file is created each time a table changed
+    since the last checkpoint while unchanged tables keep pointing to the file of an earlier version. The manifest that
+    maps the keys to the files is written last and replaced atomically. A crash while writing therefore always leaves
+    the last complete checkpoint behind. Files that are no longer referenced are deleted afterwards.
+
+    Attributes:
+        path: path to the checkpoint folder.
+        version: version of the checkpoint that is currently written (or was last loaded).
+        info: additional information of the last loaded or written checkpoint (e.g. the timestamp).
+        files: dictionary that maps the keys to the files of the current version.
+
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: path to the checkpoint folder. If it contains a checkpoint, its manifest is loaded.
+
+        """
+        self.path = os.path.abspath(path)
+        self.version = 0
+        self.info = {}
+        self.files = {}
+
+        # Files of the last complete checkpoint
+        self.__committed = {}
+
+        # Objects and files that were written last for each key (used to skip unchanged tables)
+        # Note: The objects are compared by identity as the tables are replaced and not modified in place
+        self.__written = {}
+
+        # Load the manifest of an existing checkpoint
+        if os.path.exists(os.path.join(self.path, MANIFEST)):
+            manifest = f.load_file(os.path.join(self.path, MANIFEST))
+            self.version = manifest['version']
+            self.info = manifest['info']
+            self.files = manifest['files']
+            self.__committed = dict(self.files)
+
+    def exists(self) -> bool:
+        """Returns True if a complete checkpoint exists"""
+        return bool(self.__committed)
+
+    def begin(self, version: int = None):
+        """
+        Starts writing a new version of the checkpoint.
+
+        Args:
+            version: version number. If None, the version is incremented by one (worker processes receive the version
+                of the main process).
+
+        """
+        self.version = self.version + 1 if version is None else version
+        self.files = {}
+
+    def write_table(self, key: str, data: pl.DataFrame):
+        """
+        Writes the table if it changed since it was last written.
+
+        Args:
+            key: key of the table.
+            data: table to write.
+
+        """
+        # Empty tables without columns are not written (they are initialized again when loading)
+        if not isinstance(data, pl.DataFrame) or data.width == 0:
+            return
+
+        # Keep the existing file if the table did not change
+        last = self.__written.get(key)
+        if last is not None and last[0] is data:
+            self.files[key] = last[1]
+            return
+
+        file = f'{key}.{self.version}.ft'
+        f.save_file(path=os.path.join(self.path, file), data=data, df='polars')
+        self.__written[key] = (data, file)
+        self.files[key] = file
+
+    def write_object(self, key: str, data: object):
+        """
+        Writes the object as pickle file if its serialized content changed since it was last written.
+
+        Args:
+            key: key of the object.
+            data: object to write.
+
+        """
+        content = pickle.dumps(data)
+        digest = hashlib.sha1(content).hexdigest()
+
+        # Keep the existing file if the content did not change
+        last = self.__written.get(key)
+        if last is not None and last[0] == digest:
+            self.files[key] = last[1]
+            return
+
+        file = f'{key}.{self.version}.pkl'
+        os.makedirs(os.path.dirname(os.path.join(self.path, file)), exist_ok=True)
+        with open(os.path.join(self.path, file), 'wb') as handle:
+            handle.write(content)
+        self.__written[key] = (digest, file)
+        self.files[key] = file
+
+    def commit(self, info: dict = None):
+        """
+        Completes the current version by writing the manifest and deletes the files that are no longer needed.
+
+        Args:
+            info: additional information to store with the checkpoint (must be json serializable).
+
+        """
+        self.info = info if info is not None else {}
+
+        # Write the manifest to a temporary file first and replace the old one atomically
+        manifest = {'version': self.version, 'info': self.info, 'files': self.files}
+        path = os.path.join(self.path, MANIFEST)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(manifest, file, indent=4)
+        os.replace(path + '.tmp', path)
+
+        # Delete the files of the previous version that are not used anymore
+        for file in set(self.__committed.values()) - set(self.files.values()):
+            if os.path.exists(os.path.join(self.path, file)):
+                os.remove(os.path.join(self.path, file))
+        self.__committed = dict(self.files)
+
+    def read_table(self, key: str) -> pl.DataFrame | None:
+        """Returns the table stored under the key or None if the checkpoint does not contain it"""
+
+        if key not in self.__committed:
+            return None
+
+        return f.load_file(path=os.path.join(self.path, self.__committed[key]), df='polars', method='eager')
+
+    def read_object(self, key: str) -> object:
+        """Returns the object stored under the key or None if the checkpoint does not contain it"""
+
+        if key not in self.__committed:
+            return None
+
+        with open(os.path.join(self.path, self.__committed[key]), 'rb') as handle:
+            return pickle.load(handle)
@@ -0,0 +1,188 @@
+__author__ = "jiahechu"
+__credits__ = "MarkusDoepfert"
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+import bisect
+import numpy as np
+import polars as pl
+from datetime import datetime
+from hamlet import constants as c
+from hamlet import functions as f
+
+
+class ChunkedTable:
+    """
+    Append-only table that is stored in chunks and indexed by timestep.
+
+    Appending rows does not copy the existing rows. The chunks are merged like a binary counter (a chunk is merged with
+    the previous one as soon as it is at least as large), so each row is copied O(log n) times in total and the number
+    of chunks stays logarithmic. The positions of the rows of each timestep are additionally kept in an index, so that
+    the rows of one timestep or of a window of timesteps are taken from the chunks without scanning the table.
+
+    Attributes:
+        index_column: name of the timestep column the rows are indexed by.
+        chunks: list of the chunks in the order they were appended.
+        schema: schema of the table.
+
+    """
+
+    def __init__(self, data: pl.DataFrame = None, index_column: str = c.TC_TIMESTEP):
+        self.index_column = index_column
+        self.chunks = []
+        self.schema = data.schema if data is not None else {}
+
+        # Positions of the first row of each chunk and number of rows
+        self.__starts = []
+        self.__length = 0
+
+        # Positions of the rows of each timestep ({epoch: [arrays of positions]}) and the sorted epochs of the timesteps
+        self.__index = {}
+        self.__timesteps = []
+
+        # Combined table (None if it needs to be built again)
+        self.__frame = None
+
+        if data is not None:
+            self.append(data)
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def append(self, data: pl.DataFrame):
+        """Appends the rows to the table"""
+
+        if data.is_empty():
+            if not self.schema:
+                self.schema = data.schema
+            return
+
+        if not self.schema:
+            self.schema = data.schema
+
+        self.__add_to_index(data, offset=self.__length)
+
+        # Merge the chunks that are not larger than the new one
+        chunk, start = data, self.__length
+        while self.chunks and self.chunks[-1].height <= chunk.height:
+            chunk, start = pl.concat([self.chunks.pop(), chunk], how='vertical'), self.__starts.pop()
+        self.chunks.append(chunk)
+        self.__starts.append(start)
+        self.__length += data.height
+        self.__frame = None
+
+    def to_frame(self) -> pl.DataFrame:
+        """Returns all rows as one table (the chunks are combined once until rows are appended again)"""
+
+        # The chunks are kept as they are, as get() may read them from other threads (e.g. of the market pool)
+        frame = self.__frame
+        if frame is None:
+            frame = pl.concat(self.chunks, how='vertical', rechunk=True) if self.chunks else self.empty()
+            self.__frame = frame
+
+        return frame
+
+    def empty(self) -> pl.DataFrame:
+        """Returns an empty table with the schema of the table (without combining the chunks)"""
+
+        return pl.DataFrame(schema=self.schema)
+
+    def get(self, start: datetime, end: datetime = None, column: str = None, value=None) -> pl.DataFrame:
+        """
+        Returns the rows of a timestep or a window of timesteps.
+
+        Args:
+            start: first timestep.
+            end: last timestep (included). If None, only the rows of start are returned.
+            column: if given, only the rows with the value in this column are returned (e.g. the rows of one agent).
+            value: value of the column.
+
+        Returns:
+            pl.DataFrame: the rows of the timesteps in the order they were appended (per timestep).
+
+        """
+        first = f.get_epoch(start)
+        last = first if end is None else f.get_epoch(end)
+
+        idx_first = bisect.bisect_left(self.__timesteps, first)
+        idx_last = bisect.bisect_right(self.__timesteps, last)
+        positions = [part for epoch in self.__timesteps[idx_first:idx_last] for part in self.__index[epoch]]
+        if not positions:
+            return self.empty()
+
+        rows = self.__take(np.concatenate(positions))
+        if column is not None:
+            rows = rows.filter(pl.col(column) == value)
+
+        return rows
+
+    def slice(self, offset: int) -> pl.DataFrame:
+        """Returns the rows after the given number of rows (e.g. the rows appended since a previous length)"""
+
+        parts = []
+        for chunk in self.chunks:
+            if offset < chunk.height:
+                parts.append(chunk.slice(max(offset, 0)))
+            offset -= chunk.height
+
+        return pl.concat(parts, how='vertical') if parts else self.empty()
+
+    def __take(self, positions: np.ndarray) -> pl.DataFrame:
+        """Returns the rows at the positions (in the given order) from the chunks they are stored in"""
+
+        # Chunk of each row and the rows grouped by chunk (the order within a chunk is kept)
+        chunk_ids = np.searchsorted(self.__starts, positions, side='right') - 1
+        order = np.argsort(chunk_ids, kind='stable')
+        grouped, positions = chunk_ids[order], positions[order]
+
+        parts = []
+        for chunk_id in np.unique(grouped):
+            rows = positions[grouped == chunk_id] - self.__starts[chunk_id]
+            parts.append(self.chunks[chunk_id][rows])
+        rows = parts[0] if len(parts) == 1 else pl.concat(parts, how='vertical')
+
+        # Restore the given order if the rows come from several chunks
+        if len(parts) > 1:
+            rows = rows[np.argsort(order, kind='stable')]
+
+        return rows
+
+    def __add_to_index(self, data: pl.DataFrame, offset: int):
+        """Adds the positions of the rows to the index of their timesteps"""
+
+        # Group the positions of the rows by timestep (the order of the rows of each timestep is kept)
+        epochs = data.get_column(self.index_column).dt.epoch('us').to_numpy()
+        order = np.argsort(epochs, kind='stable')
+        unique, bounds = np.unique(epochs[order], return_index=True)
+        bounds = np.append(bounds, len(epochs))
+
+        for idx, epoch in enumerate(unique.tolist()):
+            if epoch not in self.__index:
+                self.__index[epoch] = []
+                bisect.insort(self.__timesteps, epoch)
+            self.__index[epoch].append(order[bounds[idx]:bounds[idx + 1]] + offset)
+
+
+class HistoryTable:
+    """
+    Attribute of the MarketDB that is kept as ChunkedTable.
+
+    Reading the attribute returns all rows as one table. The table is combined once and kept until rows are appended
+    again (see ChunkedTable.to_frame()); use ChunkedTable.empty() for an empty table with the same schema. Setting it
+    replaces the table. The tables are replaced in a new dictionary, so that shallow copies of the MarketDB (e.g. of a
+    market that is executed) do not change the original.
+
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, marketDB, owner=None):
+        if marketDB is None:
+            return self
+
+        return marketDB.history[self.name].to_frame()
+
+    def __set__(self, marketDB, value):
+        marketDB.history = {**marketDB.history, self.name: ChunkedTable(value)}
@@ -34,6 +34,10 @@ class Database:
 
     """
 
+    # Tables that are streamed to disk in the streaming results mode (see prune_region())
+    STREAMED_AGENT_TABLES = ['meters', 'socs']
+    STREAMED_MARKET_TABLES = ['market_transactions', 'bids_cleared', 'offers_cleared']
+
     def __init__(self, scenario_path):
 
         self.__scenario_path = scenario_path
@@ -46,12 +50,26 @@ class Database:
 
     """initialize database"""
 
-    def setup_database(self, structure):
-        """Initialize the database."""
+    def setup_database(self, structure, agents: dict = None, aggregate: bool = False, columnar: bool = False,
+                       memory_map: bool = False):
+        """
+        Initialize the database.
+
+        Args:
+            structure: Dictionary containing the scenario structure (region names and their paths).
+            agents: Dictionary with region names as keys and collections of agent ids as values. If given, only these
+            agents are registered (relevant for worker processes that only hold a shard of the agents).
+            aggregate: If True, agents with identical data are simulated by one representative (see
+            RegionDB.aggregate_agents()).
+            columnar: If True, the agent tables of each region are kept in one columnar store (see RegionStore).
+            memory_map: If True, the agent tables that do not change are memory-mapped instead of read into memory (see
+            AgentDB.register_agent()).
+
+        """
 
         self.__setup_general()
 
-        self.__register_all_regions(structure)
+        self.__register_all_regions(structure, agents, aggregate, columnar, memory_map)
 
     """get data"""
 
@@ -61,6 +79,10 @@ class Database:
     def get_weather_data(self):
         return self.__general['weather']
 
+    def get_regions(self) -> list:
+        """Returns the names of all registered regions"""
+        return list(self.__regions.keys())
+
     def get_agent_data(self, region, agent_type=None, agent_id=None):
         """
         Retrieve agent data for the specified region, agent type, and agent ID.
@@ -161,18 +183,38 @@ class Database:
             - If multiple filter criteria are provided, they will be combined using the 'inclusive' filter mode.
             - All filters are optional. If no filters are provided, the function returns the bids and offers data for
             all markets and timesteps in the specified region.
+            - The bids and offers of one market type, market name and timestep are taken directly from the partitions
+            of the order book of the region (see OrderBook).
+
+        """
+        order_book = self.__regions[region].order_book
+
+        # single market and timestep (e.g. one clearing task)
+        if all(value is not None and not isinstance(value, list) for value in [market_type, market_name, timestep]):
+            return order_book.get(market_type=market_type, market_name=market_name, timestep=timestep)
 
+        # combined bids and offers of all agents (the representatives of aggregated agents are already scaled)
+        bids_offers_table = order_book.get_table()
+
+        return self.filter_bids_offers(bids_offers_table, market_type=market_type, market_name=market_name,
+                                       timestep=timestep)
+
+    def filter_bids_offers(self, bids_offers_table: pl.DataFrame, market_type: str | list[str] = None,
+                           market_name: str | list[str] = None, timestep: datetime | list[datetime] = None):
         """
-        # get bids and offers table
-        bids_offers = {}
+        Filter a bids and offers table (e.g. a snapshot obtained with get_bids_offers()) by market type, market name
+        and timestep(s).
 
-        for agents in self.__regions[region].agents.values():
-            for agent_id, agentDB in agents.items():
-                bids_offers[agent_id] = agentDB.bids_offers
+        Args:
+            bids_offers_table (polars.DataFrame): The bids and offers table to filter.
+            market_type (str | list[str], optional): Filter by market type(s) or None to include all market types.
+            market_name (str | list[str], optional): Filter by market name(s) or None to include all market names.
+            timestep (datetime | list[datetime], optional): Filter by timestep(s) or None to include all timesteps.
 
-        # combine tables
-        bids_offers_table = pl.concat(bids_offers.values(), how='vertical')
+        Returns:
+            bids_offers_table (polars.DataFrame): The filtered bids and offers table.
 
+        """
         # if given, generate lists for applying self.filter_market_data function
         by = []
         values = []
@@ -188,7 +230,7 @@ class Database:
 
         # convert single value to a list for filtering function
         for i in range(len(values)):
-            if values[i] is not list:
+            if not isinstance(values[i], list):
                 values[i] = [values[i]]
 
         # filtering
@@ -217,6 +259,10 @@ class Database:
             agent_type = agent.agent_type
             self.__regions[region].agents[agent_type][agent_id] = agent
 
+            # new AgentDB objects post their bids and offers to the order book of the region from now on
+            if agent.order_book is not self.__regions[region].order_book:
+                self.__regions[region].connect_order_book(agent)
+
     def post_markets_to_region(self, region: str, markets: list):
         """
         Post the given markets to the given region.
@@ -262,18 +308,22 @@ class Database:
 
         # Save results to region
         for market, results in region_markets.items():
+            # Scale the results of representatives of aggregated agents back to the share of one agent
+            for table, tables in results.items():
+                for column in RegionDB.AGENT_COLUMNS:
+                    tables = [self.__regions[region].scale_agent_rows(data, column=column, inverse=True)
+                              for data in tables]
+                results[table] = tables
+
             # Split market name into market type and market name
             market_type, market_name = market.split(item_separator)
             market_db = self.__regions[region].markets.get(market_type, {}).get(market_name)
 
             # Save results to region
-            # Tables that are to be expanded
-            market_db.set_market_transactions(pl.concat([market_db.market_transactions]
-                                                        + results[c.TN_MARKET_TRANSACTIONS], how='vertical'))
-            market_db.set_bids_cleared(pl.concat([market_db.bids_cleared]
-                                                 + results[c.TN_BIDS_CLEARED], how='vertical'))
-            market_db.set_offers_cleared(pl.concat([market_db.offers_cleared]
-                                                   + results[c.TN_OFFERS_CLEARED], how='vertical'))
+            # Tables that are to be expanded (appended without copying the existing rows)
+            market_db.append_history(c.TN_MARKET_TRANSACTIONS, results[c.TN_MARKET_TRANSACTIONS])
+            market_db.append_history(c.TN_BIDS_CLEARED, results[c.TN_BIDS_CLEARED])
+            market_db.append_history(c.TN_OFFERS_CLEARED, results[c.TN_OFFERS_CLEARED])
             # Note: Positions matched are not used in the current version
             # market_db.set_positions_matched(pl.concat(results[c.TN_POSITIONS_MATCHED], how='vertical'))
             # Tables that are to be overwritten
@@ -283,6 +333,57 @@ class Database:
         # Update local market price in forecasters
         self.__regions[region].update_local_market_in_forecasters()
 
+    def flush_agent_store(self, region: str):
+        """
+        Write the changed agent tables of the given region to its columnar store (see RegionStore.flush()).
+
+        Args:
+            region: name of the region.
+
+        """
+        if self.__regions[region].store:
+            self.__regions[region].store.flush()
+
+    def get_agent_store(self, region: str):
+        """Returns the columnar store of the agent tables of the given region (None if it has none)"""
+        return self.__regions[region].store
+
+    def post_agent_tables(self, region: str, tables: list):
+        """
+        Post single tables of the given agents to the given region.
+
+        In contrast to post_agents_to_region(), only the given tables of the existing AgentDB objects are replaced. This
+        is used when agents are executed outside this database (e.g. in worker processes) and only the changed tables
+        are sent back.
+
+        Args:
+            region: name of the region.
+            tables: list of tuples (agent_type, agent_id, {table name: polars DataFrame}).
+
+        """
+        for agent_type, agent_id, agent_tables in tables:
+            agent_db = self.__regions[region].agents[agent_type][agent_id]
+            for table_name, table in agent_tables.items():
+                setattr(agent_db, table_name, table)
+
+    def append_market_transactions(self, region: str, transactions: dict):
+        """
+        Append the given market transactions to the markets of the given region.
+
+        Used to keep copies of the database (e.g. in worker processes) in sync with the markets executed elsewhere.
+
+        Args:
+            region: name of the region.
+            transactions: dictionary with tuples (market_type, market_name) as keys and the new transactions as values.
+
+        """
+        for (market_type, market_name), table in transactions.items():
+            market_db = self.__regions[region].markets[market_type][market_name]
+            market_db.append_history(c.TN_MARKET_TRANSACTIONS, table)
+
+        # Update local market price in forecasters
+        self.__regions[region].update_local_market_in_forecasters()
+
     """static methods"""
 
     @staticmethod
@@ -372,12 +473,13 @@ class Database:
 
     """save database"""
 
-    def save_database(self, path: str):
+    def save_database(self, path: str, exclude: list = None):
         """
         Save the database to the specified path.
 
         Args:
             path: The path to save the database to.
+            exclude: names of the tables that are not saved (e.g. because they were streamed to disk already).
 
         """
 
@@ -387,10 +489,127 @@ class Database:
 
         # save region data
         for region in self.__regions.keys():
-            self.__regions[region].save_region(path=os.path.join(path, region))
+            self.__regions[region].save_region(path=os.path.join(path, region), exclude=exclude)
+
+    def prune_region(self, region: str, before: datetime = None, writer=None, agents: bool = True,
+                     markets: bool = True):
+        """
+        Remove the rows of the given region that are not needed anymore from memory.
+
+        The rows of the meters and socs of the agents with a timestamp before the given one and the rows of the market
+        transactions, cleared bids and cleared offers with a timestep before the given one are removed. If a writer is
+        given, the removed rows are appended to the result streams first (meters and socs in long format).
+
+        Args:
+            region: name of the region.
+            before: rows before this timestamp are removed. If None, all rows are removed.
+            writer: ResultWriter object that streams the removed rows to disk.
+            agents: if True, the agent tables are pruned.
+            markets: if True, the market tables are pruned.
+
+        """
+        if agents:
+            streams = {table: [] for table in self.STREAMED_AGENT_TABLES}
+            columns = dict(zip(self.STREAMED_AGENT_TABLES, zip([c.TC_ID_METER, c.TC_ID_PLANT], [c.TC_ENERGY, c.TC_SOC])))
+
+            # The tables in the store of the region are pruned at once
+            store = self.__regions[region].store
+            if store:
+                for table, (id_column, value_column) in columns.items():
+                    past = store.prune(table, before, id_column=id_column, value_column=value_column)
+                    if writer and past is not None and not past.is_empty():
+                        streams[table].append(past)
+
+            for agents_dict in self.__regions[region].agents.values():
+                for agent_id, agentDB in agents_dict.items():
+                    for table, (id_column, value_column) in columns.items():
+                        if store and store.has(table, agent_id):
+                            continue
+                        past, rest = self.__split_table(getattr(agentDB, table), before, by=c.TC_TIMESTAMP)
+                        if past is None:
+                            continue
+                        setattr(agentDB, table, rest)
+                        if writer and past.width > 1:
+                            streams[table].append(past.melt(id_vars=c.TC_TIMESTAMP, variable_name=id_column,
+                                                            value_name=value_column)
+                                                  .with_columns(pl.lit(agent_id).alias(c.TC_ID_AGENT),
+                                                                pl.col(value_column).cast(pl.Float64))
+                                                  .select(c.TC_TIMESTAMP, c.TC_ID_AGENT, id_column, value_column))
+            if writer:
+                for table, data in streams.items():
+                    if data:
+                        writer.write(key=f'{region}/agents/{table}', data=pl.concat(data, how='vertical'))
+
+        if markets:
+            for market_type, markets_dict in self.__regions[region].markets.items():
+                for market_name, marketDB in markets_dict.items():
+                    for table in self.STREAMED_MARKET_TABLES:
+                        past, rest = self.__split_table(getattr(marketDB, table), before, by=c.TC_TIMESTEP)
+                        if past is None:
+                            continue
+                        setattr(marketDB, table, rest)
+                        if writer:
+                            writer.write(key=f'{region}/markets/{market_type}/{market_name}/{table}', data=past)
+
+    def save_checkpoint(self, checkpoint, agents: bool = True, markets: bool = True, forecasters: bool = True):
+        """
+        Write the state of all regions to the checkpoint.
+
+        Only the tables that changed since the last checkpoint are written. The checkpoint is not committed, so that
+        further data (e.g. from worker processes) can be added before.
+
+        Args:
+            checkpoint: Checkpoint object to write to (see Checkpoint.begin()).
+            agents: if True, the agent tables are written.
+            markets: if True, the market tables are written.
+            forecasters: if True, the states of the forecasters (train data and fitted models) are written.
+
+        """
+        for region in self.__regions.keys():
+            self.__regions[region].save_checkpoint(checkpoint, key=region, agents=agents, markets=markets,
+                                                   forecasters=forecasters)
+
+    def load_checkpoint(self, checkpoint, markets: bool = True, forecasters: bool = True):
+        """
+        Load the state of all regions from the checkpoint.
+
+        The database needs to be set up before as the checkpoint only contains the tables that change during the
+        simulation.
+
+        Args:
+            checkpoint: Checkpoint object to read from.
+            markets: if True, the market tables are loaded.
+            forecasters: if True, the states of the forecasters are loaded.
+
+        """
+        for region in self.__regions.keys():
+            self.__regions[region].load_checkpoint(checkpoint, key=region, markets=markets, forecasters=forecasters)
 
     ########################################## PRIVATE METHODS ##########################################
 
+    @staticmethod
+    def __split_table(table: pl.DataFrame, before: datetime = None, by: str = c.TC_TIMESTAMP) -> tuple:
+        """
+        Split the table into the rows before the given timestamp and the remaining rows.
+
+        Returns:
+            tuple: (rows before, remaining rows) or (None, table) if there is nothing to split.
+
+        """
+        if table.is_empty() or by not in table.columns:
+            return None, table
+
+        if before is None:
+            return table, table.clear()
+
+        # Cast the timestamp to the data type of the column (time unit and time zone need to match in polars)
+        mask = pl.col(by) < pl.lit(before).cast(table.schema[by])
+        past = table.filter(mask)
+        if past.is_empty():
+            return None, table
+
+        return past, table.filter(~mask)
+
     def __setup_general(self):
         """
         Setup general dictionary.
@@ -406,7 +625,8 @@ class Database:
                                                   df='polars', method='eager')
         self.__general['general'] = f.load_file(path=os.path.join(self.__scenario_path, 'config', 'config_setup.yaml'))
 
-    def __register_all_regions(self, structure):
+    def __register_all_regions(self, structure, agents: dict = None, aggregate: bool = False, columnar: bool = False,
+                               memory_map: bool = False):
         """
         Register all regions.
 
@@ -419,8 +639,9 @@ class Database:
             # initialize RegionDB object
             self.__regions[region] = RegionDB(os.path.join(os.path.dirname(self.__scenario_path), structure[region]))
 
-            # register region
-            self.__regions[region].register_region()
+            # register region (only the given agents if a selection is provided)
+            self.__regions[region].register_region(agents=agents.get(region, []) if agents is not None else None,
+                                                   aggregate=aggregate, columnar=columnar, memory_map=memory_map)
 
             # register agent's forecaster for agents in the region
             self.__regions[region].register_forecasters_for_agents(self.__general)
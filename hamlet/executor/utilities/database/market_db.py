@@ -6,15 +6,27 @@ __email__ = "jiahe.chu@tum.de"
 
 import os
 import polars as pl
+from datetime import datetime
 from hamlet import constants as c
 from hamlet import functions as f
+from hamlet.executor.utilities.database.chunked_table import HistoryTable
 
 
 class MarketDB:
     """Database contains all the information for markets.
     Should only be connected with Database class, no connection with main Executor."""
 
+    # Tables that change during the simulation and are therefore part of the checkpoints
+    CHECKPOINT_TABLES = ['market_transactions', 'bids_cleared', 'bids_uncleared', 'offers_cleared',
+                         'offers_uncleared', 'positions_matched']
+
+    # Tables that grow with every timestep and are therefore kept as append-only ChunkedTable (see append_history())
+    market_transactions = HistoryTable()
+    bids_cleared = HistoryTable()
+    offers_cleared = HistoryTable()
+
     def __init__(self, market_type, name, market_path, retailer_path):
+        self.history = {}
         self.market_type = market_type
         self.market_name = name
         self.market_path = market_path
@@ -38,13 +50,17 @@ class MarketDB:
         self.offers_uncleared = pl.DataFrame(schema=c.TS_OFFERS_UNCLEARED)
         self.positions_matched = pl.DataFrame(schema=c.TS_POSITIONS_MATCHED)
 
-    def save_market(self, path, save_all: bool = False):
-        """Save market data to given path."""
+    def save_market(self, path, save_all: bool = False, exclude: list = None):
+        """Save market data to given path. Tables whose names are in exclude are not saved."""
 
         # Update market path
         self.market_save = os.path.abspath(path)
 
-        f.save_file(path=os.path.join(path, 'market_transactions.csv'), data=self.market_transactions, df='polars')
+        exclude = exclude if exclude else []
+
+        if 'market_transactions' not in exclude:
+            f.save_file(path=os.path.join(path, 'market_transactions.csv'), data=self.market_transactions,
+                        df='polars')
         # TODO: put back in when the data is available. If there is no use for the table, remove it and create it
         #  in the analyzer
         # f.save_file(path=os.path.join(path, 'positions_matched.csv'), data=self.positions_matched
@@ -53,10 +69,53 @@ class MarketDB:
 
         # Data is not saved if save_all is False
         if save_all:
-            f.save_file(path=os.path.join(path, 'bids_cleared.ft'), data=self.bids_cleared, df='polars')
-            f.save_file(path=os.path.join(path, 'bids_uncleared.ft'), data=self.bids_uncleared, df='polars')
-            f.save_file(path=os.path.join(path, 'offers_cleared.ft'), data=self.offers_cleared, df='polars')
-            f.save_file(path=os.path.join(path, 'offers_uncleared.ft'), data=self.offers_uncleared, df='polars')
+            for table in ['bids_cleared', 'bids_uncleared', 'offers_cleared', 'offers_uncleared']:
+                if table not in exclude:
+                    f.save_file(path=os.path.join(path, f'{table}.ft'), data=getattr(self, table), df='polars')
+
+    def save_checkpoint(self, checkpoint, key: str):
+        """Write the tables that change during the simulation to the checkpoint."""
+        for table in self.CHECKPOINT_TABLES:
+            checkpoint.write_table(key=f'{key}/{table}', data=getattr(self, table))
+
+    def load_checkpoint(self, checkpoint, key: str):
+        """Replace the tables with the ones stored in the checkpoint."""
+        for table in self.CHECKPOINT_TABLES:
+            data = checkpoint.read_table(key=f'{key}/{table}')
+            if data is not None:
+                setattr(self, table, data)
+
+    def append_history(self, table: str, data: pl.DataFrame | list):
+        """
+        Append rows to a table that grows with every timestep without copying the existing rows.
+
+        Args:
+            table: name of the table (market_transactions, bids_cleared or offers_cleared).
+            data: rows to append (a table or a list of tables).
+
+        """
+        for rows in data if isinstance(data, list) else [data]:
+            self.history[table].append(rows)
+
+    def get_history(self, table: str, start: datetime, end: datetime = None, column: str = None,
+                    value=None) -> pl.DataFrame:
+        """
+        Get the rows of a table that grows with every timestep for a timestep or a window of timesteps.
+
+        The rows are taken from the index of the timesteps instead of filtering the whole table.
+
+        Args:
+            table: name of the table (market_transactions, bids_cleared or offers_cleared).
+            start: first timestep.
+            end: last timestep (included). If None, only the rows of start are returned.
+            column: if given, only the rows with the value in this column are returned (e.g. c.TC_ID_AGENT).
+            value: value of the column.
+
+        Returns:
+            pl.DataFrame: the rows of the timesteps.
+
+        """
+        return self.history[table].get(start=start, end=end, column=column, value=value)
 
     def set_market_transactions(self, data):
         self.market_transactions = data
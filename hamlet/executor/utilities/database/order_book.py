@@ -0,0 +1,125 @@
+__author__ = "jiahechu"
+__credits__ = "MarkusDoepfert"
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+import polars as pl
+from datetime import datetime
+from hamlet import constants as c
+from hamlet import functions as f
+
+
+class OrderBook:
+    """
+    Bids and offers of all agents of a region, partitioned by market type, market name and timestep.
+
+    The agents post their bids and offers to the order book whenever they change them (see PostedTable). The tables of
+    all agents are combined and partitioned once after they changed, so that each market clearing task retrieves its
+    bids and offers by a dictionary lookup instead of combining and filtering the tables of all agents.
+
+    Attributes:
+        orders: dictionary with the agent ids as keys and their bids and offers as values.
+        scale: function that is applied to the combined table (e.g. to scale the bids and offers of aggregated agents).
+
+    """
+
+    # Columns the bids and offers are partitioned by
+    KEYS = [c.TC_MARKET, c.TC_NAME, c.TC_TIMESTEP]
+
+    # Suffix of the key columns (strings and timesteps as integers, so that the keys do not depend on the categories
+    #   and the time unit and time zone of the columns)
+    SUFFIX = '_key'
+
+    def __init__(self, scale=None):
+        self.orders = {}
+        self.scale = scale
+
+        # Combined and partitioned bids and offers (None if they need to be built again)
+        self.__table = None
+        self.__partitions = None
+
+    def post(self, agent_id: str, bids_offers: pl.DataFrame):
+        """Replaces the bids and offers of the agent"""
+
+        self.orders[agent_id] = bids_offers
+        self.__table = None
+        self.__partitions = None
+
+    def remove(self, agent_id: str):
+        """Removes the bids and offers of the agent"""
+
+        self.orders.pop(agent_id, None)
+        self.__table = None
+        self.__partitions = None
+
+    def get_table(self) -> pl.DataFrame:
+        """Returns the bids and offers of all agents"""
+
+        if self.__table is None:
+            tables = [table for table in self.orders.values() if table.width > 0]
+            table = pl.concat(tables, how='vertical') if tables else pl.DataFrame(schema=c.TS_BIDS_OFFERS)
+            self.__table = self.scale(table) if self.scale else table
+
+        return self.__table
+
+    def get(self, market_type: str, market_name: str, timestep: datetime) -> pl.DataFrame:
+        """
+        Returns the bids and offers of one market and timestep.
+
+        Args:
+            market_type: type of the market.
+            market_name: name of the market.
+            timestep: timestep the bids and offers are for.
+
+        Returns:
+            pl.DataFrame: the bids and offers (empty if there are none).
+
+        """
+        if self.__partitions is None:
+            self.__partitions = self.__partition(self.get_table())
+
+        key = (market_type, market_name, f.get_epoch(timestep))
+        if key not in self.__partitions:
+            return self.get_table().clear()
+
+        return self.__partitions[key]
+
+    def __partition(self, table: pl.DataFrame) -> dict:
+        """Partitions the table by market type, market name and timestep"""
+
+        if table.is_empty():
+            return {}
+
+        keys = [key + self.SUFFIX for key in self.KEYS]
+        partitions = (table.with_columns(pl.col(c.TC_MARKET).cast(pl.Utf8).alias(keys[0]),
+                                         pl.col(c.TC_NAME).cast(pl.Utf8).alias(keys[1]),
+                                         pl.col(c.TC_TIMESTEP).dt.epoch('us').alias(keys[2]))
+                      .partition_by(keys, as_dict=True))
+
+        return {key: partition.drop(keys) for key, partition in partitions.items()}
+
+
+class PostedTable:
+    """
+    Attribute of the AgentDB that is posted to the order book of its region whenever it is set.
+
+    Without an order book the table is a normal attribute.
+
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, agentDB, owner=None):
+        if agentDB is None:
+            return self
+
+        return agentDB.__dict__[self.name]
+
+    def __set__(self, agentDB, value):
+        agentDB.__dict__[self.name] = value
+
+        order_book = agentDB.__dict__.get('order_book')
+        if order_book is not None:
+            order_book.post(agentDB.agent_id, value)
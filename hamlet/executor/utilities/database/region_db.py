@@ -6,16 +6,29 @@ __email__ = "jiahe.chu@tum.de"
 
 import polars as pl
 import os
+import json
+import hashlib
+from copy import copy
 from datetime import datetime
 from hamlet import functions as f
 from hamlet import constants as c
 from hamlet.executor.utilities.database.agent_db import AgentDB
 from hamlet.executor.utilities.database.market_db import MarketDB
+from hamlet.executor.utilities.database.region_store import RegionStore
+from hamlet.executor.utilities.database.order_book import OrderBook
 from hamlet.executor.utilities.forecasts.forecaster import Forecaster
 
 
 class RegionDB:
     """Database contains all the information for region."""
+
+    # Tables of the agents that are copied from the representative to the agents it represents when saving
+    AGGREGATED_AGENT_TABLES = ['meters', 'socs', 'setpoints', 'forecasts']
+
+    # Columns of the market tables that contain agent ids and the columns that scale with the number of agents
+    AGENT_COLUMNS = [c.TC_ID_AGENT, c.TC_ID_AGENT_IN, c.TC_ID_AGENT_OUT]
+    EXTENSIVE_COLUMNS = [c.TC_ENERGY_IN, c.TC_ENERGY_OUT, c.TC_PRICE_IN, c.TC_PRICE_OUT, c.TC_ENERGY, c.TC_PRICE]
+
     def __init__(self, path):
 
         self.region_path = path
@@ -24,21 +37,213 @@ class RegionDB:
         self.markets = {}
         self.subregions = {}
 
-    def register_region(self):
-        """Register this region."""
-        self.__register_all_agents()
+        # Aggregation of identical agents (see register_region())
+        self.multiplicity = {}  # number of agents each representative stands for (only representatives of several)
+        self.aggregated = {}  # agents that are represented by another agent: {agent type: {agent id: (rep id, AgentDB)}}
+
+        # Columnar storage of the agent tables (see register_region())
+        self.store = None
+
+        # Bids and offers of the agents partitioned by market and timestep (the representatives of aggregated agents
+        #   bid for all agents they represent)
+        self.order_book = OrderBook(scale=self.scale_agent_rows)
+
+    def register_region(self, agents: list = None, aggregate: bool = False, columnar: bool = False,
+                        memory_map: bool = False):
+        """
+        Register this region.
+
+        Args:
+            agents: ids of the agents to register. If None, all agents of the region are registered.
+            aggregate: if True, agents with identical data are simulated by one representative (see
+                aggregate_agents()).
+            columnar: if True, the meters, socs and timeseries of all agents are kept in one columnar store
+                and the AgentDB objects are views on it (see RegionStore).
+            memory_map: if True, the tables of the agents that do not change are memory-mapped (see
+                AgentDB.register_agent()).
+
+        """
+        self.__register_all_agents(agents, memory_map)
+
+        if aggregate:
+            self.aggregate_agents()
+
+        # Connect the simulated agents to the order book
+        for agents_dict in self.agents.values():
+            for agent_id, agentDB in agents_dict.items():
+                self.connect_order_book(agentDB)
+
+        # Agents with sub-agents keep their tables
+        if columnar:
+            self.store = RegionStore()
+            self.store.add_agents({agent_id: agentDB for agents in self.agents.values()
+                                   for agent_id, agentDB in agents.items() if not agentDB.sub_agents})
 
         self.__register_all_markets()
 
-    def save_region(self, path):
-        """Save this region."""
+    def save_region(self, path, exclude: list = None):
+        """Save this region. Tables whose names are in exclude are not saved."""
 
         # Update region path
         self.region_save = os.path.abspath(path)
 
-        self.__save_all_agents()
+        # Write the pending tables so that the tables of the agents are views on the store
+        if self.store:
+            self.store.flush()
+
+        self.__save_all_agents(exclude)
+
+        self.__save_all_markets(exclude)
+
+    def save_checkpoint(self, checkpoint, key: str, agents: bool = True, markets: bool = True,
+                        forecasters: bool = True):
+        """
+        Write the state of the region to the checkpoint.
+
+        Args:
+            checkpoint: Checkpoint object to write to.
+            key: key of the region in the checkpoint.
+            agents: if True, the agent tables are written.
+            markets: if True, the market tables are written.
+            forecasters: if True, the states of the forecasters of the agents are written.
+
+        """
+        # The tables of the store are written at once instead of per agent
+        if agents and self.store:
+            self.store.save_checkpoint(checkpoint, key=f'{key}/store')
+
+        for agents_type, agents_dict in self.agents.items():
+            for agent_id, agentDB in agents_dict.items():
+                agent_key = f'{key}/agents/{agents_type}/{agent_id}'
+                if agents:
+                    stored = [table for table in self.store.kinds if self.store.has(table, agent_id)] \
+                        if self.store else None
+                    agentDB.save_checkpoint(checkpoint, key=agent_key, forecaster=forecasters, exclude=stored)
+                elif forecasters and agentDB.forecaster is not None:
+                    agentDB.forecaster.save_checkpoint(checkpoint, key=f'{agent_key}/forecaster')
+
+        if markets:
+            for markets_type, markets_dict in self.markets.items():
+                for market_name, marketDB in markets_dict.items():
+                    marketDB.save_checkpoint(checkpoint, key=f'{key}/markets/{markets_type}/{market_name}')
+
+    def load_checkpoint(self, checkpoint, key: str, markets: bool = True, forecasters: bool = True):
+        """
+        Load the state of the region from the checkpoint. Only the registered agents are loaded.
+
+        Args:
+            checkpoint: Checkpoint object to read from.
+            key: key of the region in the checkpoint.
+            markets: if True, the market tables are loaded.
+            forecasters: if True, the states of the forecasters of the agents are loaded.
+
+        """
+        # Checkpoints written with a store contain its wide tables instead of the tables of each agent. Regions without
+        #   a store (e.g. in the worker processes of the process backend) take the tables of their agents from them.
+        stored = {}
+        if self.store:
+            self.store.load_checkpoint(checkpoint, key=f'{key}/store')
+        else:
+            stored = RegionStore.read_agent_tables(checkpoint, key=f'{key}/store',
+                                                   kinds=[kind for kind in RegionStore.KINDS
+                                                          if kind in AgentDB.CHECKPOINT_TABLES],
+                                                   agent_ids=[agent_id for agents_dict in self.agents.values()
+                                                              for agent_id in agents_dict.keys()])
+
+        for agents_type, agents_dict in self.agents.items():
+            for agent_id, agentDB in agents_dict.items():
+                for table, data in stored.get(agent_id, {}).items():
+                    setattr(agentDB, table, data)
+                agentDB.load_checkpoint(checkpoint, key=f'{key}/agents/{agents_type}/{agent_id}',
+                                        forecaster=forecasters)
+
+        if markets:
+            for markets_type, markets_dict in self.markets.items():
+                for market_name, marketDB in markets_dict.items():
+                    marketDB.load_checkpoint(checkpoint, key=f'{key}/markets/{markets_type}/{market_name}')
+
+    def aggregate_agents(self):
+        """
+        Replace each group of identical agents by one representative.
+
+        Agents are identical if they have the same type, account, plants, specs and tables apart from their agent and
+        plant ids (e.g. generated agents with the same plants, input profiles and ems configuration). They produce the
+        same setpoints and bids, so only the first agent of each group is simulated. Its bids and offers are scaled by
+        the number of agents it represents in the order book and scaled back in the market results (see
+        scale_agent_rows()). When the region is saved, the results of the representative are written for every agent
+        of the group (see fan_out_agent_rows()).
+
+        Agents with sub-agents are not aggregated.
+
+        """
+        for agents_type, agents in self.agents.items():
+            groups = {}
+            for agent_id, agentDB in agents.items():
+                key = self.__get_agent_signature(agentDB) if not agentDB.sub_agents else agent_id
+                groups.setdefault(key, []).append(agent_id)
+
+            for members in groups.values():
+                if len(members) == 1:
+                    continue
+                representative = members[0]
+                self.multiplicity[representative] = len(members)
+                for member in members[1:]:
+                    self.aggregated.setdefault(agents_type, {})[member] = (representative, agents.pop(member))
 
-        self.__save_all_markets()
+    def connect_order_book(self, agentDB: AgentDB):
+        """Connect the agent to the order book of the region and post its current bids and offers"""
+
+        agentDB.order_book = self.order_book
+        self.order_book.post(agentDB.agent_id, agentDB.bids_offers)
+
+    def scale_agent_rows(self, table: pl.DataFrame, column: str = c.TC_ID_AGENT, inverse: bool = False):
+        """
+        Scale the energy and price columns of the rows of representatives by the number of agents they represent.
+
+        Args:
+            table: bids and offers or market results table.
+            column: column that contains the agent ids.
+            inverse: if True, the rows are divided by the number of agents instead (the share of one agent).
+
+        Returns:
+            table: The scaled table.
+
+        """
+        if not self.multiplicity or column not in table.columns:
+            return table
+
+        factor = pl.col(column).cast(pl.Utf8).map_dict(self.multiplicity, default=1)
+        scaled = []
+        for col in [col for col in self.EXTENSIVE_COLUMNS if col in table.columns]:
+            value = pl.col(col) / factor if inverse else pl.col(col) * factor
+            scaled.append(value.round(0).cast(table.schema[col]).alias(col))
+
+        return table.with_columns(scaled)
+
+    def fan_out_agent_rows(self, table: pl.DataFrame, column: str = c.TC_ID_AGENT):
+        """
+        Repeat the rows of representatives for each agent they represent (with the id of the agent).
+
+        Args:
+            table: market results table.
+            column: column that contains the agent ids.
+
+        Returns:
+            table: The table with the rows of all agents.
+
+        """
+        if not self.aggregated or column not in table.columns:
+            return table
+
+        # Pairs of representative and agent (including the representative itself)
+        pairs = [(rep_id, rep_id) for rep_id in self.multiplicity.keys()]
+        pairs += [(rep_id, agent_id) for agents in self.aggregated.values() for agent_id, (rep_id, _) in agents.items()]
+        members = pl.DataFrame({'_representative': [rep for rep, _ in pairs], '_agent': [agent for _, agent in pairs]})
+
+        return (table.with_columns(pl.col(column).cast(pl.Utf8).alias('_representative'))
+                .join(members, on='_representative', how='left')
+                .with_columns(pl.coalesce('_agent', '_representative').cast(table.schema[column]).alias(column))
+                .drop(['_representative', '_agent']))
 
     def register_forecasters_for_agents(self, general: dict):
         """
@@ -86,37 +291,39 @@ class RegionDB:
 
                 for agents in self.agents.values():
                     for agent in agents.values():
-                        # print(f'updating local market for agent {agent.agent_id}')
-                        old_target = agent.forecaster.train_data[local_market_key][c.K_TARGET]
-
-                        # get column name of the old target
-                        column_name = old_target.columns
-                        column_name.remove(c.TC_TIMESTAMP)
-                        column_name = column_name[0]
-                        # print('hi')
-
-                        # replace a part of the old target with new target
-                        # NOTICE: adjust dataframe to dataframe if necessary, polars concat is sometimes tricky
-                        new_target = pl.concat([old_target, market_price], how='diagonal')
-                        new_target = new_target.with_columns(pl.when(pl.col('new_target').is_null())
-                                                             .then(pl.col(column_name))
-                                                             .otherwise(pl.col('new_target')).alias(column_name))
-                        # print('hi2')
-
-                        # delete unnecessary column
-                        new_target = new_target.drop('new_target')
-
-                        # update forecaster bzw. models
-                        # NOTICE: new_target should be dataframe now
-                        agent.forecaster.update_forecaster(id=local_market_key, dataframe=new_target, target=True)
-
-    def __register_all_agents(self):
+                        # the forecaster might be prefetching the forecasts of the next timestamp
+                        with agent.forecaster.lock:
+                            # print(f'updating local market for agent {agent.agent_id}')
+                            old_target = agent.forecaster.train_data[local_market_key][c.K_TARGET]
+
+                            # get column name of the old target
+                            column_name = old_target.columns
+                            column_name.remove(c.TC_TIMESTAMP)
+                            column_name = column_name[0]
+                            # print('hi')
+
+                            # replace a part of the old target with new target
+                            # NOTICE: adjust dataframe to dataframe if necessary, polars concat is sometimes tricky
+                            new_target = pl.concat([old_target, market_price], how='diagonal')
+                            new_target = new_target.with_columns(pl.when(pl.col('new_target').is_null())
+                                                                 .then(pl.col(column_name))
+                                                                 .otherwise(pl.col('new_target')).alias(column_name))
+                            # print('hi2')
+
+                            # delete unnecessary column
+                            new_target = new_target.drop('new_target')
+
+                            # update forecaster bzw. models
+                            # NOTICE: new_target should be dataframe now
+                            agent.forecaster.update_forecaster(id=local_market_key, dataframe=new_target, target=True)
+
+    def __register_all_agents(self, selection: list = None, memory_map: bool = False):
         """
         Register all agents for this region.
 
         This function loop through the agents path of this region and write each agent and its data to an AgentDB
         object. The AgentDB objects will be stored in the dict self.agents with first level keys agent types and
-        second level keys agent ids.
+        second level keys agent ids. If a selection of agent ids is given, all other agents are skipped.
 
         """
         agents_types = f.get_all_subdirectories(os.path.join(self.region_path, 'agents'))
@@ -126,19 +333,45 @@ class RegionDB:
             agents = f.get_all_subdirectories(os.path.join(self.region_path, 'agents', agents_type))
             if agents:
                 for agent in agents:
+                    # skip agents that are not part of the selection
+                    if selection is not None and agent not in selection:
+                        continue
                     sub_agents = f.get_all_subdirectories(os.path.join(self.region_path, 'agents', agents_type, agent))
                     self.agents[agents_type][agent] = AgentDB(
                         path=os.path.join(self.region_path, 'agents', agents_type, agent),
                         agent_type=agents_type,
                         agent_id=agent)
                     if sub_agents is None:
-                        self.agents[agents_type][agent].register_agent()
+                        self.agents[agents_type][agent].register_agent(memory_map=memory_map)
                     else:
                         for sub_agent in sub_agents:
                             self.agents[agents_type][agent].register_sub_agent(id=sub_agent,
                                                                                path=os.path.join(self.region_path,
                                                                                                  'agents', agents_type,
-                                                                                                 agent, sub_agent))
+                                                                                                 agent, sub_agent),
+                                                                               memory_map=memory_map)
+
+    @staticmethod
+    def __get_agent_signature(agentDB: AgentDB) -> str:
+        """Get a hash of the data of the agent that does not depend on its agent and plant ids"""
+
+        # Replace the ids by their position (the plants of identical agents are created in the same order)
+        ids = {agentDB.agent_id: 'agent'}
+        ids.update({plant_id: f'plant{idx}' for idx, plant_id in enumerate(agentDB.plants.keys())})
+
+        def replace_ids(text: str) -> str:
+            for old, new in ids.items():
+                text = text.replace(old, new)
+            return text
+
+        signature = hashlib.sha1(agentDB.agent_type.encode())
+        data = json.dumps([agentDB.account, agentDB.plants, agentDB.specs], sort_keys=True, default=str)
+        signature.update(replace_ids(data).encode())
+        for table in ['meters', 'timeseries', 'socs', 'setpoints', 'forecasts']:
+            table = getattr(agentDB, table)
+            signature.update(f.df_to_ipc(table.rename({col: replace_ids(col) for col in table.columns})))
+
+        return signature.hexdigest()
 
     def __register_all_markets(self):
         """
@@ -161,7 +394,7 @@ class RegionDB:
                                                                                          markets_type, market))
                 self.markets[markets_type][market].register_market()
 
-    def __save_all_agents(self):
+    def __save_all_agents(self, exclude: list = None):
         """
         Save all agents for this region.
 
@@ -176,10 +409,21 @@ class RegionDB:
                 path = os.path.join(self.region_save, 'agents', agents_type, agent_id)
 
                 # Save agent data
-                agentDB.save_agent(path)
+                agentDB.save_agent(path, exclude=exclude)
                 # TODO: Add subagent functionality
 
-    def __save_all_markets(self):
+        # Save the results of the representatives for the agents they represent (with their own plant ids)
+        for agents_type, agents in self.aggregated.items():
+            for agent_id, (rep_id, agentDB) in agents.items():
+                representative = self.agents[agents_type][rep_id]
+                ids = dict(zip(representative.plants.keys(), agentDB.plants.keys()))
+                for table in self.AGGREGATED_AGENT_TABLES:
+                    data = getattr(representative, table)
+                    setattr(agentDB, table, data.rename({col: self.__replace_prefix(col, ids) for col in data.columns}))
+
+                agentDB.save_agent(os.path.join(self.region_save, 'agents', agents_type, agent_id), exclude=exclude)
+
+    def __save_all_markets(self, exclude: list = None):
         """
         Save all markets for this region.
 
@@ -192,5 +436,23 @@ class RegionDB:
                 # Path to save results to
                 path = os.path.join(self.region_save, 'markets', markets_type, market_name)
 
+                # Repeat the results of the representatives for the agents they represent
+                if self.aggregated:
+                    marketDB = copy(marketDB)
+                    for table in MarketDB.CHECKPOINT_TABLES:
+                        data = getattr(marketDB, table)
+                        for column in self.AGENT_COLUMNS:
+                            data = self.fan_out_agent_rows(data, column=column)
+                        setattr(marketDB, table, data)
+
                 # Save market data
-                marketDB.save_market(path)
\ No newline at end of file
+                marketDB.save_market(path, exclude=exclude)
+
+    @staticmethod
+    def __replace_prefix(column: str, ids: dict) -> str:
+        """Replace the plant id at the beginning of a column name"""
+
+        for old, new in ids.items():
+            if column.startswith(old):
+                return new + column[len(old):]
+        return column
\ No newline at end of file
@@ -0,0 +1,342 @@
+__author__ = "jiahechu"
+__credits__ = "MarkusDoepfert"
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+import polars as pl
+from datetime import datetime
+from hamlet import constants as c
+
+
+class RegionStore:
+    """
+    Columnar storage of the agent tables of a region.
+
+    Each table kind (e.g. meters) of all agents is kept in one wide table with one row per timestamp and the columns of
+    all agents, named '<agent id>/<column>'. As the agent tables are created on the same time grid, the columns of the
+    agents are stored side by side without copying them. The AgentDB objects are views on the store (see StoredTable):
+    reading a table selects the columns of the agent and writing a table marks its columns as pending. The pending
+    columns of all agents are written to the wide table at once (see flush()), so that the whole region can be queried,
+    updated and saved in bulk.
+
+    Tables of an agent that do not match the time grid of the store (e.g. because they were pruned individually) are
+    removed from the store and kept by the agent itself. The setpoints are therefore not stored: the controllers move
+    them along with the horizon, so they never match the time grid.
+
+    Attributes:
+        kinds: names of the tables that are stored.
+        key: name of the timestamp column.
+        tables: dictionary with the table kinds as keys and the wide tables (incl. the timestamp column) as values.
+        columns: dictionary with the table kinds as keys and dictionaries {agent id: columns of the agent} as values.
+        pending: dictionary with the table kinds as keys and dictionaries {agent id: table or None} as values. None
+            marks agents whose columns are removed from the store.
+        views: dictionary with the table kinds as keys and dictionaries {agent id: table of the agent} as values. Caches
+            the tables of the agents until the wide table or the table of the agent changes.
+
+    """
+
+    # Separator of the agent id and the column name in the wide tables
+    SEPARATOR = '/'
+
+    # Tables of the agents that are on the time grid of the simulation
+    KINDS = ['meters', 'socs', 'timeseries']
+
+    def __init__(self, kinds: list = None, key: str = c.TC_TIMESTAMP):
+        self.kinds = kinds if kinds else self.KINDS
+        self.key = key
+        self.tables = {}
+        self.columns = {kind: {} for kind in self.kinds}
+        self.pending = {kind: {} for kind in self.kinds}
+        self.views = {kind: {} for kind in self.kinds}
+
+    def add_agents(self, agents: dict):
+        """
+        Moves the tables of the agents into the store and connects the agents to it.
+
+        Agents whose tables do not share the time grid of the first agent keep the respective tables.
+
+        Args:
+            agents: dictionary with the agent ids as keys and the AgentDB objects as values.
+
+        """
+        for kind in self.kinds:
+            series = []
+            for agent_id, agentDB in agents.items():
+                table = getattr(agentDB, kind)
+                if self.key not in table.columns:
+                    continue
+                if not series:
+                    series.append(table.get_column(self.key))
+                elif not table.get_column(self.key).series_equal(series[0]):
+                    continue
+                series += [table.get_column(col).alias(self.__name(agent_id, col))
+                           for col in table.columns if col != self.key]
+                self.columns[kind][agent_id] = [col for col in table.columns if col != self.key]
+            if series:
+                self.tables[kind] = pl.DataFrame(series)
+
+        # Connect the agents (the tables they keep themselves remain their attributes)
+        for agent_id, agentDB in agents.items():
+            for kind in self.kinds:
+                if self.has(kind, agent_id):
+                    agentDB.__dict__.pop(kind, None)
+            agentDB.store = self
+
+    def has(self, kind: str, agent_id: str) -> bool:
+        """Checks if the table of the agent is stored"""
+
+        if kind not in self.columns or agent_id not in self.columns[kind]:
+            return False
+
+        return self.pending[kind].get(agent_id, True) is not None
+
+    def get(self, kind: str, agent_id: str) -> pl.DataFrame:
+        """Returns the table of the agent (the columns are not copied)"""
+
+        if agent_id in self.pending[kind]:
+            return self.pending[kind][agent_id]
+
+        view = self.views[kind].get(agent_id)
+        if view is None:
+            table = self.tables[kind]
+            view = pl.DataFrame([table.get_column(self.key)]
+                                + [table.get_column(self.__name(agent_id, col)).alias(col)
+                                   for col in self.columns[kind][agent_id]])
+            self.views[kind][agent_id] = view
+
+        return view
+
+    def set(self, kind: str, agent_id: str, table: pl.DataFrame) -> bool:
+        """
+        Replaces the table of the agent.
+
+        Returns:
+            bool: True if the table is stored, False if the agent needs to keep it (the agent is not part of the store
+                or the table is not on the time grid of the store anymore).
+
+        """
+        if not self.has(kind, agent_id):
+            return False
+        self.views[kind].pop(agent_id, None)
+
+        index = self.tables[kind].get_column(self.key)
+        if self.key not in table.columns or not table.get_column(self.key).series_equal(index):
+            self.pending[kind][agent_id] = None
+            return False
+
+        self.pending[kind][agent_id] = table
+        return True
+
+    def flush(self, kind: str = None):
+        """Writes the pending tables to the wide tables (all kinds if none is given)"""
+
+        for kind in [kind] if kind else self.kinds:
+            pending = self.pending[kind]
+            if not pending:
+                continue
+
+            table = self.tables[kind]
+            replaced = {self.__name(agent_id, col) for agent_id in pending for col in self.columns[kind][agent_id]}
+            series = [table.get_column(col) for col in table.columns if col not in replaced]
+            for agent_id, data in pending.items():
+                if data is None:
+                    del self.columns[kind][agent_id]
+                    continue
+                series += [data.get_column(col).alias(self.__name(agent_id, col))
+                           for col in data.columns if col != self.key]
+                self.columns[kind][agent_id] = [col for col in data.columns if col != self.key]
+
+            self.tables[kind] = pl.DataFrame(series)
+            self.pending[kind] = {}
+            self.views[kind] = {}
+
+    def get_table(self, kind: str) -> pl.DataFrame:
+        """Returns the wide table of all agents ('<agent id>/<column>')"""
+
+        self.flush(kind)
+
+        return self.tables[kind]
+
+    def get_rows(self, kind: str, start: datetime = None, end: datetime = None, agent_ids: list = None,
+                 id_column: str = 'column', value_column: str = 'value') -> pl.DataFrame:
+        """
+        Returns the rows of the agents in long format (timestamp, agent id, column, value).
+
+        Args:
+            kind: name of the table.
+            start: first timestamp (included). Defaults to the first timestamp of the table.
+            end: last timestamp (excluded). Defaults to the end of the table.
+            agent_ids: agents to include. Defaults to all agents of the store.
+            id_column: name of the column that contains the column names of the agents.
+            value_column: name of the column that contains the values (cast to float).
+
+        Returns:
+            pl.DataFrame: the rows of the agents.
+
+        """
+        table = self.get_table(kind)
+        if agent_ids is not None:
+            table = table.select([self.key] + [self.__name(agent_id, col) for agent_id in agent_ids
+                                               if agent_id in self.columns[kind]
+                                               for col in self.columns[kind][agent_id]])
+        if start is not None:
+            table = table.filter(pl.col(self.key) >= pl.lit(start).cast(table.schema[self.key]))
+        if end is not None:
+            table = table.filter(pl.col(self.key) < pl.lit(end).cast(table.schema[self.key]))
+
+        return self.__to_long(table, id_column, value_column)
+
+    def update_rows(self, kind: str, table: pl.DataFrame):
+        """
+        Updates the rows of the wide table with the rows of the given table (same columns names, matched by timestamp).
+
+        Args:
+            kind: name of the table.
+            table: table with the timestamp column and columns '<agent id>/<column>' of the store.
+
+        """
+        self.tables[kind] = self.get_table(kind).update(table, on=self.key)
+        self.views[kind] = {}
+
+    def prune(self, kind: str, before: datetime = None, id_column: str = 'column',
+              value_column: str = 'value') -> pl.DataFrame | None:
+        """
+        Removes the rows before the given timestamp from the wide table.
+
+        Args:
+            kind: name of the table.
+            before: rows before this timestamp are removed. If None, all rows are removed.
+            id_column: name of the column that contains the column names of the agents.
+            value_column: name of the column that contains the values.
+
+        Returns:
+            pl.DataFrame: the removed rows in long format (see get_rows()) or None if no rows were removed.
+
+        """
+        if kind not in self.tables:
+            return None
+
+        table = self.get_table(kind)
+        if before is None:
+            past, self.tables[kind] = table, table.clear()
+        else:
+            mask = pl.col(self.key) < pl.lit(before).cast(table.schema[self.key])
+            past = table.filter(mask)
+            if past.is_empty():
+                return None
+            self.tables[kind] = table.filter(~mask)
+        self.views[kind] = {}
+
+        return self.__to_long(past, id_column, value_column)
+
+    def save_checkpoint(self, checkpoint, key: str):
+        """Writes the wide tables to the checkpoint"""
+
+        for kind in self.tables.keys():
+            checkpoint.write_table(key=f'{key}/{kind}', data=self.get_table(kind))
+
+    def load_checkpoint(self, checkpoint, key: str):
+        """Replaces the wide tables with the ones of the checkpoint (agents that are not part of them are removed)"""
+
+        for kind in list(self.tables.keys()):
+            table = checkpoint.read_table(key=f'{key}/{kind}')
+            if table is None:
+                continue
+
+            columns = {}
+            for col in table.columns:
+                if col != self.key:
+                    agent_id, name = col.split(self.SEPARATOR, 1)
+                    columns.setdefault(agent_id, []).append(name)
+            self.tables[kind] = table
+            self.columns[kind] = columns
+            self.pending[kind] = {}
+            self.views[kind] = {}
+
+    @classmethod
+    def read_agent_tables(cls, checkpoint, key: str, kinds: list = None, agent_ids: list = None,
+                          index: str = c.TC_TIMESTAMP) -> dict:
+        """
+        Reads the wide tables of a checkpoint and splits them into the tables of the agents.
+
+        Used to load checkpoints that were written with a store into regions without one (e.g. the worker processes of
+        the process backend).
+
+        Args:
+            checkpoint: Checkpoint object to read from.
+            key: key of the store in the checkpoint.
+            kinds: names of the tables. Defaults to all tables of a store.
+            agent_ids: agents whose tables are returned. Defaults to all agents of the checkpoint.
+            index: name of the timestamp column.
+
+        Returns:
+            dict: dictionary with the agent ids as keys and dictionaries {table name: table} as values.
+
+        """
+        tables = {}
+        for kind in kinds if kinds else cls.KINDS:
+            table = checkpoint.read_table(key=f'{key}/{kind}')
+            if table is None:
+                continue
+
+            columns = {}
+            for col in table.columns:
+                if col != index:
+                    agent_id, name = col.split(cls.SEPARATOR, 1)
+                    if agent_ids is None or agent_id in agent_ids:
+                        columns.setdefault(agent_id, []).append((col, name))
+            for agent_id, names in columns.items():
+                tables.setdefault(agent_id, {})[kind] = table.select([pl.col(index)]
+                                                                     + [pl.col(col).alias(name) for col, name in names])
+
+        return tables
+
+    def __name(self, agent_id: str, column: str) -> str:
+        """Returns the name of the column of the agent in the wide table"""
+
+        return f'{agent_id}{self.SEPARATOR}{column}'
+
+    def __to_long(self, table: pl.DataFrame, id_column: str, value_column: str) -> pl.DataFrame:
+        """Returns the wide table in long format (timestamp, agent id, column, value)"""
+
+        if table.width <= 1:
+            return pl.DataFrame(schema={self.key: table.schema.get(self.key, pl.Datetime), c.TC_ID_AGENT: pl.Utf8,
+                                        id_column: pl.Utf8, value_column: pl.Float64})
+
+        table = table.select([pl.col(self.key)] + [pl.col(col).cast(pl.Float64) for col in table.columns
+                                                   if col != self.key])
+        return (table.melt(id_vars=self.key, variable_name='_name', value_name=value_column)
+                .with_columns(pl.col('_name').str.split_exact(self.SEPARATOR, 1)
+                              .struct.rename_fields([c.TC_ID_AGENT, id_column]).alias('_name'))
+                .unnest('_name')
+                .select(self.key, c.TC_ID_AGENT, id_column, value_column))
+
+
+class StoredTable:
+    """
+    Attribute of the AgentDB that is kept in the RegionStore of its region if the agent is connected to one.
+
+    Without a store (or if the store does not contain the table of the agent) the table is a normal attribute.
+
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, agentDB, owner=None):
+        if agentDB is None:
+            return self
+
+        store = agentDB.__dict__.get('store')
+        if store is not None and self.name not in agentDB.__dict__ and store.has(self.name, agentDB.agent_id):
+            return store.get(self.name, agentDB.agent_id)
+
+        return agentDB.__dict__[self.name]
+
+    def __set__(self, agentDB, value):
+        store = agentDB.__dict__.get('store')
+        if store is not None and store.set(self.name, agentDB.agent_id, value):
+            agentDB.__dict__.pop(self.name, None)
+        else:
+            agentDB.__dict__[self.name] = value
@@ -0,0 +1,198 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+# This file is in charge of streaming the results of the simulation to disk
+
+# Imports
+import os
+import queue
+import threading
+import traceback
+import polars as pl
+import pyarrow as pa
+
+# File extension of the Arrow IPC stream files
+EXTENSION = 'arrows'
+
+
+class ResultWriter:
+    """
+    Appends result tables to Arrow IPC stream files in a background thread.
+
+    Each key (e.g. 'region/markets/lem/market_name/market_transactions') is written to its own stream file
+    '<path>/<key>.arrows'. The first table of a key defines the schema of the file; all following tables are cast to
+    it. The queue is bounded so that the simulation waits for the writer instead of accumulating the tables in memory
+    if the disk is slower than the simulation.
+
+    The number of rows that were written to each stream is recorded with the checkpoints (see flush()). When the
+    simulation is resumed, the streams are cut back to these numbers and continued (see restore()), so that the rows
+    that were streamed before the checkpoint are kept and the ones that are simulated again are not duplicated.
+
+    Attributes:
+        path: path to the folder the stream files are written to.
+        rows: dictionary with the keys as keys and the number of rows that were queued for them as values.
+
+    """
+
+    def __init__(self, path: str, max_queue: int = 64):
+        """
+        Args:
+            path: path to the folder the stream files are written to.
+            max_queue: maximum number of tables that wait to be written.
+
+        """
+        self.path = os.path.abspath(path)
+        self.rows = {}
+
+        self.__queue = queue.Queue(maxsize=max_queue)
+        self.__streams = {}  # key: (file, stream writer, schema)
+        self.__error = None  # traceback of an error that occurred in the writer thread
+
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def write(self, key: str, data: pl.DataFrame):
+        """
+        Queues the table to be appended to the stream file of the key.
+
+        Args:
+            key: key of the stream file (relative path without file extension).
+            data: table to append.
+
+        """
+        self.__raise_error()
+
+        if data is None or data.is_empty():
+            return
+
+        self.rows[key] = self.rows.get(key, 0) + data.height
+        self.__queue.put((key, data))
+
+    def flush(self) -> dict:
+        """
+        Waits until all queued tables are written and flushes the stream files.
+
+        Returns:
+            dict: the number of rows of each stream (to be stored with a checkpoint, see restore()).
+
+        """
+        self.__queue.join()
+        self.__raise_error()
+
+        # The writer thread is idle as long as no new tables are queued
+        for file, _, _ in self.__streams.values():
+            file.flush()
+
+        return dict(self.rows)
+
+    def restore(self, rows: dict, folders: list):
+        """
+        Continues the streams of a checkpoint. Must be called before the first table is written.
+
+        The streams of the keys are cut back to the number of rows that were recorded with the checkpoint and kept open
+        for appending. Stream files in the folders that were not recorded (i.e. they were started after the checkpoint)
+        are deleted.
+
+        Args:
+            rows: dictionary with the keys as keys and their number of rows as values (see flush()).
+            folders: folders (relative to the path) that contain the streams of the simulation (e.g. the regions).
+
+        """
+        # Delete the streams that were started after the checkpoint
+        for folder in folders:
+            for root, _, files in os.walk(os.path.join(self.path, folder)):
+                for file in files:
+                    if not file.endswith(f'.{EXTENSION}'):
+                        continue
+                    key = os.path.relpath(os.path.join(root, file), self.path)[:-len(EXTENSION) - 1]
+                    if key.replace(os.sep, '/') not in rows:
+                        os.remove(os.path.join(root, file))
+
+        for key, num_rows in rows.items():
+            self.__truncate(key, num_rows)
+        self.rows = dict(rows)
+
+    def close(self):
+        """Writes all queued tables and closes the stream files"""
+
+        self.__queue.put(None)
+        self.__thread.join()
+
+        self.__raise_error()
+
+    def __run(self):
+        """Main loop of the writer thread"""
+
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                self.__queue.task_done()
+                break
+
+            # Keep draining the queue after an error so that the simulation is not blocked
+            if not self.__error:
+                try:
+                    self.__append(*item)
+                except Exception:
+                    self.__error = traceback.format_exc()
+            self.__queue.task_done()
+
+        for file, writer, _ in self.__streams.values():
+            writer.close()
+            file.close()
+
+    def __append(self, key: str, data: pl.DataFrame):
+        """Appends the table to the stream file of the key"""
+
+        # Categorical columns are stored as strings as their dictionaries differ between the tables
+        table = data.with_columns(pl.col(pl.Categorical).cast(pl.Utf8)).to_arrow()
+
+        # Open the stream file with the schema of the first table
+        if key not in self.__streams:
+            path = os.path.join(self.path, f'{key}.{EXTENSION}')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file = pa.OSFile(path, 'wb')
+            self.__streams[key] = (file, pa.ipc.new_stream(file, table.schema), table.schema)
+
+        _, writer, schema = self.__streams[key]
+        writer.write_table(table.select(schema.names).cast(schema))
+
+    def __truncate(self, key: str, num_rows: int):
+        """Cuts the stream file of the key back to the number of rows and opens it for appending"""
+
+        path = os.path.join(self.path, f'{key}.{EXTENSION}')
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'The result stream {path} of the checkpoint does not exist.')
+
+        # Read only the batches up to the number of rows (the rest may be incomplete if the simulation crashed)
+        batches, count = [], 0
+        with pa.OSFile(path, 'rb') as source:
+            reader = pa.ipc.open_stream(source)
+            schema = reader.schema
+            for batch in reader:
+                batches.append(batch.slice(0, num_rows - count))
+                count += batches[-1].num_rows
+                if count >= num_rows:
+                    break
+        if count < num_rows:
+            raise ValueError(f'The result stream {path} contains fewer rows than recorded by the checkpoint.')
+
+        # Write the rows to a new file that replaces the old one atomically and keep it open for appending
+        # Note: The open file keeps being written after it was renamed
+        file = pa.OSFile(path + '.tmp', 'wb')
+        writer = pa.ipc.new_stream(file, schema)
+        for batch in batches:
+            writer.write_batch(batch)
+        file.flush()
+        os.replace(path + '.tmp', path)
+
+        self.__streams[key] = (file, writer, schema)
+
+    def __raise_error(self):
+        """Raises the error of the writer thread in the calling thread"""
+
+        if self.__error:
+            raise RuntimeError(f'An error occurred while writing the results:\n{self.__error}')
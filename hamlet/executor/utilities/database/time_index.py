@@ -0,0 +1,129 @@
+__author__ = "jiahechu"
+__credits__ = "MarkusDoepfert"
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+import math
+import polars as pl
+from datetime import datetime
+from hamlet import constants as c
+from hamlet import functions as f
+
+
+class TimeIndex:
+    """
+    Index of a table whose timestamps lie on a regular time grid.
+
+    The row of a timestamp is computed from the first timestamp and the delta between timestamps instead of searching
+    the timestamp column. Rows and windows are returned as slices of the table (no copy). Rows are written to a copy of
+    the table (see write_row()).
+
+    Attributes:
+        first: first timestamp in microseconds since the epoch.
+        delta: delta between timestamps in microseconds.
+        length: number of rows.
+        regular: True if the timestamps lie on a regular grid. Otherwise, the rows are found by a binary search.
+        timestamps: timestamp column of the table (used if the timestamps are not regular).
+
+    """
+
+    def __init__(self, timestamps: pl.Series):
+        """
+        Args:
+            timestamps: sorted timestamp column of the table.
+
+        """
+        self.timestamps = timestamps
+        self.length = len(timestamps)
+
+        epochs = timestamps.dt.epoch('us')
+        self.first = epochs[0] if self.length else None
+        self.delta = epochs[1] - epochs[0] if self.length > 1 else None
+        self.regular = self.length < 2 or (self.delta > 0 and (epochs.diff().drop_nulls() == self.delta).all())
+
+    def matches(self, table: pl.DataFrame) -> bool:
+        """Checks if the index still belongs to the table (same length and first timestamp)"""
+
+        if table.height != self.length:
+            return False
+
+        return not self.length or f.get_epoch(table[0, c.TC_TIMESTAMP]) == self.first
+
+    def offset(self, timestamp: datetime) -> int | None:
+        """Returns the row of the timestamp or None if the table does not contain it"""
+
+        if not self.length:
+            return None
+
+        if self.regular:
+            distance = f.get_epoch(timestamp) - self.first
+            if self.length == 1:
+                return 0 if distance == 0 else None
+            idx, remainder = divmod(distance, self.delta)
+            return idx if remainder == 0 and 0 <= idx < self.length else None
+
+        bounds = self.__search(timestamp, timestamp)
+        return bounds[0] if bounds[1] > bounds[0] else None
+
+    def window(self, start: datetime, end: datetime) -> tuple:
+        """Returns the first row and the number of rows between the timestamps (both included)"""
+
+        if not self.length:
+            return 0, 0
+
+        if self.regular and self.length > 1:
+            first = max(math.ceil((f.get_epoch(start) - self.first) / self.delta), 0)
+            last = min(math.floor((f.get_epoch(end) - self.first) / self.delta), self.length - 1)
+            return first, max(last - first + 1, 0)
+
+        first, last = self.__search(start, end)
+        return first, max(last - first, 0)
+
+    def row(self, table: pl.DataFrame, timestamp: datetime) -> pl.DataFrame:
+        """Returns the row of the timestamp as slice of the table (empty if the table does not contain it)"""
+
+        idx = self.offset(timestamp)
+
+        return table.clear() if idx is None else table.slice(idx, 1)
+
+    def slice(self, table: pl.DataFrame, start: datetime, end: datetime = None) -> pl.DataFrame:
+        """Returns the rows between the timestamps (both included) as slice of the table"""
+
+        return table.slice(*self.window(start, start if end is None else end))
+
+    def write_row(self, table: pl.DataFrame, timestamp: datetime, values: dict) -> pl.DataFrame:
+        """
+        Writes values to the row of the timestamp of a copy of the table.
+
+        The table itself is not changed as the tables are treated as immutable elsewhere (e.g. the checkpoints detect
+        changed tables by their identity). Each written column is copied in full (O(n) per column); the other columns
+        are shared with the given table. Finding the row does not scan the table.
+
+        Args:
+            table: table to write to.
+            timestamp: timestamp of the row.
+            values: dictionary with the column names as keys and the new values (cast to the type of the column).
+
+        Returns:
+            pl.DataFrame: the updated table (the given table if it does not contain the timestamp).
+
+        """
+        idx = self.offset(timestamp)
+        if idx is None or not values:
+            return table
+
+        table = table.clone()
+        for col, value in values.items():
+            table[idx, col] = value
+
+        return table
+
+    def __search(self, start: datetime, end: datetime) -> tuple:
+        """Returns the first row at or after start and the first row after end by a binary search"""
+
+        # Cast the timestamps to the data type of the column (time unit and time zone need to match in polars)
+        bounds = pl.Series([start, end]).cast(self.timestamps.dtype)
+
+        return (self.timestamps.search_sorted(bounds, side='left')[0],
+                self.timestamps.search_sorted(bounds, side='right')[1])
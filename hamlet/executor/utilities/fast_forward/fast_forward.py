@@ -0,0 +1,374 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+# This file is in charge of fast-forwarding the agents through periods without market clearing
+
+# Imports
+from datetime import datetime
+import numpy as np
+import polars as pl
+from hamlet import constants as c
+
+# Direction of the energy flow of each operation mode seen from the main meter (storages are dispatched separately)
+SIGNS = {c.OM_LOAD: -1, c.OM_GENERATION: 1, c.OM_STORAGE: 0}
+
+# Suffix of the timeseries column of the plant types ('<plant id>_<suffix>', same as the linopy components read them)
+TIMESERIES = {c.P_HEAT: 'heat', c.P_DHW: 'dhw'}  # all other plant types: 'power'
+
+# Storages that are dispatched for self-consumption (all other storages stay idle)
+SELF_CONSUMPTION = [c.P_BATTERY]
+
+# Columns of the bids and offers that are posted for the settlement (same as the trading strategies post them)
+BIDS_OFFERS = [c.TC_TIMESTAMP, c.TC_TIMESTEP, c.TC_REGION, c.TC_MARKET, c.TC_NAME, c.TC_ENERGY_TYPE, c.TC_ID_AGENT,
+               c.TC_ENERGY_IN, c.TC_ENERGY_OUT, c.TC_PRICE_PU_IN, c.TC_PRICE_PU_OUT]
+
+
+class FastForward:
+    """
+    Advances the agents through stretches of timestamps without market clearing in bulk.
+
+    A timestamp is fast-forwarded if none of its tasks clears a market (i.e. the markets are only settled) or if it
+    lies within one of the given periods (e.g. the spin-up period of a scenario). During such a stretch the agents do
+    not forecast, optimize or trade. Instead, a rule-based dispatch is applied to all timestamps of the stretch at once:
+        - plants with a timeseries (loads and generators) follow their timeseries.
+        - heat pumps cover the heat demand of the agent.
+        - batteries maximize the self-consumption of the agent (they charge the surplus and discharge the deficit).
+        - all other storages (e.g. electric vehicles, heat storages) stay idle, i.e. their socs do not change.
+    The meters are advanced with a cumulative sum over the whole stretch. The markets are still settled at each
+    timestamp of the stretch: the agents post the energy that they did not trade beforehand (see create_bids_offers())
+    and the markets settle it with the retailer. Clearing tasks within the periods are skipped. The detailed pipeline
+    resumes at the first timestamp after the stretch.
+
+    Attributes:
+        periods: list of (start, end) tuples of the periods that are fast-forwarded in addition to the flagged
+            timestamps (start inclusive, end exclusive).
+
+    Example:
+        ```
+        fast_forward = FastForward(periods=[(start, start + timedelta(days=7))])
+        for start, (timestamps, end) in fast_forward.get_stretches(timetable, timestamps).items():
+            FastForward.advance(agent, start, end)
+            for timestamp in timestamps:
+                agent.bids_offers = FastForward.create_bids_offers(agent, tasklists[timestamp], markets)
+        ```
+
+    """
+
+    def __init__(self, periods: list = None):
+        """
+        Args:
+            periods: list of (start, end) tuples of additional periods to fast-forward (start inclusive, end exclusive).
+
+        """
+        self.periods = periods if periods else []
+
+    def get_flagged(self, timetable: pl.DataFrame) -> set:
+        """
+        Returns the timestamps that can be fast-forwarded.
+
+        Args:
+            timetable: timetable of the scenario.
+
+        Returns:
+            set: timestamps without any clearing tasks or within one of the periods.
+
+        """
+        # Timestamps whose tasks do not clear any market (actions are separated by a comma, e.g. 'clear,settle')
+        flagged = (timetable.groupby(c.TC_TIMESTAMP)
+                   .agg(self.__has_action(c.MA_CLEAR).any().alias('clears'))
+                   .filter(~pl.col('clears')))
+        flagged = set(flagged.get_column(c.TC_TIMESTAMP).to_list())
+
+        # Timestamps within the periods
+        for start, end in self.periods:
+            flagged.update(timestamp for timestamp in timetable.get_column(c.TC_TIMESTAMP).unique().to_list()
+                           if self.__compare(start, timestamp) <= 0 < self.__compare(end, timestamp))
+
+        return flagged
+
+    def get_stretches(self, timetable: pl.DataFrame, timestamps: list) -> dict:
+        """
+        Returns the stretches of consecutive timestamps that can be fast-forwarded.
+
+        Args:
+            timetable: timetable of the scenario.
+            timestamps: timestamps that are to be executed in ascending order.
+
+        Returns:
+            dict: first timestamp of each stretch as keys and tuples (timestamps of the stretch, end of the stretch) as
+                values. The end is the first timestamp after the stretch (or the end of the last timestep).
+
+        """
+        flagged = self.get_flagged(timetable)
+
+        stretches = {}
+        stretch = []
+        for idx, timestamp in enumerate(timestamps):
+            if timestamp in flagged:
+                stretch.append(timestamp)
+            if stretch and (timestamp not in flagged or idx == len(timestamps) - 1):
+                if timestamp not in flagged:
+                    end = timestamp
+                elif len(timestamps) > 1:
+                    end = timestamp + (timestamps[-1] - timestamps[-2])
+                else:
+                    end = timestamp
+                stretches[stretch[0]] = (stretch, end)
+                stretch = []
+
+        return stretches
+
+    @staticmethod
+    def get_settlement_tasks(tasklist: pl.DataFrame) -> pl.DataFrame:
+        """
+        Returns the tasks of a timestamp of a stretch that are executed: the settlements without the clearings.
+
+        Args:
+            tasklist: tasks of one timestamp and region.
+
+        Returns:
+            pl.DataFrame: the tasks that settle a market with the action set to 'settle' only.
+
+        """
+        return (tasklist.filter(FastForward.__has_action(c.MA_SETTLE))
+                .with_columns(pl.lit(c.MA_SETTLE).cast(tasklist.schema[c.TC_ACTIONS]).alias(c.TC_ACTIONS)))
+
+    @staticmethod
+    def advance(agent, start: datetime, end: datetime):
+        """
+        Applies the rule-based dispatch of the agent from the start to the end of a stretch.
+
+        The meters and socs of all rows after the start up to and including the end are computed from the ones at the
+        start.
+
+        Args:
+            agent: AgentDB of the agent.
+            start: first timestamp of the stretch.
+            end: first timestamp after the stretch.
+
+        Returns:
+            AgentDB: the updated agent.
+
+        """
+        meters = agent.meters
+        if meters.is_empty():
+            return agent
+
+        # Rows of the stretch including the rows at its start and end
+        window = meters.filter(FastForward.__within(meters, start, end))
+        if len(window) < 2:
+            return agent
+
+        # Power of the plants at the timestamps of the stretch (the row at the end is not needed)
+        power = (window.select(c.TC_TIMESTAMP).head(len(window) - 1)
+                 .join(agent.get_window('timeseries', start, end), on=c.TC_TIMESTAMP, how='left'))
+
+        # Duration of each timestep in hours
+        times = window.get_column(c.TC_TIMESTAMP).to_list()
+        durations = np.array([(t1 - t0).total_seconds() for t0, t1 in zip(times[:-1], times[1:])]) * c.SECONDS_TO_HOURS
+
+        # Power of each meter (meter columns: <plant id>_<plant type>_<energy type>) and the socs of the storages
+        flows, socs = FastForward.__dispatch(agent, power, durations, start)
+
+        # Advance the meters by the cumulative energy
+        updates = [window.get_column(c.TC_TIMESTAMP)]
+        for column, flow in flows.items():
+            if column not in window.columns:
+                continue
+            energy = np.round(flow * durations)
+            values = window[0, column] + np.concatenate([[0], np.cumsum(energy)])
+            updates.append(pl.Series(column, values).cast(meters.schema[column]))
+        if len(updates) > 1:
+            agent.meters = meters.update(pl.DataFrame(updates), on=c.TC_TIMESTAMP)
+
+        # Set the socs of the rows after the start
+        if socs:
+            updates = [window.get_column(c.TC_TIMESTAMP).slice(1)]
+            updates += [pl.Series(column, values).cast(agent.socs.schema[column]) for column, values in socs.items()]
+            agent.socs = agent.socs.update(pl.DataFrame(updates), on=c.TC_TIMESTAMP)
+
+        return agent
+
+    @staticmethod
+    def create_bids_offers(agent, tasklist: pl.DataFrame, markets: dict) -> pl.DataFrame:
+        """
+        Returns the bids and offers that the agent posts for the settlements of a timestamp of a stretch.
+
+        The energy of each settled timestep is the change of the meters of the agent's plants during the timestep (see
+        advance()) minus the energy that the agent traded for the timestep beforehand. The markets settle it with the
+        retailer at the balancing prices, so the prices of the bids and offers are not used.
+
+        Args:
+            agent: AgentDB of the agent (advanced through the stretch).
+            tasklist: tasks of the timestamp and region.
+            markets: market data of the region as returned by Database.get_market_data(region).
+
+        Returns:
+            pl.DataFrame: the bids and offers (without columns if there is nothing to settle).
+
+        """
+        tasks = FastForward.get_settlement_tasks(tasklist)
+        meters = agent.meters
+        if tasks.is_empty() or meters.is_empty():
+            return pl.DataFrame()
+
+        agent_id = agent.account[c.K_GENERAL]['agent_id']
+        first, last = tasks.select(pl.min(c.TC_TIMESTEP), pl.max(c.TC_TIMESTEP)).row(0)
+        dtype = meters.schema[c.TC_TIMESTAMP]
+
+        bids_offers = []
+        for (market_type, market_name, energy_type), rows in tasks.partition_by(
+                [c.TC_MARKET, c.TC_NAME, c.TC_ENERGY_TYPE], as_dict=True).items():
+            # Energy of the plants of the energy type during each timestep (positive: surplus)
+            columns = [f'{plant_id}_{plant["type"]}_{energy_type}' for plant_id, plant in agent.plants.items()]
+            columns = [column for column in columns if column in meters.columns]
+            if not columns:
+                continue
+            net = pl.fold(acc=pl.lit(0, dtype=pl.Int64), function=lambda acc, x: acc + x,
+                          exprs=[pl.col(column).cast(pl.Int64) for column in columns])
+            energy = (meters.select(pl.col(c.TC_TIMESTAMP).alias(c.TC_TIMESTEP), (net.shift(-1) - net).alias('net'))
+                      .filter(pl.col('net').is_not_null()))
+
+            # Energy that was traded for the timesteps beforehand (positive: bought)
+            traded = (markets[market_type][market_name]
+                      .get_history(c.TN_MARKET_TRANSACTIONS, start=first, end=last, column=c.TC_ID_AGENT,
+                                   value=agent_id)
+                      .filter(pl.col(c.TC_TYPE_TRANSACTION) == c.TT_MARKET)
+                      .groupby(c.TC_TIMESTEP)
+                      .agg((pl.col(c.TC_ENERGY_IN).cast(pl.Int64).sum()
+                            - pl.col(c.TC_ENERGY_OUT).cast(pl.Int64).sum()).alias('traded')))
+
+            # Energy that is still to be bought (positive) or sold (negative)
+            rows = (rows.select(BIDS_OFFERS[:6])
+                    .join(energy.with_columns(pl.col(c.TC_TIMESTEP).cast(rows.schema[c.TC_TIMESTEP])),
+                          on=c.TC_TIMESTEP, how='left')
+                    .join(traded.with_columns(pl.col(c.TC_TIMESTEP).cast(rows.schema[c.TC_TIMESTEP])),
+                          on=c.TC_TIMESTEP, how='left')
+                    .with_columns((-pl.col('net').fill_null(0) - pl.col('traded').fill_null(0)).alias('buy_sell')))
+            bids_offers.append(rows.with_columns(
+                pl.lit(agent_id).cast(pl.Categorical).alias(c.TC_ID_AGENT),
+                pl.when(pl.col('buy_sell') > 0).then(pl.col('buy_sell')).otherwise(0)
+                .cast(pl.UInt64).alias(c.TC_ENERGY_IN),
+                pl.when(pl.col('buy_sell') < 0).then(-pl.col('buy_sell')).otherwise(0)
+                .cast(pl.UInt64).alias(c.TC_ENERGY_OUT),
+                pl.lit(0, dtype=pl.Int32).alias(c.TC_PRICE_PU_IN),
+                pl.lit(0, dtype=pl.Int32).alias(c.TC_PRICE_PU_OUT),
+            ).select(BIDS_OFFERS))
+
+        if not bids_offers:
+            return pl.DataFrame()
+
+        bids_offers = pl.concat(bids_offers, how='vertical')
+        bids_offers = bids_offers.filter((pl.col(c.TC_ENERGY_IN) != 0) | (pl.col(c.TC_ENERGY_OUT) != 0))
+
+        return bids_offers if not bids_offers.is_empty() else pl.DataFrame()
+
+    @staticmethod
+    def __dispatch(agent, power: pl.DataFrame, durations: np.ndarray, start: datetime) -> tuple[dict, dict]:
+        """
+        Applies the rule-based dispatch to the plants of the agent.
+
+        Returns:
+            tuple: the power of each meter column at each timestep of the stretch and the socs of the storages after
+                each timestep ({column: array}).
+
+        """
+
+        def series(column: str) -> np.ndarray | None:
+            """Returns the values of a timeseries column (None if the agent has no such column)"""
+            if column not in power.columns:
+                return None
+            return np.nan_to_num(power.get_column(column).cast(pl.Float64).to_numpy())
+
+        steps = len(durations)
+        flows = {}
+        residual = np.zeros(steps)  # electricity generation minus load (W)
+        heat_demand = np.zeros(steps)  # heat demand (W)
+
+        # Plants that follow their timeseries
+        for plant_id, plant in agent.plants.items():
+            if plant['type'] == c.P_HP:
+                continue
+            for energy_type, mode in c.COMP_MAP.get(plant['type'], {}).items():
+                values = series(f'{plant_id}_{TIMESERIES.get(plant["type"], "power")}')
+                if values is None or not SIGNS[mode]:
+                    continue
+                flows[f'{plant_id}_{plant["type"]}_{energy_type}'] = SIGNS[mode] * values
+                if energy_type == c.ET_ELECTRICITY:
+                    residual += SIGNS[mode] * values
+                elif energy_type == c.ET_HEAT:
+                    heat_demand -= SIGNS[mode] * values
+
+        # Heat pumps share the heat demand (limited by their size) and consume electricity according to their cop
+        heat_pumps = [plant_id for plant_id, plant in agent.plants.items() if plant['type'] == c.P_HP]
+        for plant_id in heat_pumps:
+            cop = series(f'{plant_id}_{c.S_COP}_{c.P_HEAT}')
+            cop = cop * c.COP100_TO_COP if cop is not None else series(f'{plant_id}_cop')
+            if cop is None:
+                continue
+            heat = np.minimum(np.maximum(heat_demand, 0) / len(heat_pumps),
+                              agent.plants[plant_id].get('sizing', {}).get('power', np.inf))
+            electricity = np.divide(heat, cop, out=np.zeros(steps), where=cop > 0)
+            flows[f'{plant_id}_{c.P_HP}_{c.ET_HEAT}'] = heat
+            flows[f'{plant_id}_{c.P_HP}_{c.ET_ELECTRICITY}'] = -electricity
+            residual -= electricity
+
+        # Storages: batteries maximize the self-consumption, all others stay idle
+        socs = {}
+        initial = agent.socs.filter(pl.col(c.TC_TIMESTAMP) == pl.lit(start).cast(agent.socs.schema[c.TC_TIMESTAMP])) \
+            if not agent.socs.is_empty() else pl.DataFrame()
+        if initial.is_empty():
+            return flows, socs
+        for plant_id, plant in agent.plants.items():
+            if plant_id not in initial.columns:
+                continue
+            soc = initial[0, plant_id]
+            if soc is None:
+                continue
+            if plant['type'] not in SELF_CONSUMPTION:
+                socs[plant_id] = np.full(steps, soc)
+                continue
+
+            # Charge the surplus and discharge the deficit within the limits of power, capacity and soc (the same
+            #   limits and efficiency as the linopy battery)
+            sizing = plant['sizing']
+            flow, values = np.zeros(steps), np.zeros(steps)
+            for idx, hours in enumerate(durations):
+                if residual[idx] > 0:
+                    charge = max(min(residual[idx], sizing['power'],
+                                     (sizing['capacity'] - soc) / sizing['efficiency'] / hours), 0)
+                    flow[idx] = -charge
+                    soc += charge * hours * sizing['efficiency']
+                elif residual[idx] < 0:
+                    discharge = max(min(-residual[idx], sizing['power'], soc * sizing['efficiency'] / hours), 0)
+                    flow[idx] = discharge
+                    soc -= discharge * hours / sizing['efficiency']
+                values[idx] = round(soc)
+            residual += flow
+            flows[f'{plant_id}_{plant["type"]}_{c.ET_ELECTRICITY}'] = flow
+            socs[plant_id] = values
+
+        return flows, socs
+
+    @staticmethod
+    def __has_action(action: str) -> pl.Expr:
+        """Returns an expression that is True for the tasks that contain the action"""
+
+        return pl.col(c.TC_ACTIONS).cast(pl.Utf8).fill_null('').str.contains(f'(^|,){action}(,|$)')
+
+    @staticmethod
+    def __within(table: pl.DataFrame, start: datetime, end: datetime) -> pl.Expr:
+        """Returns an expression that is True for the rows from the start up to and including the end"""
+
+        timestamp, dtype = pl.col(c.TC_TIMESTAMP), table.schema[c.TC_TIMESTAMP]
+        return (timestamp >= pl.lit(start).cast(dtype)) & (timestamp <= pl.lit(end).cast(dtype))
+
+    @staticmethod
+    def __compare(a: datetime, b: datetime) -> int:
+        """Compares two timestamps (timestamps without timezone are assumed to be in UTC)"""
+
+        a = a if a.tzinfo or not b.tzinfo else a.replace(tzinfo=b.tzinfo)
+        return (a > b) - (a < b)
@@ -4,9 +4,11 @@ __license__ = ""
 __maintainer__ = "jiahechu"
 __email__ = "jiahe.chu@tum.de"
 
+import pickle
+import threading
 import polars as pl
 import pytz
-from datetime import datetime
+from datetime import datetime, timedelta
 import inspect
 import ast
 from hamlet import constants as c
@@ -32,6 +34,8 @@ class Forecaster:
         length_to_predict: length to predict everytime when calling forecast. Unit: s
         start_ts: timestamp when simulation starts
         refit_period: period, after which models should be refitted. Unit: s
+        endogenous_ids: ids of the forecasts that depend on the results of the market clearing
+        lock: lock that guards the forecaster when forecasts are prefetched in a background thread
 
     Methods:
 
@@ -60,6 +64,11 @@ class Forecaster:
         self.length_to_predict = 0  # length to predict everytime when calling forecast
         self.start_ts = datetime.now()   # timestamp when simulation starts
         self.refit_period = 0   # period, after which models should be refitted
+        self.pending_fit = set()    # models that need to be fitted at the next forecast (e.g. after resuming)
+        self.prefetched = (None, {})    # forecasts computed ahead of time for a timestamp (see prefetch_forecasts)
+        self.endogenous_ids = set()     # forecasts that depend on the market results (e.g. local market prices)
+        # guards the forecaster as prefetches run in a background thread while the market results are updated
+        self.lock = threading.RLock()
 
     ########################################## PUBLIC METHODS ##########################################
 
@@ -90,14 +99,15 @@ class Forecaster:
             target: Boolean indicating if the updated data is a target variable.
 
         """
-        # new train data with new target
-        if target:
-            self.train_data[id][c.K_TARGET] = dataframe
-        else:
-            self.train_data[id][c.K_FEATURES] = dataframe
+        with self.lock:
+            # new train data with new target
+            if target:
+                self.train_data[id][c.K_TARGET] = dataframe
+            else:
+                self.train_data[id][c.K_FEATURES] = dataframe
 
-        # update model
-        self.used_models[id].update_train_data(self.train_data[id])
+            # update model
+            self.used_models[id].update_train_data(self.train_data[id])
 
     def make_all_forecasts(self, timetable):
         """
@@ -114,10 +124,19 @@ class Forecaster:
         forecasts = {}   # empty dict to store all forecast results
         current_ts = timetable.select(c.TC_TIMESTAMP).item(0, 0)      # get current timestep from timetable
 
-        # make forecast for each plant and assign results to the empty dict
-        for id in self.config_dict.keys():
-            forecast = self.__make_forecast_for_id(current_ts, id)
-            forecasts[id] = forecast
+        with self.lock:
+            # take the forecasts that were computed ahead of time for the current timestep
+            prefetched_ts, prefetched = self.prefetched
+            if prefetched_ts == current_ts:
+                forecasts.update(prefetched)
+            self.prefetched = (None, {})
+
+            # make forecast for each plant and assign results to the empty dict
+            for id in self.config_dict.keys():
+                if id in forecasts:
+                    continue
+                forecast = self.__make_forecast_for_id(current_ts, id)
+                forecasts[id] = forecast
 
         # summarize all forecasts to a dataframe (lazyframe)
         forecasts = self.__summarize_forecasts_to_df(forecasts, current_ts)
@@ -125,6 +144,86 @@ class Forecaster:
         # Return the forecasts dataframe (lazyframe)
         return forecasts
 
+    def get_exogenous_ids(self) -> list:
+        """
+        Get the ids of all forecasts that only depend on exogenous data (weather, timeseries, retailer).
+
+        The forecasts of the local markets depend on the results of the market clearing and are therefore excluded.
+
+        Returns:
+            ids: List of plant and market ids.
+
+        """
+        return [id for id in self.config_dict.keys() if id not in self.endogenous_ids]
+
+    def prefetch_forecasts(self, current_ts):
+        """
+        Make the forecasts that only depend on exogenous data for the given timestep ahead of time.
+
+        The forecasts are used by make_all_forecasts() if it is called for the same timestep. This allows to compute
+        them while the markets of the previous timestep are still cleared.
+
+        Args:
+            current_ts: Timestep for which the forecasts are made.
+
+        """
+        # the market results are not updated while the forecasts are made (see update_forecaster)
+        with self.lock:
+            forecasts = {id: self.__make_forecast_for_id(current_ts, id) for id in self.get_exogenous_ids()}
+
+            self.prefetched = (current_ts, forecasts)
+
+    def save_checkpoint(self, checkpoint, key):
+        """
+        Write the state of the forecaster to the checkpoint.
+
+        The target train data is written as table (only if it changed since the last checkpoint). The fitted models are
+        written without their train data. Models that cannot be pickled (e.g. keras models) are skipped and fitted
+        again after resuming.
+
+        Args:
+            checkpoint: Checkpoint object to write to.
+            key: key of the forecaster in the checkpoint.
+
+        """
+        # write target train data
+        for id in self.train_data.keys():
+            checkpoint.write_table(key=f'{key}/{id}', data=self.train_data[id][c.K_TARGET])
+
+        # write model states without train data
+        states = {}
+        for id, model in self.used_models.items():
+            state = {name: value for name, value in model.__dict__.items() if name != 'train_data'}
+            try:
+                states[id] = pickle.dumps(state)
+            except Exception:
+                continue
+        checkpoint.write_object(key=f'{key}/models', data=states)
+
+    def load_checkpoint(self, checkpoint, key):
+        """
+        Load the state of the forecaster from the checkpoint. The forecaster needs to be initialized before.
+
+        Args:
+            checkpoint: Checkpoint object to read from.
+            key: key of the forecaster in the checkpoint.
+
+        """
+        # load target train data
+        for id in self.train_data.keys():
+            target = checkpoint.read_table(key=f'{key}/{id}')
+            if target is not None:
+                self.train_data[id][c.K_TARGET] = target
+
+        # load model states and pass the loaded train data to the models
+        states = checkpoint.read_object(key=f'{key}/models') or {}
+        for id, model in self.used_models.items():
+            if id in states:
+                model.__dict__.update(pickle.loads(states[id]))
+            else:
+                self.pending_fit.add(id)
+            model.update_train_data(self.train_data[id])
+
     ########################################## PRIVATE METHODS ##########################################
 
     """relevant for initialization"""
@@ -166,6 +265,9 @@ class Forecaster:
             self.config_dict[wholesale_id] = market_config['wholesale']
             self.config_dict[local_id] = market_config['local']
 
+            # the local market prices are the results of the market clearing
+            self.endogenous_ids.add(local_id)
+
             # if no additional parameters given for the chosen model, assign an empty dict
             chosen_model_wholesale = market_config['wholesale']['method']
             chosen_model_local = market_config['local']['method']
@@ -356,7 +458,8 @@ class Forecaster:
         # refit model if needed
         offset = (current_ts - self.start_ts.replace(tzinfo=pytz.UTC)).seconds  # offset between current ts and start ts
         # check offset % refit period to see if the current time is exactly the beginning of a new refitting period
-        if offset % self.refit_period == 0:
+        if offset % self.refit_period == 0 or id in self.pending_fit:
+            self.pending_fit.discard(id)
             self.used_models[id].fit(current_ts=current_ts, length_to_predict=self.length_to_predict,
                                      **self.config_dict[id][chosen_model])
 
@@ -379,8 +482,9 @@ class Forecaster:
 
         """
 
-        # generate a column contains time index
-        timestamps = f.slice_dataframe_between_times(target_df=self.agentDB.timeseries, reference_ts=current_ts,
+        # generate a column contains time index (only the rows of the horizon are taken from the timeseries)
+        window = self.agentDB.get_window('timeseries', current_ts, current_ts + timedelta(seconds=self.length_to_predict))
+        timestamps = f.slice_dataframe_between_times(target_df=window, reference_ts=current_ts,
                                                      duration=self.length_to_predict).select(c.TC_TIMESTAMP)
         # add timestep column
         timestamps = timestamps.with_columns(pl.col(c.TC_TIMESTAMP).alias(c.TC_TIMESTEP))
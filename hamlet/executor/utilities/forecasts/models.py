@@ -11,18 +11,12 @@ import ast
 import polars as pl
 import pandas as pd
 import numpy as np
-from keras.layers import Input, Dense, LSTM, Conv1D, MaxPooling1D, Flatten, Dropout
-from keras.models import Model
-from sktime.forecasting.arima import ARIMA
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor
-import pvlib
-from pvlib.pvsystem import PVSystem
-from pvlib.location import Location
-from windpowerlib import ModelChain, WindTurbine
 from hamlet import constants as c
 from hamlet import functions as f
 
+# Note: The backends of the models (keras, sktime, sklearn, pvlib, windpowerlib) are imported by the models that use
+#   them. They take several seconds to import and are only needed if a model is selected in the config.
+
 
 def forecast_model(name):
     """Decorator to match model with the given name. All forecast models should use this decorator."""
@@ -229,6 +223,7 @@ class RandomForest(ModelBase):
     """Random forest regressor."""
     def __init__(self, train_data, **kwargs):
         super().__init__(train_data, **kwargs)
+        from sklearn.ensemble import RandomForestRegressor
         self.model = RandomForestRegressor()
 
     def fit(self, current_ts, days, **kwargs):
@@ -330,6 +325,9 @@ class CNNModel(ModelBase):
             features.remove(c.TC_TIMESTEP)
         features_number = len(features)
 
+        from keras.layers import Input, Dense, Conv1D, MaxPooling1D, Flatten
+        from keras.models import Model
+
         # define model
         inputs = Input(shape=(window_length, features_number))
         x = Conv1D(64, 3, activation='relu')(inputs)
@@ -365,6 +363,8 @@ class CNNModel(ModelBase):
             num_features).
             val_targets (numpy.ndarray): Target values corresponding to the validation sequences.
         """
+        from sklearn.model_selection import train_test_split
+
         # split train and test data
         X_train, X_test, y_train, y_test = train_test_split(X_train, y_train, test_size=0.2, shuffle=False)
 
@@ -532,6 +532,9 @@ class RNNModel(ModelBase):
             features.remove(c.TC_TIMESTEP)
         features_number = len(features)
 
+        from keras.layers import Input, Dense, LSTM, Dropout
+        from keras.models import Model
+
         # define model
         inputs = Input(shape=(window_length, features_number))
         x = LSTM(64, activation='relu')(inputs)
@@ -568,6 +571,8 @@ class RNNModel(ModelBase):
             num_features).
             val_targets (numpy.ndarray): Target values corresponding to the validation sequences.
         """
+        from sklearn.model_selection import train_test_split
+
         # split train and test data
         X_train, X_test, y_train, y_test = train_test_split(X_train, y_train, test_size=0.2, shuffle=False)
 
@@ -714,6 +719,8 @@ class ARIMAModel(ModelBase):
     def __init__(self, train_data, order, **kwargs):
         super().__init__(train_data, **kwargs)
         self.fit_ts = None
+        from sktime.forecasting.arima import ARIMA
+
         self.arima = ARIMA(order=ast.literal_eval(order))
         raise NotImplementedError('ARIMA model needs to be fixed!')
 
@@ -763,6 +770,10 @@ class WeatherModel(ModelBase):
 
     """
     def __pv_model(self, current_ts, length_to_predict):
+        import pvlib
+        from pvlib.pvsystem import PVSystem
+        from pvlib.location import Location
+
         # get pv orientation
         plant = self.train_data['plant_config']
         surface_tilt = plant['sizing']['orientation']
@@ -873,6 +884,8 @@ class WeatherModel(ModelBase):
         return pl.DataFrame(power).rename({'power': column_name})
 
     def __wind_model(self, current_ts, length_to_predict):
+        from windpowerlib import ModelChain, WindTurbine
+
         # get spec file
         specs = self.train_data['specs']
 
@@ -0,0 +1,164 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+# This file is in charge of finding the fastest parallelization setting at the beginning of the simulation
+
+# Imports
+import os
+import statistics
+import polars as pl
+
+# Setting without any pool (agents and markets are executed sequentially)
+SEQUENTIAL = 'sequential'
+
+
+class AutoTuner:
+    """
+    Tries several parallelization settings on the first timestamps of the simulation and selects the fastest one.
+
+    Each setting (backend and number of workers) is used for a number of consecutive timestamps. The first timestamps
+    of each trial are not measured as they contain the warm-up of the setting (e.g. starting the worker processes, first
+    fit of the forecasters). The setting with the lowest median wall time per timestamp is used for the rest of the
+    simulation.
+
+    Attributes:
+        candidates: list of settings (backend, number of workers) in the order they are tried.
+        steps: number of timestamps each setting is used for.
+        warmup: number of timestamps at the beginning of each trial that are not measured.
+        durations: dictionary with the settings as keys and the measured wall times per timestamp as values.
+
+    Example:
+        ```
+        tuner = AutoTuner(AutoTuner.default_candidates(max_workers=8, backends=['thread', 'process']))
+        for timestamp in timestamps:
+            backend, num_workers = tuner.setting()
+            ...
+            tuner.record(duration)
+        report = tuner.report()
+        ```
+
+    """
+
+    def __init__(self, candidates: list, steps: int = 4, warmup: int = 1):
+        """
+        Args:
+            candidates: list of settings (backend, number of workers) to try.
+            steps: number of timestamps each setting is used for.
+            warmup: number of timestamps at the beginning of each trial that are not measured.
+
+        """
+        if steps <= warmup:
+            raise ValueError(f'The number of steps ({steps}) needs to be larger than the warm-up ({warmup}).')
+
+        self.candidates = [tuple(candidate) for candidate in candidates]
+        self.steps = steps
+        self.warmup = warmup
+        self.durations = {candidate: [] for candidate in self.candidates}
+
+        # Index of the current trial and number of timestamps executed in it
+        self.__trial = 0
+        self.__counter = 0
+
+    @staticmethod
+    def default_candidates(max_workers: int = None, backends: list = None) -> list:
+        """
+        Returns the default settings: no pool and powers of two up to the maximum number of workers for each backend.
+
+        Args:
+            max_workers: maximum number of workers. Defaults to the number of logical processors - 1.
+            backends: backends to try. Defaults to thread and process.
+
+        Returns:
+            list: settings (backend, number of workers).
+
+        """
+        max_workers = max_workers if max_workers else max(1, os.cpu_count() - 1)
+        backends = backends if backends else ['thread', 'process']
+
+        sizes = []
+        size = 2
+        while size < max_workers:
+            sizes.append(size)
+            size *= 2
+        if max_workers > 1:
+            sizes.append(max_workers)
+
+        return [(SEQUENTIAL, 1)] + [(backend, size) for backend in backends for size in sizes]
+
+    @property
+    def done(self) -> bool:
+        """Returns True if all settings were tried"""
+        return self.__trial >= len(self.candidates)
+
+    def setting(self) -> tuple:
+        """Returns the setting (backend, number of workers) to use for the next timestamp"""
+
+        if self.done:
+            return self.best()
+
+        return self.candidates[self.__trial]
+
+    def record(self, duration: float):
+        """
+        Records the wall time of the timestamp that was executed with the current setting.
+
+        Args:
+            duration: wall time of the timestamp in seconds.
+
+        """
+        if self.done:
+            return
+
+        if self.__counter >= self.warmup:
+            self.durations[self.candidates[self.__trial]].append(duration)
+
+        self.__counter += 1
+        if self.__counter >= self.steps:
+            self.__trial += 1
+            self.__counter = 0
+
+    def best(self) -> tuple:
+        """Returns the setting with the lowest median wall time per timestamp"""
+
+        measured = {candidate: statistics.median(durations) for candidate, durations in self.durations.items()
+                    if durations}
+        if not measured:
+            return self.candidates[0]
+
+        return min(measured, key=measured.get)
+
+    def report(self) -> pl.DataFrame:
+        """
+        Returns the scaling report with the wall times of each setting.
+
+        The speedup and efficiency refer to the sequential setting (or the first setting if it was not measured).
+
+        Returns:
+            pl.DataFrame: one row per setting.
+
+        """
+        rows = []
+        for (backend, num_workers), durations in self.durations.items():
+            if not durations:
+                continue
+            rows.append({'backend': backend,
+                         'num_workers': num_workers,
+                         'timestamps': len(durations),
+                         'median': statistics.median(durations),
+                         'mean': statistics.mean(durations),
+                         'min': min(durations),
+                         'max': max(durations)})
+
+        if not rows:
+            return pl.DataFrame()
+
+        reference = rows[0]['median']
+        best = self.best()
+
+        return (pl.DataFrame(rows)
+                .with_columns([(reference / pl.col('median')).alias('speedup')])
+                .with_columns([(pl.col('speedup') / pl.col('num_workers')).alias('efficiency'),
+                               ((pl.col('backend') == best[0]) & (pl.col('num_workers') == best[1])).alias('selected')]))
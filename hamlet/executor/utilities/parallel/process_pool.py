@@ -0,0 +1,535 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+# This file is in charge of executing the agents in separate worker processes
+
+# Imports
+import os
+import sys
+import shutil
+import tempfile
+import traceback
+import threading
+import multiprocessing as mp
+from multiprocessing.connection import Listener, Client
+from datetime import datetime
+import polars as pl
+from hamlet import functions as f
+import hamlet.constants as c
+
+# Tables of the AgentDB that are changed by the agents and therefore sent back to the main process
+AGENT_TABLES = ['setpoints', 'socs', 'meters', 'bids_offers']
+FAST_FORWARD_TABLES = ['socs', 'meters']  # tables changed when fast-forwarding
+
+# Commands that can be sent to the workers
+CMD_SETUP = 'setup'
+CMD_STEP = 'step'
+CMD_CHECKPOINT = 'checkpoint'
+CMD_PREFETCH = 'prefetch'
+CMD_FAST_FORWARD = 'fast_forward'
+CMD_STOP = 'stop'
+
+# Status of the replies of the workers
+S_OK = 'ok'
+S_ERROR = 'error'
+
+# Environment variable that contains the authkey of worker nodes (not passed on the command line as it is visible to
+#   all local users there)
+ENV_AUTHKEY = 'HAMLET_AUTHKEY'
+
+
+class ProcessPool:
+    """
+    Pool of worker processes that execute the agents of the scenario.
+
+    The agents are sharded across the workers. Each worker loads and keeps its own AgentDB objects (including the
+    forecasters) for the whole simulation. At each timestamp only the timetable, the new market transactions and the
+    changed agent tables (see AGENT_TABLES) are exchanged with the main process as Arrow IPC buffers.
+
+    By default, the workers are local processes connected through pipes. If an address is given, the main process acts
+    as coordinator that listens on a TCP (host, port) or Unix socket address and the workers connect to it, either as
+    local processes started by the pool or as worker nodes started on other machines with
+    `python -m hamlet.executor.utilities.parallel.process_pool <address>` (see run_node()). The authkey is read from
+    the environment variable HAMLET_AUTHKEY or, if it is not set, from the standard input. Worker nodes need access to
+    the scenario folder under the same path (e.g. a shared file system).
+
+    Attributes:
+        num_workers: number of worker processes.
+        path_scenario: path to the scenario folder the workers load their data from.
+        structure: scenario structure (region names and their paths).
+        shards: list containing one dictionary per worker that maps the regions to the agents of the worker.
+        address: address the coordinator listens on (None if the workers are connected through pipes).
+
+    """
+
+    def __init__(self, num_workers: int, path_scenario: str, structure: dict, agents: dict,
+                 path_checkpoint: str = None, passive: bool = False, address: str | tuple = None,
+                 authkey: bytes | str = None, spawn: bool = True, shard_by: str = 'agents', seed: int = None,
+                 memory_map: bool = False):
+        """
+        Args:
+            num_workers: number of worker processes.
+            path_scenario: path to the scenario folder.
+            structure: scenario structure (region names and their paths).
+            agents: dictionary with region names as keys and dictionaries {agent_type: [agent_ids]} as values.
+            path_checkpoint: path to a checkpoint the workers load their agent data from (when resuming).
+            passive: if True, agents without flexibility use the passive controller (see Agent).
+            address: if given, the workers connect to the coordinator through a socket instead of pipes. Either a
+                'host:port' string or (host, port) tuple for TCP or a file path for a Unix socket. 'unix' creates a
+                Unix socket in a temporary folder.
+            authkey: key to authenticate the workers (required if the workers are not spawned by the pool).
+            spawn: if True, the workers are started as local processes. Otherwise, the pool waits for num_workers
+                worker nodes to connect to the address.
+            shard_by: distribution of the agents across the workers. Options:
+                - agents: the agents of each region are distributed evenly across the workers.
+                - regions: each region is assigned completely to one worker.
+            seed: if given, the random number generators of each worker are seeded with the seed plus the index of
+                the worker.
+            memory_map: if True, the workers memory-map the agent tables that do not change (see
+                AgentDB.register_agent()).
+
+        """
+        self.num_workers = num_workers
+        self.path_scenario = path_scenario
+        self.structure = structure
+
+        # Distribute the agents across the workers
+        self.shards = self.create_shards(agents, num_workers, by=shard_by)
+
+        # Number of rows of each market's transactions that have already been sent to the workers
+        self.__synced = {}
+
+        # Workers that were asked to prefetch forecasts and whose reply was not yet received
+        self.__prefetching = set()
+
+        # Each worker can only process one command at a time. The lock ensures that regions that are executed
+        # concurrently (see Executor parallel_regions) do not interleave their messages.
+        self.__lock = threading.Lock()
+
+        # Start the workers
+        # Note: 'spawn' is used as forking a process that already runs polars' thread pool can lead to deadlocks
+        context = mp.get_context('spawn')
+        self.__connections = []
+        self.__processes = []
+        self.address = None
+        self.__tmpdir = None  # temporary folder of the Unix socket (removed in self.shutdown())
+        if address is None:
+            for _ in range(num_workers):
+                parent_conn, child_conn = context.Pipe()
+                process = context.Process(target=worker_loop, args=(child_conn,), daemon=True)
+                process.start()
+                self.__connections.append(parent_conn)
+                self.__processes.append(process)
+        else:
+            if authkey is None:
+                if not spawn:
+                    raise ValueError('An authkey is required for worker nodes that are not spawned by the pool.')
+                authkey = os.urandom(16)
+            authkey = authkey.encode() if isinstance(authkey, str) else authkey
+
+            # Listen for the workers and start them locally if requested
+            self.address = parse_address(address)
+            if address == 'unix':
+                self.__tmpdir = os.path.dirname(self.address)
+            with Listener(self.address, authkey=authkey) as listener:
+                self.address = listener.address
+                if spawn:
+                    for _ in range(num_workers):
+                        process = context.Process(target=run_node, args=(self.address, authkey), daemon=True)
+                        process.start()
+                        self.__processes.append(process)
+                for _ in range(num_workers):
+                    self.__connections.append(listener.accept())
+
+        # Set up the workers (loading of the data happens in parallel)
+        self.__broadcast([(CMD_SETUP, {'path_scenario': path_scenario, 'structure': structure, 'shard': shard,
+                                       'checkpoint': path_checkpoint, 'passive': passive, 'memory_map': memory_map,
+                                       'seed': None if seed is None else seed + idx})
+                          for idx, shard in enumerate(self.shards)])
+
+    def execute(self, tasklist: pl.DataFrame, markets: dict, prune_before: datetime = None) -> list:
+        """
+        Executes the agents of the region of the tasklist in the workers.
+
+        Args:
+            tasklist: part of the timetable for the current timestamp and region.
+            markets: market data of the region as returned by Database.get_market_data(region).
+            prune_before: if given, the workers remove the rows before this timestamp from their tables (see
+                Database.prune_region()) so that they stay in sync with the main process.
+
+        Returns:
+            list: tuples (agent_type, agent_id, {table name: polars DataFrame}) that can be posted to the database.
+
+        """
+        region = tasklist.select(pl.first(c.TC_REGION)).item()
+
+        with self.__lock:
+            return self.__execute(region=region, tasklist=tasklist, markets=markets, prune_before=prune_before)
+
+    def fast_forward(self, region: str, start: datetime, end: datetime) -> list:
+        """
+        Fast-forwards the agents of the region in the workers through a stretch without market clearing (see
+        FastForward.advance()).
+
+        Args:
+            region: name of the region.
+            start: first timestamp of the stretch.
+            end: first timestamp after the stretch.
+
+        Returns:
+            list: tuples (agent_type, agent_id, {table name: polars DataFrame}) that can be posted to the database.
+
+        """
+        with self.__lock:
+            workers = [idx for idx, shard in enumerate(self.shards) if shard.get(region)]
+            replies = self.__broadcast([(CMD_FAST_FORWARD, {'region': region, 'start': start, 'end': end})]
+                                       * len(workers), workers=workers)
+
+        return [(agent_type, agent_id, {name: f.ipc_to_df(table) for name, table in tables.items()})
+                for reply in replies for agent_type, agent_id, tables in reply]
+
+    def prefetch(self, region: str, timestamp: datetime):
+        """
+        Lets the workers make the forecasts of their agents of the region that only depend on exogenous data for the
+        given timestamp in the background (see Forecaster.prefetch_forecasts()).
+
+        The method returns immediately. The replies are received before the next command is sent to the workers.
+
+        Args:
+            region: name of the region.
+            timestamp: timestamp the agents of the region are executed at next.
+
+        """
+        with self.__lock:
+            for idx, shard in enumerate(self.shards):
+                if not shard.get(region):
+                    continue
+                self.__receive_prefetch(idx)
+                self.__connections[idx].send((CMD_PREFETCH, {'region': region, 'timestamp': timestamp}))
+                self.__prefetching.add(idx)
+
+    def mark_synced(self, region: str, markets: dict):
+        """
+        Marks all current market transactions of the region as sent to the workers.
+
+        Needs to be called after the market tables of the main process were pruned (the workers prune their tables
+        themselves), as the transactions are tracked by their number of rows.
+
+        Args:
+            region: name of the region.
+            markets: market data of the region as returned by Database.get_market_data(region).
+
+        """
+        with self.__lock:
+            for market_type, market_names in markets.items():
+                for market_name, market_db in market_names.items():
+                    self.__synced[(region, market_type, market_name)] = len(market_db.history[c.TN_MARKET_TRANSACTIONS])
+
+    def __execute(self, region: str, tasklist: pl.DataFrame, markets: dict, prune_before: datetime = None) -> list:
+        """Sends the step command to the workers (see execute())"""
+
+        # Get the market transactions that were not yet sent to the workers
+        transactions = {}
+        for market_type, market_names in markets.items():
+            for market_name, market_db in market_names.items():
+                key = (region, market_type, market_name)
+                history = market_db.history[c.TN_MARKET_TRANSACTIONS]
+                new_transactions = history.slice(self.__synced.get(key, 0))
+                if len(new_transactions) > 0:
+                    transactions[(market_type, market_name)] = f.df_to_ipc(new_transactions)
+                self.__synced[key] = len(history)
+
+        # Execute the agents in the workers
+        payload = {'region': region, 'tasklist': f.df_to_ipc(tasklist), 'transactions': transactions,
+                   'prune_before': prune_before}
+        # Note: Only the workers that have agents in the region are involved
+        workers = [idx for idx, shard in enumerate(self.shards) if shard.get(region)]
+        replies = self.__broadcast([(CMD_STEP, payload)] * len(workers), workers=workers)
+
+        # Deserialize the agent tables
+        results = []
+        for reply in replies:
+            for agent_type, agent_id, tables in reply:
+                results.append((agent_type, agent_id, {name: f.ipc_to_df(table) for name, table in tables.items()}))
+
+        return results
+
+    def checkpoint(self, path: str, version: int) -> dict:
+        """
+        Writes the states of the forecasters of the agents in the workers to the checkpoint.
+
+        The forecasters only exist in the workers. All other agent tables are synchronized with the main process and
+        are written there.
+
+        Args:
+            path: path to the checkpoint folder.
+            version: version of the checkpoint that is currently written.
+
+        Returns:
+            dict: keys and files that were written by the workers (to be added to the manifest).
+
+        """
+        with self.__lock:
+            replies = self.__broadcast([(CMD_CHECKPOINT, {'path': path, 'version': version})] * self.num_workers)
+
+        files = {}
+        for reply in replies:
+            files.update(reply)
+
+        return files
+
+    def shutdown(self):
+        """Stops all workers and waits for them to finish"""
+
+        for idx in list(self.__prefetching):
+            self.__receive_prefetch(idx)
+
+        for conn in self.__connections:
+            conn.send((CMD_STOP, None))
+            conn.close()
+
+        for process in self.__processes:
+            process.join()
+
+        if self.__tmpdir:
+            shutil.rmtree(self.__tmpdir, ignore_errors=True)
+            self.__tmpdir = None
+
+    @staticmethod
+    def create_shards(agents: dict, num_shards: int, by: str = 'agents') -> list:
+        """
+        Distributes the agents round-robin across the given number of shards.
+
+        Args:
+            agents: dictionary with region names as keys and dictionaries {agent_type: [agent_ids]} as values.
+            num_shards: number of shards.
+            by: 'agents' to distribute the agents of each region across all shards, 'regions' to assign each region
+                completely to one shard.
+
+        Returns:
+            list: one dictionary {region: {agent_type: [agent_ids]}} per shard.
+
+        """
+        if by not in ['agents', 'regions']:
+            raise ValueError(f'Sharding "{by}" not available. Available options are: agents, regions.')
+
+        shards = [{region: {} for region in agents} for _ in range(num_shards)]
+
+        counter = 0
+        for region, agent_types in agents.items():
+            for agent_type, agent_ids in agent_types.items():
+                for agent_id in agent_ids:
+                    shards[counter % num_shards][region].setdefault(agent_type, []).append(agent_id)
+                    if by == 'agents':
+                        counter += 1
+            if by == 'agents':
+                counter = 0
+            else:
+                counter += 1
+
+        return shards
+
+    def __receive_prefetch(self, idx: int):
+        """Receives the reply of a pending prefetch of the worker"""
+
+        if idx not in self.__prefetching:
+            return
+
+        self.__prefetching.discard(idx)
+        status, reply = self.__connections[idx].recv()
+        if status == S_ERROR:
+            raise RuntimeError(f'An error occurred in the agent worker processes:\n{reply}')
+
+    def __broadcast(self, messages: list, workers: list = None) -> list:
+        """Sends one message to each worker and collects the replies (in the order of the workers)
+
+        Args:
+            messages: one message per worker.
+            workers: indices of the workers the messages are sent to (all workers if None).
+
+        """
+        workers = list(range(len(self.__connections))) if workers is None else workers
+        connections = [self.__connections[idx] for idx in workers]
+
+        # Receive the replies of the pending prefetches first
+        for idx in workers:
+            self.__receive_prefetch(idx)
+
+        # Send all messages first so that the workers run concurrently
+        for conn, message in zip(connections, messages):
+            conn.send(message)
+
+        # Collect the replies
+        replies = []
+        errors = []
+        for conn in connections:
+            status, reply = conn.recv()
+            if status == S_ERROR:
+                errors.append(reply)
+            else:
+                replies.append(reply)
+
+        if errors:
+            raise RuntimeError(f'An error occurred in the agent worker processes:\n' + '\n'.join(errors))
+
+        return replies
+
+
+def worker_loop(conn):
+    """
+    Main loop of a worker process.
+
+    The worker waits for commands from the main process, executes them and sends back the reply. The loop ends when
+    the stop command is received or the connection is closed.
+
+    Args:
+        conn: connection to the main process.
+
+    """
+    # Imported here as the worker processes are spawned and need to set up their own environment
+    from hamlet.executor.utilities.database.database import Database
+    from hamlet.executor.agents.agent import Agent
+    from hamlet.executor.utilities.database.checkpoint import Checkpoint
+    from hamlet.executor.utilities.fast_forward.fast_forward import FastForward
+    pl.enable_string_cache(True)
+
+    database = None
+    checkpoint = None
+    shard = {}
+    agents = {}  # persistent agent instances of the shard (per region)
+
+    while True:
+        try:
+            command, payload = conn.recv()
+        except EOFError:
+            break
+
+        if command == CMD_STOP:
+            break
+
+        try:
+            if command == CMD_SETUP:
+                if payload['seed'] is not None:
+                    f.set_seed(payload['seed'])
+
+                # Load only the agents of this worker's shard
+                shard = payload['shard']
+                selection = {region: [agent_id for ids in types.values() for agent_id in ids]
+                             for region, types in shard.items()}
+                database = Database(payload['path_scenario'])
+                database.setup_database(payload['structure'], agents=selection, memory_map=payload['memory_map'])
+
+                # Load the agent data from the checkpoint when resuming
+                # Note: The market tables are not loaded as all transactions are sent again with the first step
+                if payload['checkpoint']:
+                    database.load_checkpoint(Checkpoint(payload['checkpoint']), markets=False)
+
+                # Create the agent instances that are kept for the entire simulation
+                agents = {}
+                for region, agent_types in shard.items():
+                    agents[region] = []
+                    for agent_type, agent_ids in agent_types.items():
+                        data = database.get_agent_data(region=region, agent_type=agent_type)
+                        agents[region] += [(agent_type, agent_id, Agent(agent_type=agent_type, data=data[agent_id],
+                                                                        database=database, passive=payload['passive']))
+                                           for agent_id in agent_ids]
+                reply = None
+
+            elif command == CMD_STEP:
+                region = payload['region']
+                tasklist = f.ipc_to_df(payload['tasklist'])
+
+                # Update the markets with the transactions of the previous market executions
+                if payload['transactions']:
+                    database.append_market_transactions(
+                        region=region,
+                        transactions={key: f.ipc_to_df(table) for key, table in payload['transactions'].items()})
+
+                # Remove the rows that the main process removed as well (streaming results)
+                if payload['prune_before'] is not None:
+                    database.prune_region(region=region, before=payload['prune_before'])
+
+                # Execute the agents of the shard and collect the changed tables
+                reply = []
+                for agent_type, agent_id, agent in agents.get(region, []):
+                    agent_db = agent.step(tasklist)
+                    tables = {name: f.df_to_ipc(getattr(agent_db, name)) for name in AGENT_TABLES}
+                    reply.append((agent_type, agent_id, tables))
+
+            elif command == CMD_FAST_FORWARD:
+                # Advance the meters and socs of the agents of the shard through the stretch
+                reply = []
+                for agent_type, agent_id, agent in agents.get(payload['region'], []):
+                    agent_db = FastForward.advance(database.get_agent_data(payload['region'], agent_type, agent_id),
+                                                   start=payload['start'], end=payload['end'])
+                    reply.append((agent_type, agent_id, {name: f.df_to_ipc(getattr(agent_db, name))
+                                                         for name in FAST_FORWARD_TABLES}))
+
+            elif command == CMD_PREFETCH:
+                # Make the exogenous forecasts of the next timestamp while the main process clears the markets
+                for agent_type, agent_id, agent in agents.get(payload['region'], []):
+                    agent.prefetch_forecasts(payload['timestamp'])
+                reply = None
+
+            elif command == CMD_CHECKPOINT:
+                # Write the forecasters of the shard (the files are added to the manifest by the main process)
+                if checkpoint is None or checkpoint.path != payload['path']:
+                    checkpoint = Checkpoint(payload['path'])
+                checkpoint.begin(version=payload['version'])
+                database.save_checkpoint(checkpoint, agents=False, markets=False, forecasters=True)
+                reply = checkpoint.files
+
+            else:
+                raise ValueError(f'Unknown command: {command}')
+
+            conn.send((S_OK, reply))
+        except Exception:
+            conn.send((S_ERROR, traceback.format_exc()))
+
+    conn.close()
+
+
+def parse_address(address: str | tuple) -> str | tuple:
+    """
+    Converts the address of the coordinator to the format of multiprocessing.connection.
+
+    Args:
+        address: 'host:port' string or (host, port) tuple for TCP, a file path for a Unix socket or 'unix' for a Unix
+            socket in a temporary folder.
+
+    Returns:
+        str | tuple: (host, port) tuple for TCP or the path of the Unix socket.
+
+    """
+    if isinstance(address, tuple):
+        return address[0], int(address[1])
+    if address == 'unix':
+        return os.path.join(tempfile.mkdtemp(prefix='hamlet_'), 'coordinator.sock')
+    if os.sep in address or address.endswith('.sock'):
+        return address
+    host, port = address.rsplit(':', 1)
+
+    return host, int(port)
+
+
+def run_node(address: str | tuple, authkey: bytes | str):
+    """
+    Connects a worker to the coordinator and runs the worker loop until the coordinator stops it.
+
+    Args:
+        address: address of the coordinator (see parse_address()).
+        authkey: key to authenticate the worker.
+
+    """
+    authkey = authkey.encode() if isinstance(authkey, str) else authkey
+
+    worker_loop(Client(parse_address(address), authkey=authkey))
+
+
+if __name__ == '__main__':
+    # Start a worker node: HAMLET_AUTHKEY=<authkey> python -m hamlet.executor.utilities.parallel.process_pool <address>
+    # Note: Without the environment variable, the authkey is read from the first line of the standard input
+    run_node(address=sys.argv[1], authkey=os.environ.get(ENV_AUTHKEY) or sys.stdin.readline().strip())
@@ -0,0 +1,178 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+# This file is in charge of scheduling the execution of real-time simulations (rts)
+
+# Imports
+import time
+import asyncio
+import warnings
+import concurrent.futures
+from typing import Callable
+from datetime import datetime, timedelta, timezone
+import polars as pl
+
+
+class Phase:
+    """
+    Part of the work of a timestamp that is executed by the scheduler.
+
+    Attributes:
+        name: name of the phase (used for the budgets and metrics).
+        func: function that is called with the timestamp.
+        at_deadline: if True, the phase waits for the timestamp itself (e.g. market clearing). Otherwise, it starts
+            ahead of the timestamp (e.g. forecasting, controllers and bidding of the agents).
+
+    """
+
+    def __init__(self, name: str, func: Callable, at_deadline: bool = False):
+        self.name = name
+        self.func = func
+        self.at_deadline = at_deadline
+
+
+class RealTimeScheduler:
+    """
+    Executes the timestamps of a simulation against the wall clock using asyncio.
+
+    The work of a timestamp is split into phases. The phases that prepare the timestamp start a configurable lead time
+    ahead of the wall-clock deadline (the timestamp itself), the remaining phases start at the deadline. The phases
+    depend on each other (e.g. the markets need the bids of the agents) and are therefore executed strictly one after
+    another in a single worker thread; the scheduler does not add any concurrency. The event loop only waits for the
+    start times and watches the budget of the running phase, so that a budget miss is reported when it happens and not
+    only after the phase completed.
+
+    Each phase has an optional time budget. A phase that exceeds its budget is not cancelled (the state of the
+    simulation would be inconsistent otherwise) but recorded as a miss. If the simulation falls behind, the next phases
+    start immediately to catch up instead of waiting. All timings are collected as metrics.
+
+    Attributes:
+        lead: time ahead of the deadline at which the preparing phases start.
+        budgets: dictionary with the phase names as keys and their time budgets as values.
+        shift_to_now: if True, the timestamps are shifted so that the first timestamp is reached after the lead time
+            (used to replay scenarios of the past in real time).
+        metrics: list of dictionaries with the timings of each phase of each timestamp.
+
+    Example:
+        ```
+        scheduler = RealTimeScheduler(lead=20, budgets={'agents': 15, 'markets': 5})
+        scheduler.run(timestamps, phases=[Phase('agents', execute_agents),
+                                          Phase('markets', execute_markets, at_deadline=True)])
+        metrics = scheduler.get_metrics()  # one row per timestamp and phase
+        ```
+
+    """
+
+    def __init__(self, lead: float | timedelta = 0, budgets: dict = None, shift_to_now: bool = False):
+        """
+        Args:
+            lead: time ahead of the deadline at which the preparing phases start (in seconds or as timedelta).
+            budgets: time budgets of the phases (in seconds or as timedelta). Phases without budget are not checked.
+            shift_to_now: if True, the timestamps are shifted so that the first timestamp is reached after the lead
+                time.
+
+        """
+        self.lead = lead if isinstance(lead, timedelta) else timedelta(seconds=lead)
+        self.budgets = {phase: budget.total_seconds() if isinstance(budget, timedelta) else budget
+                        for phase, budget in (budgets or {}).items()}
+        self.shift_to_now = shift_to_now
+        self.metrics = []
+
+        # Offset between the timestamps of the simulation and the wall clock
+        self.__offset = timedelta(0)
+
+    def run(self, timestamps: list, phases: list, callback: Callable = None):
+        """
+        Executes the phases for all timestamps.
+
+        Args:
+            timestamps: timestamps of the simulation in ascending order.
+            phases: list of Phase objects in the order of their execution.
+            callback: function that is called with the timestamp after all phases of the timestamp completed (e.g. to
+                write checkpoints or update the progress bar).
+
+        """
+        asyncio.run(self.__run(timestamps, phases, callback))
+
+    def get_metrics(self) -> pl.DataFrame:
+        """Returns the metrics of all executed phases as dataframe"""
+
+        return pl.DataFrame(self.metrics)
+
+    async def __run(self, timestamps: list, phases: list, callback: Callable = None):
+        """Executes the phases for all timestamps"""
+
+        if not timestamps:
+            return
+
+        if self.shift_to_now:
+            self.__offset = self.__now() + self.lead - self.__aware(timestamps[0])
+
+        # The phases are executed one after another in the same thread (they depend on each other)
+        loop = asyncio.get_running_loop()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            for timestamp in timestamps:
+                deadline = self.__aware(timestamp) + self.__offset
+
+                for phase in phases:
+                    # Wait until the phase is due (starts immediately if the simulation is behind)
+                    start = deadline if phase.at_deadline else deadline - self.lead
+                    await self.__sleep_until(start)
+
+                    await self.__run_phase(loop, executor, phase, timestamp, start, deadline)
+
+                if callback:
+                    callback(timestamp)
+
+    async def __run_phase(self, loop: asyncio.AbstractEventLoop, executor: concurrent.futures.Executor, phase: Phase,
+                          timestamp: datetime, start: datetime, deadline: datetime):
+        """Executes one phase and records its timings"""
+
+        budget = self.budgets.get(phase.name)
+        started = self.__now()
+        counter = time.perf_counter()
+
+        future = loop.run_in_executor(executor, phase.func, timestamp)
+        over_budget = False
+        try:
+            # Shield the phase so that it continues to run after its budget is exceeded
+            await asyncio.wait_for(asyncio.shield(future), timeout=budget)
+        except asyncio.TimeoutError:
+            over_budget = True
+            warnings.warn(f'Phase "{phase.name}" of timestamp {timestamp} exceeded its budget of {budget} s.')
+            await future
+
+        duration = time.perf_counter() - counter
+        finished = self.__now()
+
+        self.metrics.append({
+            'timestamp': timestamp,
+            'phase': phase.name,
+            'start_delay': (started - start).total_seconds(),  # late start of the phase
+            'duration': duration,
+            'budget': budget,
+            'budget_missed': over_budget,
+            # Time between the end of a preparing phase and the deadline (negative if it ended after the deadline)
+            'deadline_slack': None if phase.at_deadline else (deadline - finished).total_seconds(),
+            'deadline_missed': not phase.at_deadline and finished > deadline,
+        })
+
+    async def __sleep_until(self, target: datetime):
+        """Waits without blocking the event loop until the target time is reached"""
+
+        delay = (target - self.__now()).total_seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def __now() -> datetime:
+        """Returns the current time with timezone information"""
+        return datetime.now(tz=timezone.utc)
+
+    @staticmethod
+    def __aware(timestamp: datetime) -> datetime:
+        """Returns the timestamp with timezone information (timestamps without are assumed to be in UTC)"""
+        return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
@@ -0,0 +1,108 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+# This file contains the index of the timetable that is used to iterate over the tasks of the simulation
+
+# Imports
+import polars as pl
+import hamlet.constants as c
+
+# Temporary column name for the row numbers
+ROW_NR = 'row_nr'
+
+
+class TimetableIndex:
+    """
+    Index of the timetable with the row offsets of each (timestamp, region, market, name) group.
+
+    The index is built once. The timetable is sorted by the index columns (keeping the original order of the rows within
+    a group), so that each group is a contiguous block of rows. The tasklists are then handed out lazily as zero-copy
+    slices of the sorted timetable instead of materializing all partitions up front.
+
+    Attributes:
+        timetable: the timetable sorted by the index columns.
+        columns: the columns of the index in hierarchical order.
+        timestamps: list of all timestamps of the timetable in ascending order.
+
+    Example:
+        ```
+        index = TimetableIndex(timetable)
+        for timestamp in index.timestamps:
+            for region in index.keys(timestamp):
+                tasklist = index.get(timestamp, region)
+        ```
+
+    """
+
+    def __init__(self, timetable: pl.DataFrame):
+        """
+        Args:
+            timetable: timetable of the scenario.
+
+        """
+        self.columns = [c.TC_TIMESTAMP, c.TC_REGION, c.TC_MARKET, c.TC_NAME]
+
+        # Sort the timetable so that the groups are contiguous (the row number keeps the original order in the groups)
+        self.timetable = (timetable.with_row_count(ROW_NR)
+                          .sort(self.columns + [ROW_NR])
+                          .drop(ROW_NR))
+
+        # Offsets and lengths of each group as well as the keys of the next level of each group
+        self.__offsets = {}
+        self.__children = {(): []}
+
+        indexed = self.timetable.select(self.columns).with_row_count(ROW_NR)
+        for depth in range(1, len(self.columns) + 1):
+            groups = (indexed.groupby(self.columns[:depth], maintain_order=True)
+                      .agg([pl.first(ROW_NR).alias('offset'), pl.count().alias('length')]))
+
+            for row in groups.iter_rows():
+                key, (offset, length) = row[:depth], row[depth:]
+                self.__offsets[key] = (offset, length)
+                self.__children.setdefault(key[:-1], []).append(key[-1])
+
+        self.timestamps = self.__children[()]
+
+    def __len__(self) -> int:
+        """Returns the number of timestamps"""
+        return len(self.timestamps)
+
+    def __iter__(self):
+        """Iterates over the timestamps and their tasklists"""
+        for timestamp in self.timestamps:
+            yield timestamp, self.get(timestamp)
+
+    def get(self, *key) -> pl.DataFrame:
+        """
+        Returns the tasklist of the given group as a zero-copy slice of the timetable.
+
+        Args:
+            *key: values of the index columns in hierarchical order, e.g. (timestamp, region). The key can be shortened
+                from the right to get all tasks of the higher level.
+
+        Returns:
+            pl.DataFrame: tasks of the group.
+
+        """
+        if not key:
+            return self.timetable
+
+        offset, length = self.__offsets[key]
+
+        return self.timetable.slice(offset, length)
+
+    def keys(self, *key) -> list:
+        """
+        Returns the values of the next index level within the given group.
+
+        Args:
+            *key: values of the index columns in hierarchical order, e.g. keys(timestamp) returns the regions.
+
+        Returns:
+            list: values of the next index level in ascending order.
+
+        """
+        return self.__children.get(key, [])
@@ -44,7 +44,6 @@ class TradingBase:
         self.market_data = kwargs['market_data']
         self.market_name = self.market_data.market_name
         self.market_type = self.market_data.market_type
-        self.market_transactions = self.market_data.market_transactions
 
         # Get the agent data, id
         self.agent = kwargs['agent']
@@ -62,12 +61,13 @@ class TradingBase:
         self.bids_offers = pl.DataFrame(schema=c.TS_BIDS_OFFERS)
 
         # Get the market transactions for the given market and agent for the given time horizon
+        # Note: The rows of the timesteps of the horizon are taken from the index of the transactions
+        first, last = self.timetable.select(pl.first(c.TC_TIMESTEP), pl.last(c.TC_TIMESTEP)).row(0)
+        self.market_transactions = self.market_data.get_history(c.TN_MARKET_TRANSACTIONS, start=first, end=last,
+                                                                column=c.TC_ID_AGENT, value=self.agent_id)
         self.market_transactions = self.market_transactions.filter((pl.col(c.TC_MARKET) == self.market_type)
                                                                    & (pl.col(c.TC_NAME) == self.market_name)
                                                                    & (pl.col(c.TC_TYPE_TRANSACTION) == c.TT_MARKET)
-                                                                   & (pl.col(c.TC_ID_AGENT) == self.agent_id)
-                                                                   & (pl.col(c.TC_TIMESTEP) >= self.timetable.select(pl.first(c.TC_TIMESTEP)))
-                                                                   & (pl.col(c.TC_TIMESTEP) <= self.timetable.select(pl.last(c.TC_TIMESTEP)))
                                                                    )
         # Group the market data by the timestep      
         self.market_transactions = self.market_transactions.groupby(c.TC_TIMESTEP).agg(pl.col(c.TC_ENERGY_IN, c.TC_ENERGY_OUT).sum())
@@ -1 +1 @@
-__author__ = "MarkusDoepfert"__credits__ = ""__license__ = ""__maintainer__ = "MarkusDoepfert"__email__ = "markus.doepfert@tum.de"# This file is in charge of the trading strategy for the markets# Importsimport osimport pandas as pdimport polars as plimport numpy as npimport timeimport loggingimport tracebackfrom datetime import datetimefrom hamlet.executor.utilities.forecasts.forecaster import Forecasterfrom hamlet.executor.utilities.controller.controller import Controllerfrom hamlet.executor.utilities.database.database import Databasefrom hamlet.executor.utilities.trading.strategies import *from hamlet import constants as cfrom pprint import pprintclass Trading:    def __init__(self, strategy: str, **kwargs):        self.kwargs = kwargs        # Mapping of controller types to classes        strategies = {            'linear': Linear,            'zi': Zi,        }        # Lookup the class based on the controller_type        self.strategy = strategies.get(strategy.lower())        if self.strategy is None:            raise ValueError(f'Trading strategy {strategy} not available. \n'                             f'The available methods are: {strategies.keys()}. \n'                             f'If you think this is an error, you might have forgotten to import the method to the '                             f'class or named it incorrectly.')    def create_instance(self):        return self.strategy(**self.kwargs)
\ No newline at end of file
+__author__ = "MarkusDoepfert"__credits__ = ""__license__ = ""__maintainer__ = "MarkusDoepfert"__email__ = "markus.doepfert@tum.de"# This file is in charge of the trading strategy for the markets# Importsimport osimport pandas as pdimport polars as plimport numpy as npimport timeimport loggingimport tracebackfrom datetime import datetimefrom hamlet.executor.utilities.forecasts.forecaster import Forecasterfrom hamlet.executor.utilities.controller.controller import Controllerfrom hamlet.executor.utilities.database.database import Databasefrom hamlet.executor.utilities.trading.strategies import *from hamlet import constants as cfrom pprint import pprintclass Trading:    def __init__(self, strategy: str, **kwargs):        self.kwargs = kwargs        # Mapping of controller types to classes        strategies = {            'linear': Linear,            'zi': Zi,        }        # Lookup the class based on the controller_type        self.strategy = strategies.get(strategy.lower())        if self.strategy is None:            raise ValueError(f'Trading strategy {strategy} not available. \n'                             f'The available methods are: {strategies.keys()}. \n'                             f'If you think this is an error, you might have forgotten to import the method to the '                             f'class or named it incorrectly.')    def create_instance(self, **kwargs):        # Additional keyword arguments (e.g. the timetable of the current timestamp) complement the ones given at        # initialization so that the strategy lookup only needs to be done once        return self.strategy(**{**self.kwargs, **kwargs})
\ No newline at end of file
@@ -1,7 +1,12 @@
+import io
 import os
 import shutil
+import hashlib
+import tempfile
 import time
 import json
+import random
+import numpy as np
 import pandas as pd
 import polars as pl
 from ruamel.yaml import YAML
@@ -10,6 +15,9 @@ import hamlet.constants as c
 
 # Contains all functions that are shared among the classes and used universally
 
+# Seed of the simulation (see set_seed())
+_seed = None
+
 
 def create_folder(path: str, delete: bool = True) -> None:
     """Creates a folder at the given path
@@ -67,6 +75,37 @@ def copy_folder(src: str, dst: str, only_files: bool = False, delete: bool = Tru
         time.sleep(0.01)
 
 
+def link_folder(src: str, dst: str, delete: bool = True) -> None:
+    """Mirrors a folder to another location using hard links instead of copies
+
+    The folder structure is recreated and every file is hard-linked, which takes no additional disk space and is much
+    faster than copying. Files are copied if they cannot be linked (e.g. if src and dst are on different file systems).
+    save_file() removes the link before writing to a linked file so that the source file is never modified.
+
+    Args:
+        src: path to the folder to link
+        dst: path to the linked folder
+        delete: if True, the folder will be deleted if it already exists
+
+    Returns:
+        None
+    """
+
+    if os.path.exists(dst):
+        if not delete:
+            return
+        shutil.rmtree(dst)
+
+    for root, _, files in os.walk(src):
+        folder = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(folder, exist_ok=True)
+        for file in files:
+            try:
+                os.link(os.path.join(root, file), os.path.join(folder, file))
+            except OSError:
+                shutil.copy2(os.path.join(root, file), os.path.join(folder, file))
+
+
 def load_file(path: str, index: int = 0, df: str = 'pandas', parse_dates: bool | list | None = None,
               method: str = 'lazy') -> object:
     # Find the file type
@@ -106,6 +145,18 @@ def load_file(path: str, index: int = 0, df: str = 'pandas', parse_dates: bool |
                 # Workaround for polars bug
                 with pl.StringCache():
                     file = pl.read_ipc(path, memory_map=False)
+            elif method == 'mmap':
+                file = map_ipc(path)
+        else:
+            raise ValueError(f'Dataframe type "{df}" not supported')
+    elif file_type == 'arrows':
+        # Arrow IPC stream files (e.g. streamed results) can only be read eagerly
+        if df == 'pandas':
+            file = pl.read_ipc_stream(path).to_pandas()
+        elif df == 'polars':
+            with pl.StringCache():
+                file = pl.read_ipc_stream(path)
+                file = file.lazy() if method == 'lazy' else file
         else:
             raise ValueError(f'Dataframe type "{df}" not supported')
     else:
@@ -123,6 +174,10 @@ def save_file(path: str, data, index: bool = True, df: str = 'pandas') -> None:
     if not os.path.exists(folder):
         os.makedirs(folder)
 
+    # Remove hard links (see link_folder()) before writing as the data would otherwise also change in the linked file
+    if os.path.exists(path) and os.stat(path).st_nlink > 1:
+        os.remove(path)
+
     # Save the file
     if file_type == 'yaml' or file_type == 'yml':
         with open(path, 'w') as file:
@@ -154,6 +209,136 @@ def save_file(path: str, data, index: bool = True, df: str = 'pandas') -> None:
         raise ValueError(f'File type "{file_type}" not supported')
 
 
+def map_ipc(path: str, cache: str = None) -> pl.DataFrame:
+    """Memory-maps an Arrow IPC file
+
+    Only uncompressed files can be mapped without reading them. The file is therefore converted once to an uncompressed
+    copy in a cache folder, which is used as long as it is newer than the file. The copies are not written next to the
+    file as the scenario folder might be read-only and is copied or linked to the results folder. The rows of the
+    returned dataframe are only read from disk when they are used and can be dropped from memory by the operating
+    system.
+
+    Args:
+        path: path to the Arrow IPC file (.ft)
+        cache: folder of the uncompressed copies. Defaults to the environment variable HAMLET_CACHE or the folder
+            'hamlet_mmap' in the temporary folder of the system.
+
+    Returns:
+        pl.DataFrame: dataframe backed by the mapped file
+    """
+
+    # The copies are named by the hash of the absolute path as files of different scenarios share their names
+    cache = cache if cache else os.environ.get('HAMLET_CACHE', os.path.join(tempfile.gettempdir(), 'hamlet_mmap'))
+    os.makedirs(cache, exist_ok=True)
+    path = os.path.abspath(path)
+    digest = hashlib.sha1(path.encode()).hexdigest()[:16]
+    mapped = os.path.join(cache, f'{digest}_{os.path.basename(path)}.mmap')
+
+    if not os.path.exists(mapped) or os.path.getmtime(mapped) < os.path.getmtime(path):
+        # Write to a temporary file first as other processes might map the same file
+        temporary = f'{mapped}.{os.getpid()}'
+        with pl.StringCache():
+            pl.read_ipc(path, memory_map=False).write_ipc(temporary, compression='uncompressed')
+        os.replace(temporary, mapped)
+
+    # Workaround for polars bug (see load_file())
+    with pl.StringCache():
+        return pl.read_ipc(mapped, memory_map=True)
+
+
+def get_epoch(timestamp) -> int:
+    """Returns the timestamp in microseconds since the epoch
+
+    Used as key for timestamps, as it does not depend on the time unit and time zone of the column they come from.
+
+    Args:
+        timestamp: timestamp as datetime
+
+    Returns:
+        int: microseconds since the epoch
+    """
+
+    return pl.Series([timestamp]).dt.epoch('us')[0]
+
+
+def df_to_ipc(data: pl.DataFrame, compression: str = 'uncompressed') -> bytes:
+    """Serializes a polars dataframe to an Arrow IPC buffer
+
+    Used to exchange tables between processes without going through the file system.
+
+    Args:
+        data: dataframe to serialize
+        compression: compression of the buffer ('uncompressed', 'lz4' or 'zstd')
+
+    Returns:
+        bytes: Arrow IPC buffer
+    """
+
+    buffer = io.BytesIO()
+    data.write_ipc(buffer, compression=compression)
+
+    return buffer.getvalue()
+
+
+def ipc_to_df(buffer: bytes) -> pl.DataFrame:
+    """Deserializes an Arrow IPC buffer to a polars dataframe
+
+    Args:
+        buffer: Arrow IPC buffer as created by df_to_ipc()
+
+    Returns:
+        pl.DataFrame: deserialized dataframe
+    """
+
+    # Workaround for polars bug (see load_file())
+    with pl.StringCache():
+        data = pl.read_ipc(io.BytesIO(buffer), memory_map=False)
+
+    return data
+
+
+def set_seed(seed: int) -> None:
+    """Seeds all random number generators that are used during the simulation
+
+    Seeds the random module (e.g. zero intelligence trading strategy), numpy and polars (e.g. shuffling of the bids and
+    offers in the market clearing).
+
+    Args:
+        seed: seed of the random number generators
+
+    Returns:
+        None
+    """
+
+    global _seed
+    _seed = seed
+
+    random.seed(seed)
+    np.random.seed(seed)
+    pl.set_random_seed(seed)
+
+
+def get_task_seed(*keys) -> int | None:
+    """Returns a seed for a task that is derived from the seed of the simulation and the keys of the task
+
+    Tasks that are executed concurrently (e.g. the market clearings of a region) cannot share the global random number
+    generators as the order in which they draw from them changes between runs. They use their own seed instead.
+
+    Args:
+        keys: values that identify the task (e.g. timestamp, market and timestep)
+
+    Returns:
+        int | None: seed of the task or None if the simulation is not seeded
+    """
+
+    if _seed is None:
+        return None
+
+    digest = hashlib.sha1(repr((_seed,) + keys).encode()).digest()
+
+    return int.from_bytes(digest[:4], 'little')
+
+
 def loop_folder(src: str, struct: dict, folder: str, func: Callable, **kwargs) -> dict:
     """Loads the agent data from all the scenario files and saves them in the same structure"""
 
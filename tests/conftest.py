@@ -0,0 +1,85 @@
+# Fixtures of the tests
+#
+# The integration tests create the example scenario (02_config/example_single_market) once per session in a temporary
+# folder and execute it with different settings. They are skipped if the dependencies of the simulation are missing.
+
+import os
+import sys
+import shutil
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # Add the repository to the Python path
+
+# Packages that are needed to create and execute the example scenario
+SIMULATION = ['polars', 'pandas', 'pyarrow', 'linopy', 'pandapower', 'gurobipy']
+
+# Example scenario that is used by the integration tests
+EXAMPLE = 'example_single_market'
+
+
+@pytest.fixture(scope='session')
+def scenario(tmp_path_factory) -> str:
+    """Creates a shortened version of the example scenario and returns the path to its scenario folder"""
+
+    for module in SIMULATION:
+        pytest.importorskip(module)
+
+    from hamlet import Creator
+    from hamlet import functions as f
+
+    root = tmp_path_factory.mktemp('hamlet')
+
+    # Copy the configuration and point its paths to the temporary folder
+    path_config = os.path.join(root, 'config', EXAMPLE)
+    shutil.copytree(os.path.join(ROOT, '02_config', EXAMPLE), path_config)
+    setup = f.load_file(os.path.join(path_config, 'config_setup.yaml'))
+    setup['time']['duration'] = '1/4'  # 6 hours
+    setup['paths']['input'] = os.path.join(ROOT, '03_input_data')
+    setup['paths']['scenarios'] = os.path.join(root, 'scenarios')
+    setup['paths']['results'] = os.path.join(root, 'results')
+    f.save_file(os.path.join(path_config, 'config_setup.yaml'), setup)
+
+    # Use deterministic forecasts only (the random forest depends on the order in which the agents are executed)
+    path_agents = os.path.join(path_config, 'config_agents.yaml')
+    with open(path_agents) as file:
+        config_agents = file.read()
+    with open(path_agents, 'w') as file:
+        file.write(config_agents.replace('method: rfr', 'method: naive'))
+
+    Creator(path=path_config).new_scenario_from_configs()
+
+    return os.path.join(root, 'scenarios', EXAMPLE)
+
+
+@pytest.fixture(scope='session')
+def execute(scenario):
+    """Returns a function that executes the scenario with the given settings and returns the executor"""
+
+    from hamlet import Executor
+
+    def run(name: str, resume: bool = False, timetable=None, **kwargs):
+        # Each run gets its own results folder (the regions are saved next to the scenario name)
+        kwargs = {'num_workers': 1, 'seed': 0, **kwargs}
+        executor = Executor(scenario, name=os.path.join(name, os.path.basename(scenario)), **kwargs)
+        if resume:
+            executor.resume()
+        elif timetable:
+            # Execute the scenario with a changed timetable (function that returns the new timetable)
+            executor.setup()
+            executor.set_timetable(timetable(executor.timetable))
+            executor.execute()
+            executor.cleanup()
+        else:
+            executor.run()
+
+        return executor
+
+    return run
+
+
+@pytest.fixture(scope='session')
+def reference(execute):
+    """Sequential execution of the scenario that the other settings are compared to"""
+
+    return execute('reference')
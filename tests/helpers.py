@@ -0,0 +1,94 @@
+# Functions that are shared by the tests
+
+import polars as pl
+from polars.testing import assert_frame_equal
+from hamlet import constants as c
+from hamlet.executor.utilities.controller.passive.passive import Passive
+
+# Tables of the agents and markets that are compared between runs
+AGENT_TABLES = ['meters', 'socs', 'setpoints']
+MARKET_TABLES = [c.TN_MARKET_TRANSACTIONS, c.TN_BIDS_CLEARED, c.TN_OFFERS_CLEARED]
+
+
+def agent_tables(executor, tables: list = None, agent_ids: list = None) -> dict:
+    """Returns the tables of the agents of an executed scenario as {(region, agent id, table): table}"""
+
+    result = {}
+    for region in executor.structure.keys():
+        for agents in executor.database.get_agent_data(region=region).values():
+            for agent_id, agentDB in agents.items():
+                if agent_ids is not None and agent_id not in agent_ids:
+                    continue
+                for table in tables if tables else AGENT_TABLES:
+                    result[(region, agent_id, table)] = getattr(agentDB, table)
+
+    return result
+
+
+def market_tables(executor, tables: list = None) -> dict:
+    """Returns the tables of the markets of an executed scenario as {(region, market type, name, table): table}"""
+
+    result = {}
+    for region in executor.structure.keys():
+        for market_type, markets in executor.database.get_market_data(region=region).items():
+            for market_name, marketDB in markets.items():
+                for table in tables if tables else MARKET_TABLES:
+                    result[(region, market_type, market_name, table)] = getattr(marketDB, table)
+
+    return result
+
+
+def passive_agents(executor) -> list:
+    """Returns the ids of the agents that are controlled by the passive controller"""
+
+    agent_ids = []
+    for region in executor.structure.keys():
+        for agents in executor.database.get_agent_data(region=region).values():
+            for agent_id, agentDB in agents.items():
+                if Passive.is_passive(plants=agentDB.plants, ems=agentDB.account[c.K_EMS]):
+                    agent_ids.append(agent_id)
+
+    return agent_ids
+
+
+def normalize(table: pl.DataFrame) -> pl.DataFrame:
+    """Sorts the columns and rows of the table (by timestamp first) and casts categorical columns to strings"""
+
+    table = table.with_columns(pl.col(pl.Categorical).cast(pl.Utf8))
+    columns = sorted(table.columns)
+    keys = [col for col in [c.TC_TIMESTAMP, c.TC_TIMESTEP] if col in columns]
+    table = table.select(columns)
+
+    return table.sort(keys + [col for col in columns if col not in keys]) if columns else table
+
+
+def assert_tables_equal(left: dict, right: dict, tolerance: float = 0):
+    """
+    Asserts that the tables of two runs are equal.
+
+    Args:
+        left: tables of the first run (see agent_tables() and market_tables()).
+        right: tables of the second run.
+        tolerance: maximum absolute difference of the numeric values (e.g. to allow for the tolerance of the solver).
+
+    """
+    assert left.keys() == right.keys()
+
+    for key in left.keys():
+        a, b = normalize(left[key]), normalize(right[key])
+        assert a.columns == b.columns, key
+        assert a.height == b.height, key
+
+        if not tolerance:
+            try:
+                assert_frame_equal(a, b, check_dtype=False)
+            except AssertionError as error:
+                raise AssertionError(f'{key}: {error}') from error
+            continue
+
+        for col in a.columns:
+            if a.schema[col] in pl.NUMERIC_DTYPES:
+                difference = (a.get_column(col).cast(pl.Float64) - b.get_column(col).cast(pl.Float64)).abs().max()
+                assert difference is None or difference <= tolerance, (key, col, difference)
+            else:
+                assert a.get_column(col).series_equal(b.get_column(col), null_equal=True), (key, col)
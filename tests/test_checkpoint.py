@@ -0,0 +1,133 @@
+# Tests of the checkpoints and of resuming the simulation from them
+
+import os
+import pytest
+
+pl = pytest.importorskip('polars')
+pa = pytest.importorskip('pyarrow')
+
+from hamlet.executor.utilities.database.checkpoint import Checkpoint, MANIFEST  # noqa: E402
+from hamlet.executor.utilities.database.result_writer import ResultWriter, EXTENSION  # noqa: E402
+from helpers import agent_tables, market_tables, assert_tables_equal  # noqa: E402
+
+# Backends the simulation is resumed with (backend, number of workers)
+BACKENDS = [('thread', 1), ('thread', 2), ('process', 2)]
+
+
+def read_stream(path: str) -> pl.DataFrame:
+    """Returns all rows of a stream file"""
+
+    with pa.OSFile(path, 'rb') as source:
+        return pl.from_arrow(pa.ipc.open_stream(source).read_all())
+
+
+def test_checkpoint_round_trip(tmp_path):
+    """Tables and objects are read back as they were written"""
+
+    table = pl.DataFrame({'a': [1, 2, 3], 'b': ['x', 'y', 'z']})
+    obj = {'config': [1, 2], 'name': 'agent'}
+
+    checkpoint = Checkpoint(tmp_path)
+    assert not checkpoint.exists()
+    checkpoint.begin()
+    checkpoint.write_table(key='region/table', data=table)
+    checkpoint.write_table(key='region/empty', data=pl.DataFrame())
+    checkpoint.write_object(key='region/object', data=obj)
+    checkpoint.commit(info={'timestamp': '2021-03-24T00:00:00+00:00'})
+
+    # A new instance loads the manifest of the committed checkpoint
+    loaded = Checkpoint(tmp_path)
+    assert loaded.exists()
+    assert loaded.version == 1
+    assert loaded.info == {'timestamp': '2021-03-24T00:00:00+00:00'}
+    assert loaded.read_table(key='region/table').frame_equal(table)
+    assert loaded.read_table(key='region/empty') is None
+    assert loaded.read_object(key='region/object') == obj
+    assert loaded.read_object(key='missing') is None
+
+
+def test_checkpoint_versions(tmp_path):
+    """Unchanged tables keep their file and files that are no longer referenced are deleted"""
+
+    unchanged = pl.DataFrame({'a': [1, 2]})
+    changed = pl.DataFrame({'b': [1, 2]})
+
+    checkpoint = Checkpoint(tmp_path)
+    checkpoint.begin()
+    checkpoint.write_table(key='unchanged', data=unchanged)
+    checkpoint.write_table(key='changed', data=changed)
+    checkpoint.write_object(key='object', data=[1])
+    checkpoint.commit()
+    first = dict(checkpoint.files)
+
+    changed = changed.with_columns(pl.col('b') + 1)
+    checkpoint.begin()
+    checkpoint.write_table(key='unchanged', data=unchanged)
+    checkpoint.write_table(key='changed', data=changed)
+    checkpoint.write_object(key='object', data=[1])
+    checkpoint.commit()
+
+    assert checkpoint.files['unchanged'] == first['unchanged']
+    assert checkpoint.files['object'] == first['object']
+    assert checkpoint.files['changed'] != first['changed']
+    assert not os.path.exists(os.path.join(tmp_path, first['changed']))
+    assert sorted(os.listdir(tmp_path)) == sorted([MANIFEST] + list(checkpoint.files.values()))
+    assert Checkpoint(tmp_path).read_table(key='changed').frame_equal(changed)
+
+
+def test_result_writer_restore(tmp_path):
+    """The streams are cut back to the rows recorded with the checkpoint and continued"""
+
+    batches = [pl.DataFrame({'a': list(range(start, start + 3))}) for start in range(0, 12, 3)]
+
+    # Stream two batches, record the checkpoint, stream more and start a new stream afterwards
+    writer = ResultWriter(tmp_path)
+    for batch in batches[:2]:
+        writer.write(key='region/table', data=batch)
+    rows = writer.flush()
+    writer.write(key='region/table', data=batches[2])
+    writer.write(key='region/later', data=batches[2])
+    writer.close()
+    assert rows == {'region/table': 6}
+    assert read_stream(os.path.join(tmp_path, 'region', f'table.{EXTENSION}')).height == 9
+
+    # Resume from the checkpoint
+    writer = ResultWriter(tmp_path)
+    writer.restore(rows=rows, folders=['region'])
+    writer.write(key='region/table', data=batches[3])
+    writer.close()
+
+    assert not os.path.exists(os.path.join(tmp_path, 'region', f'later.{EXTENSION}'))
+    expected = pl.concat([batches[0], batches[1], batches[3]])
+    assert read_stream(os.path.join(tmp_path, 'region', f'table.{EXTENSION}')).frame_equal(expected)
+
+
+def test_result_writer_restore_missing_rows(tmp_path):
+    """A stream with fewer rows than recorded cannot be restored"""
+
+    writer = ResultWriter(tmp_path)
+    writer.write(key='region/table', data=pl.DataFrame({'a': [1, 2]}))
+    writer.close()
+
+    with pytest.raises(ValueError):
+        ResultWriter(tmp_path).restore(rows={'region/table': 3}, folders=['region'])
+
+
+@pytest.mark.parametrize('backend, num_workers', BACKENDS)
+def test_resume_equals_uninterrupted(execute, reference, backend, num_workers):
+    """A simulation that is resumed from its last checkpoint gives the same results as an uninterrupted one"""
+
+    name = f'resume_{backend}_{num_workers}'
+    kwargs = {'backend': backend, 'num_workers': num_workers, 'checkpoint_interval': 10}
+
+    # The checkpoints do not change the results
+    executor = execute(name, **kwargs)
+    assert executor.checkpoint.exists()
+    assert_tables_equal(agent_tables(reference), agent_tables(executor))
+    assert_tables_equal(market_tables(reference), market_tables(executor))
+
+    # Resume from the last checkpoint in a new executor (the timestamps after it are executed again)
+    resumed = execute(name, resume=True, **kwargs)
+    assert resumed.resume_from is not None
+    assert_tables_equal(agent_tables(reference), agent_tables(resumed))
+    assert_tables_equal(market_tables(reference), market_tables(resumed))
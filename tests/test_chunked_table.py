@@ -0,0 +1,108 @@
+# Tests of the append-only history tables of the markets
+
+import random
+from datetime import datetime, timedelta, timezone
+import pytest
+
+pl = pytest.importorskip('polars')
+
+from hamlet import constants as c  # noqa: E402
+from hamlet.executor.utilities.database.chunked_table import ChunkedTable  # noqa: E402
+
+START = datetime(2021, 3, 24, tzinfo=timezone.utc)
+STEP = timedelta(minutes=15)
+AGENTS = ['agent_1', 'agent_2', 'agent_3']
+
+
+def create_rows(rng: random.Random, timestamp: datetime, num_rows: int) -> pl.DataFrame:
+    """Returns rows of a market table for the timestamp with timesteps up to four steps ahead (in random order)"""
+
+    rows = pl.DataFrame({
+        c.TC_TIMESTAMP: [timestamp.replace(tzinfo=None)] * num_rows,
+        c.TC_TIMESTEP: [timestamp.replace(tzinfo=None) + STEP * rng.randint(0, 3) for _ in range(num_rows)],
+        c.TC_ID_AGENT: [rng.choice(AGENTS) for _ in range(num_rows)],
+        c.TC_ENERGY_IN: [rng.randint(0, 1000) for _ in range(num_rows)],
+    }, schema={c.TC_TIMESTAMP: pl.Datetime(time_unit='ns'),
+               c.TC_TIMESTEP: pl.Datetime(time_unit='ns'),
+               c.TC_ID_AGENT: pl.Categorical,
+               c.TC_ENERGY_IN: pl.UInt64})
+
+    return rows.with_columns(pl.col(c.TC_TIMESTAMP, c.TC_TIMESTEP).dt.replace_time_zone('UTC'))
+
+
+@pytest.fixture
+def history():
+    """Returns a chunked table and the table that was built by concatenating the same rows (as before)"""
+
+    rng = random.Random(0)
+    with pl.StringCache():
+        table = ChunkedTable(create_rows(rng, START, 0))
+        concat = create_rows(rng, START, 0)
+        for idx in range(50):
+            rows = create_rows(rng, START + idx * STEP, rng.randint(0, 20))
+            table.append(rows)
+            concat = pl.concat([concat, rows], how='vertical')
+
+            # Reading the table in between must not affect further appends
+            if idx % 7 == 0:
+                assert table.to_frame().frame_equal(concat)
+
+        yield table, concat
+
+
+def filter_timesteps(table: pl.DataFrame, start: datetime, end: datetime = None) -> pl.DataFrame:
+    """Filters the rows of the timesteps (how the rows were looked up before)"""
+
+    end = start if end is None else end
+    dtype = table.schema[c.TC_TIMESTEP]
+    return table.filter((pl.col(c.TC_TIMESTEP) >= pl.lit(start).cast(dtype))
+                        & (pl.col(c.TC_TIMESTEP) <= pl.lit(end).cast(dtype)))
+
+
+def test_to_frame_equals_concat(history):
+    """Combining the chunks gives the rows in the order they were appended"""
+
+    table, concat = history
+    assert len(table) == concat.height
+    assert table.to_frame().frame_equal(concat)
+    assert table.to_frame() is table.to_frame()
+
+
+def test_get_equals_filter(history):
+    """Looking up timesteps gives the same rows as filtering the whole table"""
+
+    table, concat = history
+    for idx in range(-2, 56):
+        timestep = START + idx * STEP
+        expected = filter_timesteps(concat, timestep)
+        assert table.get(timestep).frame_equal(expected)
+
+        expected = expected.filter(pl.col(c.TC_ID_AGENT) == 'agent_2')
+        assert table.get(timestep, column=c.TC_ID_AGENT, value='agent_2').frame_equal(expected)
+
+    # Windows of timesteps are returned timestep by timestep in the order the rows were appended
+    for first, last in [(0, 0), (3, 10), (-5, 60), (20, 19)]:
+        start, end = START + first * STEP, START + last * STEP
+        expected = filter_timesteps(concat, start, end).with_row_count().sort([c.TC_TIMESTEP, 'row_nr'])
+        assert table.get(start, end).frame_equal(expected.drop('row_nr'))
+
+
+def test_slice_equals_concat(history):
+    """The rows after an offset are the same as the rows of the concatenated table"""
+
+    table, concat = history
+    for offset in [0, 1, concat.height // 3, concat.height - 1, concat.height, concat.height + 5]:
+        assert table.slice(offset).frame_equal(concat.slice(offset))
+
+
+def test_empty_keeps_schema():
+    """An empty table keeps the schema of the table it was created from"""
+
+    with pl.StringCache():
+        rows = create_rows(random.Random(0), START, 0)
+        table = ChunkedTable(rows)
+
+        assert len(table) == 0
+        assert table.empty().schema == rows.schema
+        assert table.to_frame().schema == rows.schema
+        assert table.get(START).schema == rows.schema
@@ -0,0 +1,126 @@
+# Tests of fast-forwarding the agents through stretches without market clearing
+
+from datetime import datetime, timedelta, timezone
+import pytest
+
+pl = pytest.importorskip('polars')
+
+from hamlet import constants as c  # noqa: E402
+from hamlet.executor.utilities.fast_forward.fast_forward import FastForward  # noqa: E402
+from helpers import agent_tables, market_tables, assert_tables_equal, passive_agents  # noqa: E402
+
+# Timestamps of the stretch that is fast-forwarded (indices of the timestamps of the timetable, end exclusive)
+STRETCH = (2, 8)
+
+
+def get_stretch(executor) -> list:
+    """Returns the timestamps of the stretch"""
+
+    timestamps = executor.timetable.get_column(c.TC_TIMESTAMP).unique().sort().to_list()
+    return timestamps[STRETCH[0]:STRETCH[1] + 1]
+
+
+def settle_only(timetable: pl.DataFrame) -> pl.DataFrame:
+    """Removes the clearings of the timestamps of the stretch, so that their markets are only settled"""
+
+    timestamps = timetable.get_column(c.TC_TIMESTAMP).unique().sort()
+    in_stretch = pl.col(c.TC_TIMESTAMP).is_in(timestamps.slice(STRETCH[0], STRETCH[1] - STRETCH[0]))
+    actions = pl.col(c.TC_ACTIONS).cast(pl.Utf8)
+
+    return (timetable.filter(~in_stretch | actions.str.contains(c.MA_SETTLE))
+            .with_columns(pl.when(in_stretch).then(pl.lit(c.MA_SETTLE)).otherwise(actions)
+                          .cast(timetable.schema[c.TC_ACTIONS]).alias(c.TC_ACTIONS)))
+
+
+def plant_meters(executor, agent_ids: list) -> dict:
+    """Returns the meters of the plants of the agents (without the meters of the markets)"""
+
+    tables = agent_tables(executor, tables=['meters'], agent_ids=agent_ids)
+    for (region, agent_id, table), meters in tables.items():
+        plants = next(agents[agent_id].plants for agents in executor.database.get_agent_data(region=region).values()
+                      if agent_id in agents)
+        columns = [col for col in meters.columns if col.startswith(tuple(plants.keys()))]
+        tables[(region, agent_id, table)] = meters.select([c.TC_TIMESTAMP] + columns)
+
+    return tables
+
+
+def balancing(executor, timesteps: list, agent_ids: list = None) -> pl.DataFrame:
+    """Returns the net balancing energy (positive: bought) of each agent and timestep"""
+
+    transactions = pl.concat([table.with_columns(pl.col(pl.Categorical).cast(pl.Utf8))
+                              for table in market_tables(executor, tables=[c.TN_MARKET_TRANSACTIONS]).values()],
+                             how='diagonal')
+    transactions = transactions.filter((pl.col(c.TC_TYPE_TRANSACTION) == c.TT_BALANCING)
+                                       & pl.col(c.TC_TIMESTEP).is_in(pl.Series(timesteps)
+                                                                     .cast(transactions.schema[c.TC_TIMESTEP])))
+    if agent_ids is not None:
+        transactions = transactions.filter(pl.col(c.TC_ID_AGENT).is_in(agent_ids))
+
+    return (transactions.groupby(c.TC_TIMESTEP, c.TC_ID_AGENT)
+            .agg((pl.col(c.TC_ENERGY_IN).cast(pl.Int64).sum() - pl.col(c.TC_ENERGY_OUT).cast(pl.Int64).sum())
+                 .alias(c.TC_ENERGY)))
+
+
+def test_flagged_timestamps():
+    """Timestamps are flagged if none of their tasks clears a market"""
+
+    start = datetime(2021, 3, 24, tzinfo=timezone.utc)
+    timestamps = [start + idx * timedelta(minutes=15) for idx in range(4)]
+    timetable = pl.DataFrame({
+        c.TC_TIMESTAMP: [timestamps[0], timestamps[0], timestamps[1], timestamps[2], timestamps[2], timestamps[3]],
+        c.TC_ACTIONS: ['clear', 'clear,settle', 'settle', 'settle', 'settle', 'clear'],
+    })
+
+    assert FastForward().get_flagged(timetable) == {timestamps[1], timestamps[2]}
+    assert FastForward(periods=[(timestamps[3], timestamps[3] + timedelta(minutes=15))]).get_flagged(timetable) \
+        == {timestamps[1], timestamps[2], timestamps[3]}
+
+    stretches = FastForward().get_stretches(timetable, timestamps)
+    assert stretches == {timestamps[1]: ([timestamps[1], timestamps[2]], timestamps[3])}
+
+
+def test_fast_forward_equals_step_by_step(execute, reference):
+    """The meters of plants that follow their timeseries are the same after a period was fast-forwarded"""
+
+    # Only the meters of the plants of passive agents (the dispatch of flexible plants differs during the stretch)
+    agent_ids = passive_agents(reference)
+    if not agent_ids:
+        pytest.skip('The scenario has no passive agents')
+
+    stretch = get_stretch(reference)
+    fast = execute('fast_forward', fast_forward=[(stretch[0], stretch[-1])])
+
+    # The controllers round the energy of each timestep, fast-forwarding rounds it once per timestep as well
+    assert_tables_equal(plant_meters(reference, agent_ids), plant_meters(fast, agent_ids),
+                        tolerance=STRETCH[1] - STRETCH[0])
+
+
+def test_fast_forward_settles_markets(execute, reference):
+    """Timestamps that only settle the markets are fast-forwarded and their markets are still settled"""
+
+    step_by_step = execute('settle_only', timetable=settle_only)
+    fast = execute('settle_only_fast_forward', timetable=settle_only, fast_forward=True)
+    timesteps = get_stretch(reference)[:-1]
+
+    # All timesteps of the stretch are settled with the retailer
+    settled = balancing(fast, timesteps)
+    assert set(settled.get_column(c.TC_TIMESTEP).unique().to_list()) \
+        == set(balancing(step_by_step, timesteps).get_column(c.TC_TIMESTEP).unique().to_list())
+
+    # Passive agents follow their timeseries in both runs, so they settle the same energy
+    agent_ids = passive_agents(reference)
+    if agent_ids:
+        tolerance = STRETCH[1] - STRETCH[0]
+        assert_tables_equal(plant_meters(step_by_step, agent_ids), plant_meters(fast, agent_ids), tolerance=tolerance)
+        assert_tables_equal({'balancing': balancing(step_by_step, timesteps, agent_ids)},
+                            {'balancing': balancing(fast, timesteps, agent_ids)}, tolerance=tolerance)
+
+    # The batteries stay within their capacity
+    for (region, agent_id, _), socs in agent_tables(fast, tables=['socs']).items():
+        plants = next(agents[agent_id].plants for agents in fast.database.get_agent_data(region=region).values()
+                      if agent_id in agents)
+        for plant_id, plant in plants.items():
+            if plant['type'] == c.P_BATTERY and plant_id in socs.columns:
+                values = socs.get_column(plant_id).drop_nulls()
+                assert values.min() >= 0 and values.max() <= plant['sizing']['capacity']
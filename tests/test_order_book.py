@@ -0,0 +1,129 @@
+# Tests of the order book of the bids and offers of a region
+
+import random
+from datetime import datetime, timedelta, timezone
+import pytest
+
+pl = pytest.importorskip('polars')
+
+from hamlet import constants as c  # noqa: E402
+from hamlet.executor.utilities.database.order_book import OrderBook  # noqa: E402
+
+START = datetime(2021, 3, 24, tzinfo=timezone.utc)
+STEP = timedelta(minutes=15)
+MARKETS = [('lem_continuous', 'continuous'), ('lem_continuous', 'second'), ('lem_periodic', 'continuous')]
+
+
+def create_bids_offers(rng: random.Random, agent_id: str, num_rows: int) -> pl.DataFrame:
+    """Returns random bids and offers of the agent for the markets and the next timesteps"""
+
+    markets = [rng.choice(MARKETS) for _ in range(num_rows)]
+    timesteps = [START.replace(tzinfo=None) + STEP * rng.randint(0, 3) for _ in range(num_rows)]
+    data = {
+        c.TC_TIMESTAMP: [START.replace(tzinfo=None)] * num_rows,
+        c.TC_TIMESTEP: timesteps,
+        c.TC_REGION: ['region'] * num_rows,
+        c.TC_MARKET: [market for market, _ in markets],
+        c.TC_NAME: [name for _, name in markets],
+        c.TC_ENERGY_TYPE: ['power'] * num_rows,
+        c.TC_ID_AGENT: [agent_id] * num_rows,
+        c.TC_ENERGY_IN: [rng.randint(0, 1000) for _ in range(num_rows)],
+        c.TC_ENERGY_OUT: [rng.randint(0, 1000) for _ in range(num_rows)],
+        c.TC_PRICE_PU_IN: [rng.randint(0, 100) for _ in range(num_rows)],
+        c.TC_PRICE_PU_OUT: [rng.randint(0, 100) for _ in range(num_rows)],
+        c.TC_PRICE_IN: [rng.randint(0, 10000) for _ in range(num_rows)],
+        c.TC_PRICE_OUT: [rng.randint(0, 10000) for _ in range(num_rows)],
+        c.TC_QUALITY: [0] * num_rows,
+    }
+    schema = {**c.TS_BIDS_OFFERS,
+              c.TC_TIMESTAMP: pl.Datetime(time_unit='ns'),
+              c.TC_TIMESTEP: pl.Datetime(time_unit='ns')}
+
+    return (pl.DataFrame(data, schema=schema)
+            .with_columns(pl.col(c.TC_TIMESTAMP, c.TC_TIMESTEP).dt.replace_time_zone('UTC')))
+
+
+def filter_market(table: pl.DataFrame, market_type: str, market_name: str, timestep: datetime) -> pl.DataFrame:
+    """Filters the bids and offers of the market and timestep (how they were looked up before)"""
+
+    return table.filter((pl.col(c.TC_MARKET).cast(pl.Utf8) == market_type)
+                        & (pl.col(c.TC_NAME).cast(pl.Utf8) == market_name)
+                        & (pl.col(c.TC_TIMESTEP) == pl.lit(timestep).cast(table.schema[c.TC_TIMESTEP])))
+
+
+def assert_lookups_equal(order_book: OrderBook, table: pl.DataFrame):
+    """Asserts that the order book returns the same bids and offers as filtering the table for all markets"""
+
+    for market_type, market_name in MARKETS + [('lem_continuous', 'missing')]:
+        for idx in range(-1, 5):
+            timestep = START + idx * STEP
+            expected = filter_market(table, market_type, market_name, timestep)
+            result = order_book.get(market_type, market_name, timestep)
+            assert result.schema == table.schema
+            assert result.frame_equal(expected)
+
+
+@pytest.fixture
+def orders():
+    """Returns the bids and offers of several agents"""
+
+    rng = random.Random(0)
+    with pl.StringCache():
+        yield {f'agent_{idx}': create_bids_offers(rng, f'agent_{idx}', rng.randint(1, 30)) for idx in range(5)}
+
+
+def test_get_equals_filter(orders):
+    """Looking up a market and timestep gives the same bids and offers as filtering the combined table"""
+
+    order_book = OrderBook()
+    for agent_id, bids_offers in orders.items():
+        order_book.post(agent_id, bids_offers)
+    order_book.post('agent_without_bids', pl.DataFrame())
+
+    table = pl.concat(list(orders.values()), how='vertical')
+    assert order_book.get_table().frame_equal(table)
+    assert_lookups_equal(order_book, table)
+
+
+def test_post_and_remove(orders):
+    """The lookups reflect the bids and offers that were posted and removed since"""
+
+    order_book = OrderBook()
+    for agent_id, bids_offers in orders.items():
+        order_book.post(agent_id, bids_offers)
+    assert_lookups_equal(order_book, order_book.get_table())
+
+    # Replace the bids and offers of one agent and remove the ones of another one
+    orders['agent_1'] = orders['agent_1'].head(3)
+    order_book.post('agent_1', orders['agent_1'])
+    order_book.remove('agent_2')
+    del orders['agent_2']
+
+    table = pl.concat(list(orders.values()), how='vertical')
+    assert order_book.get_table().frame_equal(table)
+    assert_lookups_equal(order_book, table)
+
+
+def test_scale(orders):
+    """The scaling function is applied to the combined bids and offers before they are partitioned"""
+
+    def scale(table: pl.DataFrame) -> pl.DataFrame:
+        return table.with_columns(pl.col(c.TC_ENERGY_IN) * 2)
+
+    order_book = OrderBook(scale=scale)
+    for agent_id, bids_offers in orders.items():
+        order_book.post(agent_id, bids_offers)
+
+    table = scale(pl.concat(list(orders.values()), how='vertical'))
+    assert_lookups_equal(order_book, table)
+
+
+def test_empty():
+    """An order book without bids and offers returns empty tables with the schema of the bids and offers"""
+
+    order_book = OrderBook()
+    order_book.post('agent', pl.DataFrame())
+
+    result = order_book.get('lem_continuous', 'continuous', START)
+    assert result.is_empty()
+    assert result.schema == pl.DataFrame(schema=c.TS_BIDS_OFFERS).schema
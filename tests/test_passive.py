@@ -0,0 +1,39 @@
+# Tests of the controller of passive agents (agents without flexibility)
+
+import pytest
+
+pytest.importorskip('polars')
+
+from helpers import agent_tables, assert_tables_equal, passive_agents  # noqa: E402
+
+# Maximum difference of the values of the linopy controllers (the solutions are truncated to integers)
+TOLERANCE = 1
+
+
+@pytest.fixture(scope='module')
+def passive(execute):
+    """Execution of the scenario with the passive controller"""
+
+    return execute('passive', passive_agents=True)
+
+
+def test_passive_equals_linopy(reference, passive):
+    """The passive controller computes the same setpoints and meters as the linopy controllers"""
+
+    agent_ids = passive_agents(reference)
+    if not agent_ids:
+        pytest.skip('The scenario has no passive agents')
+
+    tables = ['meters', 'setpoints']
+    assert_tables_equal(agent_tables(reference, tables=tables, agent_ids=agent_ids),
+                        agent_tables(passive, tables=tables, agent_ids=agent_ids), tolerance=TOLERANCE)
+
+
+def test_passive_keeps_other_agents(reference, passive):
+    """Agents with flexibility are controlled by the linopy controllers regardless of the setting"""
+
+    agent_ids = passive_agents(reference)
+
+    left, right = agent_tables(reference), agent_tables(passive)
+    others = {key: table for key, table in left.items() if key[1] not in agent_ids}
+    assert_tables_equal(others, {key: right[key] for key in others}, tolerance=TOLERANCE)
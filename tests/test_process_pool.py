@@ -0,0 +1,17 @@
+# Tests of the parallel execution of the agents
+
+import pytest
+
+pytest.importorskip('polars')
+
+from helpers import agent_tables, market_tables, assert_tables_equal  # noqa: E402
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_parallel_equals_sequential(execute, reference, backend):
+    """Executing the agents in parallel gives the same results as executing them sequentially"""
+
+    executor = execute(f'parallel_{backend}', backend=backend, num_workers=2)
+
+    assert_tables_equal(agent_tables(reference), agent_tables(executor))
+    assert_tables_equal(market_tables(reference), market_tables(executor))
@@ -0,0 +1,80 @@
+# Tests of the columnar store of the agent tables of a region
+
+from datetime import datetime, timedelta, timezone
+import pytest
+
+pl = pytest.importorskip('polars')
+
+from hamlet.executor.utilities.database.region_store import RegionStore  # noqa: E402
+from helpers import agent_tables, assert_tables_equal  # noqa: E402
+
+START = datetime(2021, 3, 24, tzinfo=timezone.utc)
+STEP = timedelta(minutes=15)
+
+
+class Agent:
+    """Minimal agent with the tables of the store"""
+
+    def __init__(self, agent_id: str, num_rows: int = 4):
+        self.agent_id = agent_id
+        timestamps = [START + idx * STEP for idx in range(num_rows)]
+        self.meters = pl.DataFrame({'timestamp': timestamps, 'pv_power': list(range(num_rows))})
+        self.socs = pl.DataFrame({'timestamp': timestamps, 'battery': [0.0] * num_rows})
+        self.timeseries = pl.DataFrame({'timestamp': timestamps, 'pv_power': [1.0] * num_rows})
+
+
+@pytest.fixture
+def store():
+    """Returns a store with two agents"""
+
+    store = RegionStore()
+    store.add_agents({'agent_1': Agent('agent_1'), 'agent_2': Agent('agent_2')})
+
+    return store
+
+
+def test_get_is_cached(store):
+    """Reading a table returns the same frame until the table of the agent or the wide table changes"""
+
+    table = store.get('meters', 'agent_1')
+    assert store.get('meters', 'agent_1') is table
+    assert table.get_column('pv_power').to_list() == [0, 1, 2, 3]
+
+    # Setting the table returns the pending table and writing it creates a new frame
+    updated = table.with_columns(pl.col('pv_power') * 2)
+    assert store.set('meters', 'agent_1', updated)
+    assert store.get('meters', 'agent_1') is updated
+    store.flush()
+    assert store.get('meters', 'agent_1').frame_equal(updated)
+    assert store.get('meters', 'agent_1') is not updated
+
+    # Pruning the wide table removes the cached frames
+    store.prune('meters', before=START + STEP)
+    assert store.get('meters', 'agent_2').height == 3
+
+
+def test_set_off_grid(store):
+    """Tables that do not match the time grid are removed from the store"""
+
+    table = store.get('socs', 'agent_1').slice(1)
+    assert not store.set('socs', 'agent_1', table)
+    assert not store.has('socs', 'agent_1')
+    assert store.has('socs', 'agent_2')
+
+
+def test_tables_stay_stored(execute, reference):
+    """The tables of the agents stay in the store while the scenario is executed"""
+
+    executor = execute('columnar_store', columnar_store=True)
+
+    assert 'setpoints' not in RegionStore.KINDS
+    for region in executor.structure.keys():
+        store = executor.database.get_agent_store(region=region)
+        for agents in executor.database.get_agent_data(region=region).values():
+            for agent_id, agentDB in agents.items():
+                # Tables without timestamps (e.g. agents without storages have no socs) are never stored
+                for kind in store.kinds:
+                    if store.key in getattr(agentDB, kind).columns:
+                        assert store.has(kind, agent_id), (region, agent_id, kind)
+
+    assert_tables_equal(agent_tables(reference), agent_tables(executor))